@@ -10,7 +10,6 @@ import pickle
 
 import pandas as pd
 import pymatviz
-from pymatgen.analysis.phase_diagram import PatchedPhaseDiagram
 from pymatgen.entries.compatibility import MaterialsProject2020Compatibility
 from pymatgen.entries.computed_entries import ComputedEntry, ComputedStructureEntry
 from pymatgen.ext.matproj import MPRester
@@ -19,8 +18,12 @@ from tqdm import tqdm
 
 from matbench_discovery import MP_DIR, ROOT, today
 from matbench_discovery.data import DATA_FILES
-from matbench_discovery.energy import get_e_form_per_atom, get_elemental_ref_entries
+from matbench_discovery.energy import (
+    get_e_form_per_atom_batch,
+    get_elemental_ref_entries,
+)
 from matbench_discovery.enums import Key
+from matbench_discovery.hull import HullStore, add_entries_to_ppd, build_ppd
 
 module_dir = os.path.dirname(__file__)
 
@@ -52,7 +55,8 @@ print(f"{len(mp_computed_entries)=:,} on {today}")
 
 
 # %% build phase diagram with MP entries only
-ppd_mp = PatchedPhaseDiagram(mp_computed_entries, verbose=True)
+# sub-space hulls are built in parallel, same result as PatchedPhaseDiagram(entries)
+ppd_mp = build_ppd(mp_computed_entries, workers=-1, pbar=True)
 print(f"{ppd_mp} on {today}")
 # prints:
 # PatchedPhaseDiagram covering 44805 sub-spaces on 2022-09-16
@@ -62,6 +66,10 @@ print(f"{ppd_mp} on {today}")
 with gzip.open(f"{module_dir}/{today}-ppd-mp.pkl.gz", "wb") as zip_file:
     pickle.dump(ppd_mp, zip_file)
 
+# also save as compact, memory-mapped HullStore which loads much faster than the pickle
+# and only reads the chemical systems that are queried
+HullStore.write(f"{module_dir}/{today}-ppd-mp-hull", ppd_mp)
+
 
 # %% build phase diagram with both MP entries + WBM entries
 df_wbm = pd.read_json(DATA_FILES.wbm_computed_structure_entries).set_index(Key.mat_id)
@@ -83,9 +91,11 @@ print(f"{n_skipped:,} ({n_skipped / len(df_wbm):.1%}) entries not processed")
 
 
 # %% merge MP and WBM entries into a single PatchedPhaseDiagram
-mp_wbm_ppd = PatchedPhaseDiagram(
-    wbm_computed_entries + mp_computed_entries, verbose=True
-)
+# insert WBM entries into the MP PPD (already saved above) in place, only rebuilding
+# the sub-spaces they affect instead of building a new PPD from scratch
+mp_wbm_ppd = ppd_mp
+changed_mp_entries = add_entries_to_ppd(mp_wbm_ppd, wbm_computed_entries, workers=-1)
+print(f"{len(changed_mp_entries):,} MP entries changed e_above_hull due to WBM entries")
 
 # save MP+WBM PPD to disk (was not run)
 with gzip.open(f"{module_dir}/{today}-ppd-mp-wbm.pkl.gz", "wb") as zip_file:
@@ -107,9 +117,11 @@ df_mp = pd.read_csv(DATA_FILES.mp_energies, na_filter=False).set_index(Key.mat_i
 
 # %%
 e_form_us = "e_form_us"
-df_mp[e_form_us] = [
-    get_e_form_per_atom(mp_computed_entries[mp_id]) for mp_id in df_mp.index
-]
+mp_entries = [mp_computed_entries[mp_id] for mp_id in df_mp.index]
+df_mp[e_form_us] = get_e_form_per_atom_batch(
+    [entry.energy for entry in mp_entries],
+    [entry.composition for entry in mp_entries],
+)
 
 
 # make sure get_form_energy_per_atom() reproduces MP formation energies
@@ -26,8 +26,9 @@ from tqdm import tqdm
 
 from matbench_discovery import PDF_FIGS, SITE_FIGS, WBM_DIR, today
 from matbench_discovery.data import DATA_FILES
-from matbench_discovery.energy import get_e_form_per_atom
+from matbench_discovery.energy import get_e_form_per_atom_batch, process_entries_mp2020
 from matbench_discovery.enums import Key
+from matbench_discovery.hull import get_e_above_hull_batch
 
 try:
     import gdown
@@ -527,12 +528,26 @@ df_wbm["e_correction_per_atom_mp_legacy"] = [
     cse.correction_per_atom for cse in df_wbm.cse
 ]
 
-# clean up legacy corrections and apply new corrections
-entries_new_corr = MaterialsProject2020Compatibility().process_entries(
-    df_wbm.cse, clean=True, verbose=True
-)
+# clean up legacy corrections and apply new corrections with the vectorized MP2020
+# engine (tests/test_energy.py checks it against pymatgen's implementation)
+entries_new_corr = process_entries_mp2020(df_wbm[Key.cse].tolist())
 assert len(entries_new_corr) == len(df_wbm), f"{len(entries_new_corr)=} {len(df_wbm)=}"
 
+# set to True to also cross-check all of WBM against pymatgen's entry-by-entry
+# MaterialsProject2020Compatibility (slow, roughly doubles the correction time)
+check_mp2020_with_pymatgen = False
+if check_mp2020_with_pymatgen:
+    pmg_entries = MaterialsProject2020Compatibility().process_entries(
+        df_wbm.cse, clean=True, verbose=True, inplace=False
+    )
+    assert len(pmg_entries) == len(entries_new_corr)
+    max_diff = max(
+        abs(pmg_entry.correction - cse.correction)
+        for pmg_entry, cse in zip(pmg_entries, entries_new_corr, strict=True)
+    )
+    assert max_diff < 1e-8, f"{max_diff=} between pymatgen and fast MP2020"
+    del pmg_entries
+
 n_corrected = sum(cse.uncorrected_energy != cse.energy for cse in df_wbm.cse)
 assert n_corrected == 100_930, f"{n_corrected=} expected 100,930"
 
@@ -549,31 +564,37 @@ with gzip.open(DATA_FILES.mp_patched_phase_diagram, "rb") as zip_file:
 
 
 # %% calculate e_above_hull for each material
-# this loop needs above warnings.filterwarnings() in __init__.py to not crash Jupyter
-# kernel with logs
-# takes ~20 min at 200 it/s for 250k entries in WBM
+# batched by chemical system and spread across all cores (the old per-entry
+# ppd_mp.get_e_above_hull() loop took ~20 min at 200 it/s for 250k entries in WBM)
 assert Key.each_true not in df_summary
 
-for mat_id, cse in tqdm(df_wbm[Key.cse].items(), total=len(df_wbm)):
+for mat_id, cse in df_wbm[Key.cse].items():
     assert mat_id == cse.entry_id, f"{mat_id=} != {cse.entry_id=}"
     assert cse.entry_id in df_summary.index, f"{cse.entry_id=} not in df_summary"
 
-    e_above_hull = ppd_mp.get_e_above_hull(cse, allow_negative=True)
-
-    df_summary.loc[cse.entry_id, Key.each_true] = e_above_hull
+df_summary.loc[df_wbm.index, Key.each_true] = get_e_above_hull_batch(
+    ppd_mp, df_wbm[Key.cse].tolist(), workers=-1
+)
 
 
 # %% calculate formation energies from CSEs wrt MP elemental reference energies
 # first make sure source and target dfs have matching indices
 assert sum(df_wbm.index != df_summary.index) == 0
 
-for row in tqdm(df_wbm.itertuples(), total=len(df_wbm), desc="ML energies to CSEs"):
-    mat_id, cse, formula = row.Index, row[Key.cse], row.formula_from_cse
+e_forms = get_e_form_per_atom_batch(
+    [cse.uncorrected_energy for cse in df_wbm[Key.cse]],
+    df_wbm.formula_from_cse.tolist(),
+)
+
+for row, e_form in tqdm(
+    zip(df_wbm.itertuples(), e_forms, strict=True),
+    total=len(df_wbm),
+    desc="ML energies to CSEs",
+):
+    mat_id, cse = row.Index, row[Key.cse]
     assert mat_id == cse.entry_id, f"{mat_id=} != {cse.entry_id=}"
     assert mat_id in df_summary.index, f"{mat_id=} not in df_summary"
 
-    entry_like = dict(composition=formula, energy=cse.uncorrected_energy)
-    e_form = get_e_form_per_atom(entry_like)
     e_form_ppd = ppd_mp.get_form_energy_per_atom(cse) - cse.correction_per_atom
 
     # make sure the PPD.get_e_form_per_atom() and standalone get_e_form_per_atom()
@@ -0,0 +1,297 @@
+"""Content-addressed cache of per-structure model results so re-running a model only
+computes results for structures, model versions or relaxation settings that changed.
+
+Entries are keyed by a hash of the canonicalized input structure, the model
+fingerprint (name, version, checkpoint contents) and the relaxation parameters. Each
+entry is a separate gzipped JSON file so the cache works on local disks and shared
+file systems without a lock or central index. Hits update the file's mtime which
+doubles as LRU timestamp for size-bounded eviction.
+"""
+
+import contextlib
+import gzip
+import hashlib
+import json
+import math
+import os
+from collections.abc import Mapping
+from typing import Any
+
+import numpy as np
+from pymatgen.core import Structure
+
+from matbench_discovery.data import as_dict_handler, default_cache_dir
+
+__author__ = "Janosh Riebesell"
+__date__ = "2026-10-17"
+
+# where results are cached by default, can be on a shared file system
+default_result_cache_dir = os.getenv(
+    "MATBENCH_DISCOVERY_RESULT_CACHE_DIR",
+    f"{os.path.dirname(default_cache_dir)}/results",
+)
+
+
+def structure_hash(struct: Structure | dict[str, Any], decimals: int = 6) -> str:
+    """Hash of a structure that is independent of site order and periodic images of
+    sites (fractional coordinates are wrapped into [0, 1)).
+
+    Args:
+        struct (Structure | dict): pymatgen Structure or its as_dict().
+        decimals (int, optional): Lattice vectors and fractional coordinates are
+            rounded to this many decimals before hashing. Defaults to 6.
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    if isinstance(struct, dict):
+        struct = Structure.from_dict(struct)
+    frac_coords = np.round(struct.frac_coords % 1, decimals) % 1
+    species = [site.species.formula for site in struct]
+    sites = sorted(zip(species, frac_coords.tolist(), strict=True))
+    lattice = np.round(struct.lattice.matrix, decimals).tolist()
+    payload = json.dumps({"lattice": lattice, "sites": sites, "charge": struct.charge})
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def checkpoint_hash(checkpoint: str | None) -> str | None:
+    """Hash of a model checkpoint's contents so retrained checkpoints saved under the
+    same path get new cache keys.
+
+    Args:
+        checkpoint (str | None): Path to a checkpoint file or directory (all files in
+            it are hashed in sorted order). Anything else (e.g. a URL, model name or
+            None) is returned as is.
+
+    Returns:
+        str | None: SHA-256 hex digest of the checkpoint or checkpoint unchanged.
+    """
+    if checkpoint is None or not os.path.exists(checkpoint):
+        return checkpoint
+    paths = [checkpoint]
+    if os.path.isdir(checkpoint):
+        paths = sorted(
+            os.path.join(dir_path, file_name)
+            for dir_path, _, file_names in os.walk(checkpoint)
+            for file_name in file_names
+        )
+    sha = hashlib.sha256()
+    for path in paths:
+        sha.update(os.path.relpath(path, checkpoint).encode())
+        with open(path, "rb") as file:
+            while data := file.read(10_000_000):
+                sha.update(data)
+    return sha.hexdigest()
+
+
+def result_key(
+    struct: Structure | dict[str, Any] | str,
+    model: Mapping[str, Any],
+    params: Mapping[str, Any],
+) -> str:
+    """Cache key for the result of running a model with certain parameters on a
+    structure.
+
+    Args:
+        struct (Structure | dict | str): Input structure or its structure_hash()
+            (to avoid rehashing when looking up the same structure for many models).
+        model (Mapping[str, Any]): Model fingerprint, e.g. {"name": "mace", "version":
+            version("mace-torch"), "checkpoint": checkpoint_hash(path)}.
+        params (Mapping[str, Any]): Everything else that affects the result, e.g.
+            optimizer, cell filter, fmax, max_steps, dtype.
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    struct_hash = struct if isinstance(struct, str) else structure_hash(struct)
+    payload = json.dumps(
+        {"structure": struct_hash, "model": model, "params": params},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _has_missing(result: Mapping[str, Any]) -> bool:
+    """Whether any top-level value in result is None or NaN."""
+    return any(
+        val is None or (isinstance(val, float | np.floating) and math.isnan(val))
+        for val in result.values()
+    )
+
+
+class ResultCache:
+    """Size-bounded on-disk cache of JSON-serializable result dicts with least recently
+    used eviction.
+
+    Usage:
+        cache = ResultCache()
+        key = result_key(struct, model_info, relax_params)
+        if (result := cache.get(key)) is None:
+            result = relax(struct)
+            cache.put(key, result)
+
+    Entries are stored as cache_dir/<key[:2]>/<key>.json.gz, written atomically so
+    concurrent readers (e.g. other slurm array tasks on a shared file system) never see
+    partial files. Reads bump the entry's mtime. When the cache grows beyond max_bytes
+    (tracked per process from a directory scan on first write plus own writes), the
+    least recently used entries are deleted until it's below low_water * max_bytes.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = default_result_cache_dir,
+        *,
+        max_bytes: int = 20 * 1024**3,
+        low_water: float = 0.9,
+    ) -> None:
+        """Open (and create if needed) a result cache.
+
+        Args:
+            cache_dir (str, optional): Cache directory. Defaults to
+                default_result_cache_dir (set with the
+                MATBENCH_DISCOVERY_RESULT_CACHE_DIR environment variable).
+            max_bytes (int, optional): Size limit of all entries. Defaults to 20 GiB.
+            low_water (float, optional): Fraction of max_bytes to evict down to so
+                eviction doesn't run on every write. Defaults to 0.9.
+
+        Raises:
+            ValueError: If max_bytes < 1 or low_water not in (0, 1].
+        """
+        if max_bytes < 1:
+            raise ValueError(f"{max_bytes=} must be positive")
+        if not 0 < low_water <= 1:
+            raise ValueError(f"{low_water=} must be in (0, 1]")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.hits = self.misses = 0
+        self._size: int | None = None  # lazily computed total size of entries
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __repr__(self) -> str:
+        """Show cache directory, size limit and hit/miss counts."""
+        return (
+            f"{type(self).__name__}({self.cache_dir!r}, max_bytes={self.max_bytes:,}, "
+            f"hits={self.hits}, misses={self.misses})"
+        )
+
+    def __len__(self) -> int:
+        """Number of cached entries."""
+        return len(self._entries())
+
+    def __contains__(self, key: str) -> bool:
+        """Whether key is cached (doesn't count as access for LRU)."""
+        return os.path.isfile(self._path(key))
+
+    def _path(self, key: str) -> str:
+        """File path of an entry."""
+        return f"{self.cache_dir}/{key[:2]}/{key}.json.gz"
+
+    def _entries(self) -> list[os.DirEntry[str]]:
+        """All entry files in the cache."""
+        entries = []
+        with os.scandir(self.cache_dir) as sub_dirs:
+            for sub_dir in sub_dirs:
+                if not sub_dir.is_dir():
+                    continue
+                with os.scandir(sub_dir.path) as files:
+                    entries += [f for f in files if f.name.endswith(".json.gz")]
+        return entries
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Cached result for key or None on a miss. Marks the entry as recently
+        used. Entries with None or NaN values are discarded and count as misses.
+        """
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt") as file:
+                result = json.load(file)
+            os.utime(path)
+        except FileNotFoundError:  # missing or evicted by another process
+            self.misses += 1
+            return None
+        except (OSError, EOFError, json.JSONDecodeError):  # corrupt entry
+            self.misses += 1
+            self.discard(key)
+            return None
+        if not isinstance(result, dict) or _has_missing(result):
+            self.misses += 1
+            self.discard(key)
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key: str, result: Mapping[str, Any]) -> bool:
+        """Cache a result. Objects with as_dict() (e.g. pymatgen Structures) are
+        stored as dicts and numpy values as Python floats and lists. Evicts least
+        recently used entries if the cache is full.
+
+        Args:
+            key (str): Cache key from result_key().
+            result (Mapping[str, Any]): Result to cache.
+
+        Returns:
+            bool: Whether the result was cached. Results with None or NaN values
+                (also after serialization, i.e. unserializable objects) are skipped
+                so they aren't reused by later runs.
+        """
+        if _has_missing(result):
+            return False
+        serialized = json.loads(json.dumps(result, default=as_dict_handler))
+        if _has_missing(serialized):
+            return False
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = gzip.compress(json.dumps(serialized).encode())
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+        if self._size is None:
+            self._size = sum(entry.stat().st_size for entry in self._entries())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.evict()
+        return True
+
+    def discard(self, key: str) -> None:
+        """Remove an entry if it exists."""
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._path(key))
+
+    def evict(self, max_bytes: float | None = None) -> int:
+        """Delete least recently used entries until the cache is at most max_bytes.
+
+        Args:
+            max_bytes (float, optional): Target size. Defaults to low_water *
+                self.max_bytes.
+
+        Returns:
+            int: Number of deleted entries.
+        """
+        if max_bytes is None:
+            max_bytes = self.low_water * self.max_bytes
+        stats = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:  # deleted by another process
+                continue
+            stats.append((stat.st_mtime, entry.path, stat.st_size))
+        stats.sort()
+        size = sum(st_size for *_, st_size in stats)
+        n_evicted = 0
+        for _, path, st_size in stats:
+            if size <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                n_evicted += 1
+            except FileNotFoundError:
+                pass
+            size -= st_size
+        self._size = size
+        return n_evicted
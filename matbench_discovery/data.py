@@ -3,18 +3,22 @@
 https://figshare.com/articles/dataset/22715158
 """
 
+import functools
 import gzip
+import hashlib
 import json
 import os
 import pickle
 import sys
 import urllib.error
 import urllib.request
-from collections.abc import Callable
+from collections.abc import Callable, Collection, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from glob import glob
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal
 
+import numpy as np
 import pandas as pd
 from monty.json import MontyDecoder
 from pymatgen.analysis.phase_diagram import PatchedPhaseDiagram
@@ -37,11 +41,31 @@ default_cache_dir = os.getenv(
 )
 
 
-def as_dict_handler(obj: Any) -> dict[str, Any] | None:
+# Parquet schema metadata key listing columns stored as JSON strings
+PARQUET_JSON_COLS_KEY = b"matbench_discovery.json_cols"
+# rows per Parquet row group, small enough that iter_records() only decompresses a
+# small fraction of a file to read one shard
+PARQUET_ROW_GROUP_SIZE = 5_000
+# default column yielded by iter_records() for each data file
+RECORD_COLS = {
+    "mp_computed_structure_entries": "entry",
+    "wbm_cses_plus_init_structs": Key.init_struct,
+    "wbm_computed_structure_entries": Key.cse,
+    "wbm_initial_structures": Key.init_struct,
+}
+
+
+def as_dict_handler(obj: Any) -> Any:
     """Pass this to json.dump(default=) or as pandas.to_json(default_handler=) to
-    serialize Python classes with as_dict(). Warning: Objects without a as_dict() method
-    are replaced with None in the serialized data.
+    serialize Python classes with as_dict(). NumPy scalars and arrays (e.g. float32
+    energies which json.dumps can't serialize) are converted to Python floats and lists.
+    Warning: Other objects without a as_dict() method are replaced with None in the
+    serialized data.
     """
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
     try:
         return obj.as_dict()  # all MSONable objects implement as_dict()
     except AttributeError:
@@ -49,43 +73,330 @@ def as_dict_handler(obj: Any) -> dict[str, Any] | None:
         # removes e.g. non-serializable AseAtoms from M3GNet relaxation trajectories
 
 
-def load(
+def columnar_cache_path(file_path: str) -> str:
+    """Path to the Parquet file that caches a raw JSON data file in columnar format.
+
+    Args:
+        file_path (str): Path to a (possibly compressed) JSON data file.
+
+    Returns:
+        str: Same path with the .json[.gz|.bz2] extension replaced by .parquet.
+    """
+    return f"{file_path.rsplit('.json', 1)[0]}.parquet"
+
+
+def _is_fresh(parquet_path: str, raw_path: str) -> bool:
+    """Whether a Parquet cache file exists and is at least as recent as its raw file."""
+    return os.path.isfile(parquet_path) and (
+        os.path.getmtime(parquet_path) >= os.path.getmtime(raw_path)
+    )
+
+
+def write_parquet(df: pd.DataFrame, path: str) -> None:
+    """Write a dataframe to Parquet. Object columns that hold anything other than
+    strings (e.g. Structure or ComputedStructureEntry dicts) are stored as JSON-encoded
+    strings and their names recorded in the Parquet schema metadata so read_parquet()
+    can decode them again. Writes to a temporary file first and then renames it so an
+    interrupted write never leaves a truncated cache file behind.
+
+    Args:
+        df (pd.DataFrame): Dataframe to write.
+        path (str): Where to write the Parquet file.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    json_cols = [
+        col
+        for col in df
+        if df[col].dtype == object
+        and pd.api.types.infer_dtype(df[col], skipna=True) not in ("string", "empty")
+    ]
+    df_enc = df.copy()  # item assignment keeps non-string column labels intact
+    for col in json_cols:
+        df_enc[col] = [json.dumps(val, default=as_dict_handler) for val in df[col]]
+
+    table = pa.Table.from_pandas(df_enc)
+    metadata = (table.schema.metadata or {}) | {
+        PARQUET_JSON_COLS_KEY: json.dumps([str(col) for col in json_cols]).encode()
+    }
+    table = table.replace_schema_metadata(metadata)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        pq.write_table(table, tmp_path, row_group_size=PARQUET_ROW_GROUP_SIZE)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_parquet(
+    path: str,
+    *,
+    columns: Sequence[str] | None = None,
+    ids: Sequence[str] | None = None,
+) -> pd.DataFrame:
+    """Read a Parquet file written by write_parquet() and decode JSON-encoded columns.
+    Column and row selection are pushed down into the Parquet reader so unselected
+    columns and rows are never decoded.
+
+    Args:
+        path (str): Path to Parquet file.
+        columns (Sequence[str], optional): Only read these columns (plus material_id
+            if present). Columns not in the file are silently skipped. Defaults to None
+            meaning all columns.
+        ids (Sequence[str], optional): Only read rows whose material_id is in ids.
+            Ignored if the file has no material_id column. Defaults to None meaning all
+            rows.
+
+    Returns:
+        pd.DataFrame: Dataframe as it was passed to write_parquet() (or the selected
+            subset of it).
+    """
+    import pyarrow.parquet as pq
+
+    schema = pq.read_schema(path)
+    if columns is not None:
+        columns = [
+            col for col in dict.fromkeys((Key.mat_id, *columns)) if col in schema.names
+        ]
+    filters = None
+    if ids is not None and Key.mat_id in schema.names:
+        filters = [(str(Key.mat_id), "in", list(ids))]
+
+    table = pq.read_table(
+        path, columns=columns, filters=filters, use_pandas_metadata=True
+    )
+    metadata = schema.metadata or {}
+    json_cols = set(json.loads(metadata.get(PARQUET_JSON_COLS_KEY, "[]")))
+    df_out = table.to_pandas()
+    for col in df_out:  # compare as str since pandas metadata restores non-str labels
+        if str(col) in json_cols:
+            df_out[col] = [json.loads(val) for val in df_out[col]]
+    return df_out
+
+
+class LazyMSONable:
+    """Proxy for a serialized pymatgen object (or any MSONable) that decodes its dict
+    with MontyDecoder on first attribute access. Attribute access is forwarded to the
+    decoded object. Use .decode() to get the actual object, e.g. for isinstance checks,
+    len() or iteration. The proxy deliberately doesn't implement __len__, __iter__ or
+    __getitem__ since pandas and numpy would then treat it as a sequence and decode it
+    when storing proxies in a dataframe column.
+    """
+
+    __slots__ = ("_dct", "_obj")
+
+    def __init__(self, dct: dict[str, Any]) -> None:
+        """Wrap a serialized object.
+
+        Args:
+            dct (dict[str, Any]): Output of obj.as_dict().
+        """
+        self._dct: dict[str, Any] | None = dct
+        self._obj: Any = None
+
+    def decode(self) -> Any:
+        """Decode the wrapped dict (only on first call) and return the object."""
+        if self._dct is not None:
+            self._obj = MontyDecoder().process_decoded(self._dct)
+            self._dct = None  # free memory
+        return self._obj
+
+    @property
+    def is_decoded(self) -> bool:
+        """Whether the wrapped dict was already decoded."""
+        return self._dct is None
+
+    def __getattr__(self, name: str) -> Any:
+        """Forward attribute access to the decoded object."""
+        if name.startswith("_"):  # avoid infinite recursion during (un)pickling
+            raise AttributeError(name)
+        return getattr(self.decode(), name)
+
+    def __eq__(self, other: object) -> bool:
+        """Compare decoded objects."""
+        if isinstance(other, LazyMSONable):
+            other = other.decode()
+        return self.decode() == other
+
+    def __repr__(self) -> str:
+        """Repr of the decoded object."""
+        return repr(self.decode())
+
+
+def _decode_chunk(dicts: Sequence[dict[str, Any]]) -> list[Any]:
+    """Decode a chunk of MSONable dicts. Module-level function to be picklable."""
+    decoder = MontyDecoder()
+    return [decoder.process_decoded(dct) for dct in dicts]
+
+
+def hydrate_dicts(
+    dicts: Sequence[dict[str, Any]],
+    *,
+    workers: int = 1,
+    lazy: bool = False,
+    chunk_size: int = 1_000,
+    pbar: bool = True,
+    desc: str | None = None,
+) -> list[Any]:
+    """Convert dicts to pymatgen objects like Structures and ComputedStructureEntries.
+
+    Args:
+        dicts (Sequence[dict[str, Any]]): Serialized MSONable objects.
+        workers (int, optional): Number of processes to decode dicts in. Values < 1
+            mean one process per CPU core. Defaults to 1 (no process pool).
+        lazy (bool, optional): If True, return LazyMSONable proxies that decode on
+            first access instead of decoding now. Defaults to False.
+        chunk_size (int, optional): Number of dicts per unit of work sent to a worker
+            process. Defaults to 1000.
+        pbar (bool, optional): Whether to show a progress bar. Defaults to True.
+        desc (str, optional): Progress bar description. Defaults to None.
+
+    Returns:
+        list[Any]: Decoded objects (or proxies if lazy) in the same order as dicts.
+    """
+    if lazy:
+        return [LazyMSONable(dct) for dct in dicts]
+    if workers < 1:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        return _decode_chunk(tqdm(dicts, desc=desc, disable=not pbar))
+
+    dicts = list(dicts)  # ensure positional slicing for pd.Series
+    chunks = [dicts[idx : idx + chunk_size] for idx in range(0, len(dicts), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        decoded = executor.map(_decode_chunk, chunks)
+        return [
+            obj
+            for chunk in tqdm(decoded, total=len(chunks), desc=desc, disable=not pbar)
+            for obj in chunk
+        ]
+
+
+def get_file_hash_and_size(
+    file_name: str, chunk_size: int = 10_000_000
+) -> tuple[str, int]:
+    """Get the md5 hash and size of a file. File is read in chunks of chunk_size bytes.
+    Default chunk size is 10_000_000 ~= 10MB.
+    """
+    md5 = hashlib.md5()  # noqa: S324
+    size = 0
+    with open(file_name, "rb") as file:
+        while data := file.read(chunk_size):
+            size += len(data)
+            md5.update(data)
+    return md5.hexdigest(), size
+
+
+def download_file(
+    url: str,
+    path: str,
+    *,
+    md5: str | None = None,
+    size: int | None = None,
+    chunk_size: int = 2**20,
+    pbar: bool = True,
+    desc: str | None = None,
+) -> None:
+    """Stream a URL to disk such that path only ever holds a complete and verified file.
+
+    Data is written to path + '.part'. If that file exists from an interrupted earlier
+    download, the download resumes from where it stopped with an HTTP Range request
+    (restarting from scratch if the server doesn't support ranges). Once complete, the
+    file size is checked against the expected size (or the server's Content-Length) and
+    its md5 hash against the expected hash before atomically renaming it to path.
+
+    Args:
+        url (str): URL to download.
+        path (str): Where to save the file.
+        md5 (str, optional): Expected md5 hex digest. Defaults to None (not checked).
+        size (int, optional): Expected file size in bytes. Defaults to None, meaning
+            the size reported by the server is used if available.
+        chunk_size (int, optional): Bytes to read per iteration. Defaults to 1 MiB.
+        pbar (bool, optional): Whether to show a progress bar. Defaults to True.
+        desc (str, optional): Progress bar description. Defaults to None.
+
+    Raises:
+        ValueError: If the downloaded file has the wrong size or md5 hash. Incomplete
+            downloads keep their .part file to be resumed next time, corrupt ones are
+            deleted.
+    """
+    part_path = f"{path}.part"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+    if size is not None and offset > size:  # can't be the start of the right file
+        offset = 0
+
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    try:
+        with urllib.request.urlopen(
+            urllib.request.Request(url, headers=headers)
+        ) as resp:
+            if offset and resp.status != 206:  # server ignored Range header
+                offset = 0
+            content_length = resp.headers.get("Content-Length")
+            if size is None and content_length is not None:
+                size = offset + int(content_length)
+            with (
+                open(part_path, "ab" if offset else "wb") as file,
+                tqdm(
+                    total=size,
+                    initial=offset,
+                    unit="B",
+                    unit_scale=True,
+                    desc=desc,
+                    disable=not pbar,
+                ) as bar,
+            ):
+                while chunk := resp.read(chunk_size):
+                    file.write(chunk)
+                    bar.update(len(chunk))
+    except urllib.error.HTTPError as exc:
+        # 416 Range Not Satisfiable means .part file already holds the whole file
+        if exc.code != 416 or not offset:
+            raise
+
+    actual_md5, actual_size = get_file_hash_and_size(part_path)
+    if size is not None and actual_size != size:
+        if actual_size > size:
+            os.remove(part_path)
+        raise ValueError(
+            f"Downloaded {actual_size:,} bytes from {url=} but expected {size:,}. Run "
+            "again to resume the download."
+        )
+    if md5 is not None and actual_md5 != md5:
+        os.remove(part_path)
+        raise ValueError(f"md5 mismatch for {url=}: got {actual_md5}, expected {md5}")
+
+    os.replace(part_path, path)
+
+
+def fetch(
     key: str,
     *,
     version: str = figshare_versions[-1],
     cache_dir: str | Path = default_cache_dir,
-    hydrate: bool = False,
-    **kwargs: Any,
-) -> pd.DataFrame | PatchedPhaseDiagram:
-    """Download parts of or the full MP training data and WBM test data as pandas
-    DataFrames. The full training and test sets are each about ~500 MB as compressed
-    JSON which will be cached locally to cache_dir for faster re-loading unless
-    cache_dir is set to None.
-
-    See matbench_discovery.data.DATA_FILES for recognized data keys. See [here]
-    (https://janosh.github.io/matbench-discovery/contribute#--direct-download) for file
-    descriptions.
+) -> str:
+    """Download a data file to cache_dir unless it's already cached. Downloads are
+    resumable and verified against the size and md5 hash in the Figshare manifest
+    (matbench_discovery/figshare/{version}.json) if recorded there, else against the
+    server's Content-Length. See download_file().
 
     Args:
-        key (str): Which parts of the MP/WBM data to load. Must be one of
-            list(DATA_FILES).
-        version (str, optional): Which version of the dataset to load. Defaults to
-            latest version of data files published to Figshare. Pass any invalid version
-            to see valid options.
+        key (str): Which data file to fetch. Must be one of list(DATA_FILES).
+        version (str, optional): Which version of the dataset to fetch. Defaults to
+            latest version of data files published to Figshare.
         cache_dir (str, optional): Where to cache data files on local drive. Defaults to
-            '~/.cache/matbench-discovery'. Set to None to disable caching.
-        hydrate (bool, optional): Whether to hydrate pymatgen objects. If False,
-            Structures and ComputedStructureEntries are returned as dictionaries which
-            can be hydrated on-demand with df.col.map(Structure.from_dict). Defaults to
-            False as it noticeably increases load time.
-        **kwargs: Additional keyword arguments passed to pandas.read_json or read_csv,
-            depending on which file is loaded.
+            '~/.cache/matbench-discovery'.
 
     Raises:
-        ValueError: On bad version number or bad data_key.
+        ValueError: On bad version number, bad data_key or bad URL.
 
     Returns:
-        pd.DataFrame: Single dataframe or dictionary of dfs if multiple data requested.
+        str: Path to the cached file.
     """
     if version not in figshare_versions:
         raise ValueError(f"Unexpected {version=}. Must be one of {figshare_versions}.")
@@ -100,13 +411,13 @@ def load(
 
     cache_path = f"{cache_dir}/{file_path}"
     if not os.path.isfile(cache_path):  # download from Figshare URL
-        url = file_urls[key][0]
+        # manifest entries are [url, file_name] or [url, file_name, md5, size]
+        url, _file_name, *checksums = file_urls[key]
+        md5, size = (*checksums, None, None)[:2]
         print(f"Downloading {key!r} from {url}")
         try:
-            # ensure directory exists
             os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-            # download and save to disk
-            urllib.request.urlretrieve(url, cache_path)
+            download_file(url, cache_path, md5=md5, size=size, desc=key)
             print(f"Cached {key!r} to {cache_path!r}")
         except urllib.error.HTTPError as exc:
             raise ValueError(f"Bad {url=}") from exc
@@ -114,7 +425,108 @@ def load(
             print(f"\n\nvariable dump:\n{file_path=},\n{url=}")
             raise
 
+    return cache_path
+
+
+def prefetch(
+    keys: Sequence[str],
+    *,
+    version: str = figshare_versions[-1],
+    cache_dir: str | Path = default_cache_dir,
+    workers: int = 4,
+) -> dict[str, str]:
+    """Download several data files concurrently in a thread pool (downloads are I/O
+    bound). Already cached files are skipped.
+
+    Args:
+        keys (Sequence[str]): Which data files to fetch. Must be keys of DATA_FILES.
+        version (str, optional): Which version of the dataset to fetch. Defaults to
+            latest version of data files published to Figshare.
+        cache_dir (str, optional): Where to cache data files on local drive. Defaults to
+            '~/.cache/matbench-discovery'.
+        workers (int, optional): Max number of concurrent downloads. Defaults to 4.
+
+    Returns:
+        dict[str, str]: Map from data keys to cached file paths.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            key: executor.submit(fetch, key, version=version, cache_dir=cache_dir)
+            for key in keys
+        }
+        return {key: future.result() for key, future in futures.items()}
+
+
+def load(
+    key: str,
+    *,
+    version: str = figshare_versions[-1],
+    cache_dir: str | Path = default_cache_dir,
+    hydrate: bool | Literal["lazy"] = False,
+    workers: int = 1,
+    columns: Sequence[str] | None = None,
+    ids: Sequence[str] | None = None,
+    **kwargs: Any,
+) -> pd.DataFrame | PatchedPhaseDiagram:
+    """Download parts of or the full MP training data and WBM test data as pandas
+    DataFrames. The full training and test sets are each about ~500 MB as compressed
+    JSON which will be cached locally to cache_dir for faster re-loading unless
+    cache_dir is set to None.
+
+    See matbench_discovery.data.DATA_FILES for recognized data keys. See [here]
+    (https://janosh.github.io/matbench-discovery/contribute#--direct-download) for file
+    descriptions.
+
+    Args:
+        key (str): Which parts of the MP/WBM data to load. Must be one of
+            list(DATA_FILES).
+        version (str, optional): Which version of the dataset to load. Defaults to
+            latest version of data files published to Figshare. Pass any invalid version
+            to see valid options.
+        cache_dir (str, optional): Where to cache data files on local drive. Defaults to
+            '~/.cache/matbench-discovery'. Set to None to disable caching.
+        hydrate (bool | 'lazy', optional): Whether to hydrate pymatgen objects. If
+            False, Structures and ComputedStructureEntries are returned as dictionaries
+            which can be hydrated on-demand with df.col.map(Structure.from_dict). If
+            'lazy', dicts are wrapped in LazyMSONable proxies which decode themselves on
+            first attribute access. Defaults to False as it noticeably increases load
+            time.
+        workers (int, optional): Number of processes to hydrate pymatgen objects with.
+            Values < 1 mean one process per CPU core. Ignored unless hydrate=True.
+            Defaults to 1.
+        columns (Sequence[str], optional): Only load these columns. material_id is
+            always included (as index) if the file has it. For CSV and cached Parquet
+            files, unselected columns are never parsed. Defaults to None meaning all
+            columns.
+        ids (Sequence[str], optional): Only load rows with these material IDs. For
+            cached Parquet files, the filter is applied while reading so unselected
+            rows are never decoded. Defaults to None meaning all rows.
+        **kwargs: Additional keyword arguments passed to pandas.read_json or read_csv,
+            depending on which file is loaded. Passing any kwargs bypasses the columnar
+            cache since it only stores dataframes parsed with default reader settings.
+
+    Note: The first time a JSON file is loaded, it is converted to Parquet and saved
+        next to the raw file in cache_dir (see columnar_cache_path()). Later calls read
+        from Parquet which is much faster and uses less memory than pd.read_json. The
+        raw JSON file remains the source of truth: the Parquet file is rebuilt whenever
+        it is older than the raw file and ignored if it fails to load.
+
+    Raises:
+        ValueError: On bad version number or bad data_key.
+        ValueError: If columns or ids are passed for a file that isn't a dataframe, if
+            some requested columns are not in the file or if ids are passed for a file
+            without material_id column.
+
+    Returns:
+        pd.DataFrame: Single dataframe or dictionary of dfs if multiple data requested.
+    """
+    cache_path = fetch(key, version=version, cache_dir=cache_dir)
+    file_path = DataFiles.__dict__[key]
+
     print(f"Loading {key!r} from cached file at {cache_path!r}")
+    is_df_file = ".pkl" not in file_path and ".pth" not in file_path
+    if not is_df_file and (columns is not None or ids is not None):
+        raise ValueError(f"columns and ids are only supported for dataframes, {key=}")
     if ".pkl" in file_path:  # handle key='mp_patched_phase_diagram' separately
         with gzip.open(cache_path, "rb") as zip_file:
             return pickle.load(zip_file)  # noqa: S301
@@ -123,24 +535,58 @@ def load(
 
     csv_ext = (".csv", ".csv.gz", ".csv.bz2")
     reader = pd.read_csv if file_path.endswith(csv_ext) else pd.read_json
-    try:
-        df_out = reader(cache_path, **kwargs)
-    except Exception:
-        print(f"\n\nvariable dump:\n{file_path=},\n{reader=}\n{kwargs=}")
-        raise
+    if reader is pd.read_csv and columns is not None:
+        # don't parse unselected CSV columns
+        selected_cols = {Key.mat_id, *columns}
+        kwargs.setdefault("usecols", lambda col: col in selected_cols)
+    # only JSON files are worth caching in columnar format, CSVs already load fast
+    use_columnar_cache = reader is pd.read_json and not kwargs
+    parquet_path = columnar_cache_path(cache_path)
+
+    df_out = None
+    # use columnar cache only if it's at least as recent as the raw file
+    if use_columnar_cache and _is_fresh(parquet_path, cache_path):
+        try:
+            df_out = read_parquet(parquet_path, columns=columns, ids=ids)
+        except Exception as exc:
+            print(f"Failed to read {parquet_path=}, falling back to JSON: {exc}")
+
+    if df_out is None:
+        try:
+            df_out = reader(cache_path, **kwargs)
+        except Exception:
+            print(f"\n\nvariable dump:\n{file_path=},\n{reader=}\n{kwargs=}")
+            raise
+
+        if use_columnar_cache:
+            try:
+                write_parquet(df_out, parquet_path)
+            except Exception as exc:
+                print(f"Failed to write columnar cache {parquet_path=}: {exc}")
+
+    # no-ops if column/row selection was already pushed down into the reader
+    if ids is not None:
+        if Key.mat_id not in df_out:
+            raise ValueError(f"Can't select ids for {key=} without {Key.mat_id} column")
+        df_out = df_out[df_out[Key.mat_id].isin(ids)]
+    if columns is not None:
+        if missing_cols := set(columns) - {*df_out, Key.mat_id}:
+            raise ValueError(f"{missing_cols=} not in {key=}, available {list(df_out)}")
+        df_out = df_out[
+            [col for col in dict.fromkeys((Key.mat_id, *columns)) if col in df_out]
+        ]
 
     if Key.mat_id in df_out:
         df_out = df_out.set_index(Key.mat_id)
     if hydrate:
         for col in df_out:
-            if not isinstance(df_out[col].iloc[0], dict):
+            if len(df_out) == 0 or not isinstance(df_out[col].iloc[0], dict):
                 continue
             try:
                 # convert dicts to pymatgen Structures and ComputedStructureEntries
-                df_out[col] = [
-                    MontyDecoder().process_decoded(dct)
-                    for dct in tqdm(df_out[col], desc=col)
-                ]
+                df_out[col] = hydrate_dicts(
+                    df_out[col], workers=workers, lazy=hydrate == "lazy", desc=col
+                )
             except Exception:
                 print(f"\n\nvariable dump:\n{col=},\n{df_out[col]=}")
                 raise
@@ -148,11 +594,131 @@ def load(
     return df_out
 
 
+def shard_bounds(n_rows: int, shard_idx: int, n_shards: int) -> tuple[int, int]:
+    """Start (inclusive) and stop (exclusive) row of a shard. Splits rows the same way
+    as np.array_split(rows, n_shards)[shard_idx], i.e. the first n_rows % n_shards
+    shards get one extra row.
+
+    Args:
+        n_rows (int): Total number of rows.
+        shard_idx (int): 0-based index of the shard.
+        n_shards (int): Total number of shards.
+
+    Returns:
+        tuple[int, int]: start and stop row of the shard.
+    """
+    if not 0 <= shard_idx < n_shards:
+        raise ValueError(f"{shard_idx=} must be in [0, {n_shards=})")
+    size, remainder = divmod(n_rows, n_shards)
+    start = shard_idx * size + min(shard_idx, remainder)
+    return start, start + size + (shard_idx < remainder)
+
+
+def iter_records(
+    key: str,
+    *,
+    shard: tuple[int, int] = (0, 1),
+    ids: Collection[str] | None = None,
+    batch_size: int = 1_000,
+    column: str | None = None,
+    version: str = figshare_versions[-1],
+    cache_dir: str | Path = default_cache_dir,
+) -> Iterator[list[tuple[str, Any]]]:
+    """Stream (material_id, record) pairs from a data file in batches, reading only the
+    requested shard. Backed by the Parquet cache written by load() which is split into
+    row groups of PARQUET_ROW_GROUP_SIZE rows so only the row groups overlapping the
+    shard are decompressed and only rows inside the shard are JSON-decoded. Memory use
+    is bounded by batch_size and row group size rather than file size.
+
+    If the Parquet cache doesn't exist yet (or is older than the raw file), it is built
+    with load() first which parses the whole raw file once.
+
+    Args:
+        key (str): Which data file to stream. Must be a JSON file in DATA_FILES.
+        shard (tuple[int, int], optional): (shard_idx, n_shards) with 0-based
+            shard_idx. Rows are split like np.array_split(df, n_shards)[shard_idx].
+            Defaults to (0, 1), i.e. the whole file.
+        ids (Collection[str], optional): Only yield rows with these material IDs, e.g.
+            one shard of a cost-balanced manifest from matbench_discovery.shard. Rows
+            are yielded in file order. Can't be combined with shard. Defaults to None.
+        batch_size (int, optional): Number of records per yielded batch. Defaults to
+            1000.
+        column (str, optional): Which column to yield records from. Defaults to
+            RECORD_COLS[key], e.g. 'initial_structure' for 'wbm_initial_structures'.
+        version (str, optional): Data version passed to load(). Defaults to latest.
+        cache_dir (str, optional): Where data files are cached. Defaults to
+            default_cache_dir.
+
+    Raises:
+        ValueError: If key is not a JSON data file, column is unknown, shard is
+            out of range or both shard and ids are given.
+
+    Yields:
+        list[tuple[str, Any]]: Batches of (material_id, record) pairs where record is
+            e.g. a Structure or ComputedStructureEntry dict.
+    """
+    import pyarrow.parquet as pq
+
+    if key not in DATA_FILES or ".json" not in DataFiles.__dict__[key]:
+        json_keys = [key for key, path in DATA_FILES.items() if ".json" in path]
+        raise ValueError(f"Unknown {key=}, must be one of {json_keys}.")
+    column = column or RECORD_COLS.get(key)
+    if column is None:
+        raise ValueError(f"No default column for {key=}, pass column explicitly.")
+    shard_idx, n_shards = shard
+    if not 0 <= shard_idx < n_shards:
+        raise ValueError(f"{shard_idx=} must be in [0, {n_shards=})")
+    if ids is not None and n_shards > 1:
+        raise ValueError(f"Pass either {shard=} or ids, not both")
+    id_set = None if ids is None else set(ids)
+
+    cache_path = f"{cache_dir}/{DataFiles.__dict__[key]}"
+    parquet_path = columnar_cache_path(cache_path)
+    if not os.path.isfile(cache_path) or not _is_fresh(parquet_path, cache_path):
+        # download and/or convert raw file to Parquet
+        load(key, version=version, cache_dir=cache_dir, columns=[column], ids=[])
+
+    pq_file = pq.ParquetFile(parquet_path)
+    if column not in pq_file.schema_arrow.names:
+        raise ValueError(f"{column=} not in {key=}, available {pq_file.schema.names}")
+    metadata = pq_file.schema_arrow.metadata or {}
+    is_json = column in json.loads(metadata.get(PARQUET_JSON_COLS_KEY, "[]"))
+
+    start, stop = shard_bounds(pq_file.metadata.num_rows, shard_idx, n_shards)
+    # find row groups overlapping the shard and the index of their first row
+    row_groups: list[int] = []
+    row_idx = offset = 0
+    for rg_idx in range(pq_file.num_row_groups):
+        rg_rows = pq_file.metadata.row_group(rg_idx).num_rows
+        if offset < stop and offset + rg_rows > start:
+            if not row_groups:
+                row_idx = offset
+            row_groups.append(rg_idx)
+        offset += rg_rows
+
+    batch: list[tuple[str, Any]] = []
+    for record_batch in pq_file.iter_batches(
+        batch_size=batch_size, row_groups=row_groups, columns=[Key.mat_id, column]
+    ):
+        mat_ids, records = (col.to_pylist() for col in record_batch.columns)
+        for mat_id, record in zip(mat_ids, records):
+            if start <= row_idx < stop and (id_set is None or mat_id in id_set):
+                batch.append((mat_id, json.loads(record) if is_json else record))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+            row_idx += 1
+    if batch:
+        yield batch
+
+
 def glob_to_df(
     pattern: str,
     *,
     reader: Callable[[Any], pd.DataFrame] | None = None,
     pbar: bool = True,
+    workers: int = 1,
+    cache_path: str | None = None,
     **kwargs: Any,
 ) -> pd.DataFrame:
     """Combine data files matching a glob pattern into a single dataframe.
@@ -162,24 +728,67 @@ def glob_to_df(
         reader (Callable[[Any], pd.DataFrame], optional): Function that loads data from
             disk. Defaults to pd.read_csv if ".csv" in pattern else pd.read_json.
         pbar (bool, optional): Whether to show progress bar. Defaults to True.
+        workers (int, optional): Number of processes to read files in. Values < 1 mean
+            os.cpu_count(). reader must be picklable (i.e. a module-level function)
+            if workers > 1. Defaults to 1.
+        cache_path (str, optional): Pickle file in which to cache the dataframes read
+            from each file, keyed by file path and modification time. When calling
+            glob_to_df again with the same cache_path (e.g. after more slurm array
+            jobs finished), only new or modified files are read. The cache is discarded
+            if reader or kwargs change. Defaults to None (no caching).
         **kwargs: Keyword arguments passed to reader (i.e. pd.read_csv or pd.read_json).
 
     Returns:
         pd.DataFrame: Combined dataframe.
     """
-    reader = reader or pd.read_csv if ".csv" in pattern.lower() else pd.read_json
+    reader = reader or (pd.read_csv if ".csv" in pattern.lower() else pd.read_json)
 
     # prefix pattern with ROOT if not absolute path
-    files = glob(pattern)
+    files = sorted(glob(pattern))
     if len(files) == 0:
         raise FileNotFoundError(f"No files matching glob {pattern=}")
 
-    sub_dfs = {}  # used to join slurm job array results into single df
-    for file in tqdm(files, disable=not pbar):
-        df_i = reader(file, **kwargs)
-        sub_dfs[file] = df_i
-
-    return pd.concat(sub_dfs.values())
+    mtimes = {file: os.path.getmtime(file) for file in files}
+    cached: dict[str, tuple[float, pd.DataFrame]] = {}
+    if cache_path:
+        # functools.partial and callable objects have no __qualname__
+        reader_name = getattr(reader, "__qualname__", repr(reader))
+        reader_key = f"{getattr(reader, '__module__', '')}.{reader_name}({kwargs})"
+    if cache_path and os.path.isfile(cache_path):
+        with open(cache_path, "rb") as file:
+            cache = pickle.load(file)  # noqa: S301
+        if cache.get("reader") == reader_key:
+            cached = cache["files"]
+
+    # used to join slurm job array results into single df
+    sub_dfs = {
+        file: cached[file][1]
+        for file in files
+        if file in cached and cached[file][0] == mtimes[file]
+    }
+    to_read = [file for file in files if file not in sub_dfs]
+
+    if workers < 1:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(to_read) < 2:
+        for file in tqdm(to_read, disable=not pbar):
+            sub_dfs[file] = reader(file, **kwargs)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(to_read))) as executor:
+            dfs = executor.map(functools.partial(reader, **kwargs), to_read)
+            for file, df_i in zip(
+                to_read, tqdm(dfs, total=len(to_read), disable=not pbar), strict=True
+            ):
+                sub_dfs[file] = df_i
+
+    if cache_path and to_read:
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "wb") as file:
+            files_cache = {file: (mtimes[file], sub_dfs[file]) for file in files}
+            pickle.dump({"reader": reader_key, "files": files_cache}, file)
+        os.replace(tmp_path, cache_path)
+
+    return pd.concat([sub_dfs[file] for file in files])
 
 
 class Files(dict):  # type: ignore[type-arg]
@@ -272,6 +881,16 @@ class DataFiles(Files):
 DATA_FILES = DataFiles()
 
 
-df_wbm = load("wbm_summary")
-# str() around Key.mat_id added for https://github.com/janosh/matbench-discovery/issues/81
-df_wbm[str(Key.mat_id)] = df_wbm.index
+def __getattr__(name: str) -> Any:
+    """Load df_wbm (the WBM summary dataframe) on first access rather than at import
+    time and cache it in the module namespace so later lookups are regular attribute
+    accesses.
+    """
+    if name != "df_wbm":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    df_wbm = load("wbm_summary")
+    # str() around Key.mat_id added for https://github.com/janosh/matbench-discovery/issues/81
+    df_wbm[str(Key.mat_id)] = df_wbm.index
+    globals()[name] = df_wbm
+    return df_wbm
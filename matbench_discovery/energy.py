@@ -2,12 +2,17 @@
 pymatgen EntryLikes.
 """
 
+import functools
 import itertools
+import warnings
 from collections.abc import Sequence
+from typing import Any
 
+import numpy as np
 import pandas as pd
+import scipy.sparse
 from pymatgen.analysis.phase_diagram import Entry, PDEntry
-from pymatgen.core import Composition
+from pymatgen.core import Composition, Element
 from pymatgen.entries.computed_entries import ComputedEntry
 from pymatgen.util.typing import EntryLike
 from tqdm import tqdm
@@ -65,24 +70,43 @@ def get_elemental_ref_entries(
     return elemental_ref_entries
 
 
-# contains all MP elemental reference entries to compute formation energies
-# produced by get_elemental_ref_entries() in build_phase_diagram.py
-mp_elem_ref_entries = (
-    pd.read_json(DATA_FILES.mp_elemental_ref_entries, typ="series")
-    .map(ComputedEntry.from_dict)
-    .to_dict()
-)
+@functools.cache
+def _load_mp_elem_refs() -> dict[str, dict[str, Any]]:
+    """Load MP elemental reference entries and energies from disk (downloading them if
+    needed). Cached so the file is only parsed once per session.
+    """
+    # contains all MP elemental reference entries to compute formation energies
+    # produced by get_elemental_ref_entries() in build_phase_diagram.py
+    mp_elem_ref_entries = (
+        pd.read_json(DATA_FILES.mp_elemental_ref_entries, typ="series")
+        .map(ComputedEntry.from_dict)
+        .to_dict()
+    )
+
+    # tested to agree with TRI's MP reference energies
+    # https://github.com/TRI-AMDD/CAMD/blob/1c965cba636531e542f4821a555b98b2d81ed034/camd/utils/data.py#L134
+    mp_elemental_ref_energies = {
+        elem: round(entry.energy_per_atom, 4)
+        for elem, entry in mp_elem_ref_entries.items()
+    }
+    return dict(
+        mp_elem_ref_entries=mp_elem_ref_entries,
+        mp_elemental_ref_energies=mp_elemental_ref_energies,
+    )
+
 
-# tested to agree with TRI's MP reference energies
-# https://github.com/TRI-AMDD/CAMD/blob/1c965cba636531e542f4821a555b98b2d81ed034/camd/utils/data.py#L134
-mp_elemental_ref_energies = {
-    elem: round(entry.energy_per_atom, 4) for elem, entry in mp_elem_ref_entries.items()
-}
+def __getattr__(name: str) -> Any:
+    """Load mp_elem_ref_entries and mp_elemental_ref_energies on first access rather
+    than at import time.
+    """
+    if name not in ("mp_elem_ref_entries", "mp_elemental_ref_energies"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return _load_mp_elem_refs()[name]
 
 
 def get_e_form_per_atom(
     entry: EntryLike,
-    elemental_ref_energies: dict[str, float] = mp_elemental_ref_energies,
+    elemental_ref_energies: dict[str, float] | None = None,
 ) -> float:
     """Get the formation energy of a composition from a list of entries and a dict
     mapping elements to reference energies.
@@ -94,8 +118,9 @@ def get_e_form_per_atom(
         elemental_ref_energies (dict[str, float], optional): Must be a covering set (for
             entry) of terminal reference energies, i.e. eV/atom of the lowest energy
             elemental phase for each element. Defaults to MP elemental reference
-            energies as collected on 2022-09-19 get_elemental_ref_entries(). This was
-            tested to give the same formation energies as found in MP.
+            energies as collected on 2022-09-19 get_elemental_ref_entries() (loaded on
+            first use). This was tested to give the same formation energies as found in
+            MP.
 
     Returns:
         float: formation energy in eV/atom.
@@ -111,6 +136,9 @@ def get_e_form_per_atom(
             f"{entry=} must be Entry (or subclass like ComputedEntry) or dict"
         )
 
+    if elemental_ref_energies is None:
+        elemental_ref_energies = _load_mp_elem_refs()["mp_elemental_ref_energies"]
+
     e_refs = {str(el): elemental_ref_energies[str(el)] for el in comp}
 
     for key, ref_entry in e_refs.items():
@@ -120,3 +148,479 @@ def get_e_form_per_atom(
     e_form = energy - sum(comp[el] * e_refs[str(el)] for el in comp)
 
     return e_form / comp.num_atoms
+
+
+# number of columns in composition matrices, one per atomic number (0 unused)
+N_ELEMENTS = 119
+
+
+@functools.cache
+def _parse_formula(formula: str) -> tuple[tuple[int, float], ...]:
+    """Parse a formula string into (atomic number, amount) pairs. Cached since the
+    same formulas recur many times (e.g. polymorphs in WBM).
+    """
+    return tuple((el.Z, amt) for el, amt in Composition(formula).items())
+
+
+def _composition_amounts(
+    comp: str | Composition | dict[str, float],
+) -> tuple[tuple[int, float], ...]:
+    if isinstance(comp, str):
+        return _parse_formula(comp)
+    if isinstance(comp, dict):
+        return tuple((Element(el).Z, amt) for el, amt in comp.items())
+    return tuple((el.Z, amt) for el, amt in comp.items())
+
+
+@functools.lru_cache(maxsize=8)
+def _formulas_to_matrix(formulas: tuple[str, ...]) -> scipy.sparse.csr_matrix:
+    return composition_matrix(list(formulas), cache=False)
+
+
+def composition_matrix(
+    compositions: Sequence[str | Composition | dict[str, float]],
+    *,
+    cache: bool = True,
+) -> scipy.sparse.csr_matrix:
+    """Convert compositions into a sparse (n_compositions x N_ELEMENTS) matrix of
+    element amounts, with column index = atomic number.
+
+    Args:
+        compositions (Sequence[str | Composition | dict[str, float]]): Formula strings,
+            pymatgen Compositions or dicts mapping element symbols to amounts.
+        cache (bool, optional): If all compositions are formula strings, cache the
+            parsed matrix so repeated calls with the same formulas (e.g. one call per
+            model for the same test set) are free. Defaults to True.
+
+    Returns:
+        scipy.sparse.csr_matrix: Element amounts (not fractions) for each composition.
+    """
+    if cache and all(isinstance(comp, str) for comp in compositions):
+        return _formulas_to_matrix(tuple(compositions))  # type: ignore[arg-type]
+
+    indptr, indices, amounts = [0], [], []
+    for comp in compositions:
+        for atomic_num, amt in _composition_amounts(comp):
+            indices.append(atomic_num)
+            amounts.append(amt)
+        indptr.append(len(indices))
+
+    return scipy.sparse.csr_matrix(
+        (np.array(amounts, dtype=float), np.array(indices, dtype=int), indptr),
+        shape=(len(compositions), N_ELEMENTS),
+    )
+
+
+def get_e_form_per_atom_batch(
+    energies: Sequence[float] | np.ndarray,
+    compositions: Sequence[str | Composition | dict[str, float]]
+    | scipy.sparse.spmatrix,
+    elemental_ref_energies: dict[str, float] | None = None,
+) -> np.ndarray:
+    """Vectorized get_e_form_per_atom() for many materials at once. Compositions are
+    converted into a sparse (n_materials x n_elements) amount matrix so all formation
+    energies are a single sparse mat-vec with a vector of elemental reference energies
+    indexed by atomic number.
+
+    Args:
+        energies (Sequence[float] | np.ndarray): Total (not per-atom) energies in eV.
+        compositions (Sequence[str | Composition | dict] | scipy.sparse.spmatrix):
+            Formula strings, pymatgen Compositions, dicts mapping element symbols to
+            amounts or a precomputed composition_matrix(). Parsed matrices for formula
+            strings are cached across calls.
+        elemental_ref_energies (dict[str, float], optional): Terminal reference
+            energies in eV/atom covering all elements in compositions. Defaults to MP
+            elemental reference energies (see get_e_form_per_atom()).
+
+    Raises:
+        ValueError: If energies and compositions have different lengths or if
+            reference energies are missing for some elements.
+
+    Returns:
+        np.ndarray: Formation energies in eV/atom.
+    """
+    if elemental_ref_energies is None:
+        elemental_ref_energies = _load_mp_elem_refs()["mp_elemental_ref_energies"]
+
+    if not scipy.sparse.issparse(compositions):
+        compositions = composition_matrix(compositions)  # type: ignore[arg-type]
+    energies = np.asarray(energies, dtype=float)
+    if len(energies) != compositions.shape[0]:
+        raise ValueError(f"{len(energies)=} != {compositions.shape[0]=}")
+
+    ref_energies = np.full(N_ELEMENTS, np.nan)
+    for elem, e_ref in elemental_ref_energies.items():
+        ref_energies[Element(elem).Z] = e_ref
+
+    used_atomic_nums = np.unique(compositions.indices)
+    if missing := [
+        Element.from_Z(z).symbol for z in used_atomic_nums if np.isnan(ref_energies[z])
+    ]:
+        raise ValueError(f"Missing elemental reference energies for {missing}")
+
+    # sparse mat-vec only touches stored amounts so NaNs of unused elements are ignored
+    e_refs = compositions @ ref_energies
+    n_atoms = np.asarray(compositions.sum(axis=1)).ravel()
+    return (energies - e_refs) / n_atoms
+
+
+# anions that get MP2020 composition corrections, in the order pymatgen applies them
+MP2020_ANIONS = ("Br", "I", "Se", "Si", "Sb", "Te", "H", "N", "F", "Cl")
+# formula-based oxide types pymatgen uses for entries without structure
+_PEROXIDES = "Li2O2 Na2O2 K2O2 Cs2O2 Rb2O2 BeO2 MgO2 CaO2 SrO2 BaO2".split()
+_SUPEROXIDES = "LiO2 NaO2 KO2 RbO2 CsO2".split()
+_OZONIDES = "LiO3 NaO3 KO3 NaO5".split()
+# adjustment kinds in pymatgen's order: S, O, MP2020_ANIONS, GGA/GGA+U mixing
+_KIND_S, _KIND_O, _KIND_U = 0, 1, 2 + len(MP2020_ANIONS)
+
+
+@functools.cache
+def _mp2020_tables() -> dict[str, Any]:
+    """Per-element MP2020 correction, uncertainty and Hubbard U lookup arrays indexed
+    by atomic number. Cached so the compatibility config is only parsed once.
+    """
+    from pymatgen.entries.compatibility import MaterialsProject2020Compatibility
+
+    compat = MaterialsProject2020Compatibility()
+    with warnings.catch_warnings():  # no electronegativity for noble gases
+        warnings.simplefilter("ignore")
+        electroneg = np.array(
+            [np.nan] + [Element.from_Z(z).X for z in range(1, N_ELEMENTS)]
+        )
+
+    anion_kinds = np.full(N_ELEMENTS, -1)
+    for idx, anion in enumerate(MP2020_ANIONS):
+        if anion in compat.comp_correction:
+            anion_kinds[Element(anion).Z] = 2 + idx
+
+    u_tables = {}
+    for anion in ("O", "F"):
+        has_u_corr = np.zeros(N_ELEMENTS, dtype=bool)
+        u_corr, u_err, expected_u = np.zeros((3, N_ELEMENTS))
+        for elem, corr in compat.u_corrections.get(anion, {}).items():
+            z = Element(elem).Z
+            has_u_corr[z] = True
+            u_corr[z], u_err[z] = corr, compat.u_errors[anion][elem]
+        for elem, u_val in compat.u_settings.get(anion, {}).items():
+            expected_u[Element(elem).Z] = u_val
+        u_tables[Element(anion).Z] = (has_u_corr, u_corr, u_err, expected_u)
+
+    return dict(
+        compat_dict=compat.as_dict(),
+        comp_correction=compat.comp_correction,
+        comp_errors=compat.comp_errors,
+        electroneg=electroneg,
+        anion_kinds=anion_kinds,
+        u_tables=u_tables,
+    )
+
+
+def _as_composition(comp: str | Composition | dict[str, float]) -> Composition:
+    return comp if isinstance(comp, Composition) else Composition(comp)
+
+
+@functools.cache
+def _formula_oxide_type(reduced_formula: str) -> str:
+    if reduced_formula in _PEROXIDES:
+        return "peroxide"
+    if reduced_formula in _SUPEROXIDES:
+        return "superoxide"
+    if reduced_formula in _OZONIDES:
+        return "ozonide"
+    return "oxide"
+
+
+@functools.cache
+def _guess_oxidation_states(
+    comp_key: tuple[tuple[str, float], ...],
+) -> dict[str, float]:
+    """Cached version of the oxidation state guess MP2020 falls back to when entries
+    have no oxidation_states in their data (the slowest part of pymatgen's scheme).
+    """
+    try:
+        oxi_states = Composition(dict(comp_key)).oxi_state_guesses(max_sites=-20)
+    except ValueError:
+        oxi_states = ({},)
+    return (oxi_states or ({},))[0]
+
+
+def _mp2020_adjustment_table(
+    compositions: Sequence[str | Composition | dict[str, float]],
+    *,
+    oxide_types: Sequence[str | None] | None = None,
+    sulfide_types: Sequence[str | None] | None = None,
+    oxidation_states: Sequence[dict[str, float] | None] | None = None,
+    hubbards: Sequence[dict[str, float] | None] | None = None,
+) -> dict[str, Any]:
+    """Evaluate MP2020 corrections for all (composition, element) pairs of a sparse
+    composition matrix at once. See get_mp2020_corrections() for args.
+
+    Returns:
+        dict[str, Any]: Arrays aligned with the stored entries of the composition
+            matrix (rows, atomic_nums, amounts, kinds, per_atom, errors), the anion
+            type used for each oxygen-containing row (oxide_types) and a per-row mask
+            of compositions with incompatible Hubbard U values (invalid).
+    """
+    tables = _mp2020_tables()
+    comp_correction, comp_errors = tables["comp_correction"], tables["comp_errors"]
+    n_comps = len(compositions)
+    comp_mat = composition_matrix(compositions)
+    indptr, atomic_nums, amounts = comp_mat.indptr, comp_mat.indices, comp_mat.data
+    n_elems = np.diff(indptr)
+    rows = np.repeat(np.arange(n_comps), n_elems)
+    # pymatgen applies no corrections to elements
+    multi = (n_elems > 1)[rows]
+
+    # most electronegative element of each composition (pymatgen sorts elements by
+    # electronegativity and picks the last), resolved in Python for ties and elements
+    # without electronegativity where the result depends on element order
+    electroneg = np.where(amounts > 0, tables["electroneg"][atomic_nums], -np.inf)
+    max_electroneg = np.full(n_comps, -np.inf)
+    np.maximum.at(max_electroneg, rows, electroneg)
+    is_max = electroneg == max_electroneg[rows]
+    n_max = np.bincount(rows[is_max], minlength=n_comps)
+    ambiguous = np.isnan(max_electroneg) | (n_max != 1)
+    most_electroneg = np.zeros(n_comps, dtype=int)
+    unique_max = is_max & ~ambiguous[rows]
+    most_electroneg[rows[unique_max]] = atomic_nums[unique_max]
+    for row in np.flatnonzero(ambiguous & (n_elems > 0)):
+        comp = _as_composition(compositions[row])
+        elems = sorted(
+            (el for el in comp.elements if comp[el] > 0), key=lambda el: el.X
+        )
+        most_electroneg[row] = elems[-1].Z
+
+    kinds = np.full(len(rows), -1)
+    per_atom, errors = np.zeros((2, len(rows)))
+
+    # sulfide correction (sulfates and compositions without S get none)
+    for idx in np.flatnonzero((atomic_nums == 16) & multi):
+        sf_type = (sulfide_types[rows[idx]] if sulfide_types else None) or "sulfide"
+        if sf_type in ("sulfide", "polysulfide"):
+            kinds[idx] = _KIND_S
+            per_atom[idx], errors[idx] = comp_correction["S"], comp_errors["S"]
+
+    # oxide, peroxide, superoxide and ozonide corrections
+    row_oxide_types: dict[int, str] = {}
+    for idx in np.flatnonzero((atomic_nums == 8) & multi):
+        row = rows[idx]
+        ox_type = oxide_types[row] if oxide_types else None
+        if not ox_type:
+            reduced_formula = _as_composition(compositions[row]).reduced_formula
+            ox_type = _formula_oxide_type(reduced_formula)
+        if ox_type == "hydroxide":
+            ox_type = "oxide"
+        row_oxide_types[row] = ox_type
+        kinds[idx] = _KIND_O
+        per_atom[idx], errors[idx] = comp_correction[ox_type], comp_errors[ox_type]
+
+    # anion corrections apply if the anion is the most electronegative element, else
+    # only if its (guessed) oxidation state is negative. Guesses are only needed for
+    # the second case.
+    anion_kinds = tables["anion_kinds"][atomic_nums]
+    is_anion = (anion_kinds >= 0) & multi
+    apply_anion = is_anion & (atomic_nums == most_electroneg[rows])
+    for idx in np.flatnonzero(is_anion & ~apply_anion):
+        row = rows[idx]
+        oxi_states = oxidation_states[row] if oxidation_states else None
+        if oxi_states is None:
+            comp = _as_composition(compositions[row])
+            comp_key = tuple((el.symbol, amt) for el, amt in comp.items())
+            oxi_states = _guess_oxidation_states(comp_key)
+        apply_anion[idx] = (
+            oxi_states.get(Element.from_Z(atomic_nums[idx]).symbol, 0) < 0
+        )
+    for idx in np.flatnonzero(apply_anion):
+        anion = MP2020_ANIONS[anion_kinds[idx] - 2]
+        kinds[idx] = anion_kinds[idx]
+        per_atom[idx], errors[idx] = comp_correction[anion], comp_errors[anion]
+
+    # GGA/GGA+U mixing corrections for oxides and fluorides and check U values match
+    # the ones MP uses (0 for compositions whose most electronegative element is
+    # neither O nor F)
+    expected_u = np.zeros(len(rows))
+    for anion_z, (has_u_corr, u_corr, u_err, anion_u) in tables["u_tables"].items():
+        mask = multi & (most_electroneg[rows] == anion_z)
+        expected_u[mask] = anion_u[atomic_nums[mask]]
+        mask &= has_u_corr[atomic_nums]
+        kinds[mask] = _KIND_U
+        per_atom[mask], errors[mask] = (
+            u_corr[atomic_nums[mask]],
+            u_err[atomic_nums[mask]],
+        )
+    actual_u = np.zeros(len(rows))
+    for row, row_hubbards in enumerate(hubbards or ()):
+        if not row_hubbards:
+            continue
+        for idx in range(indptr[row], indptr[row + 1]):
+            symbol = Element.from_Z(atomic_nums[idx]).symbol
+            actual_u[idx] = row_hubbards.get(symbol, 0)
+    bad_u = multi & (actual_u != expected_u)
+    invalid = np.bincount(rows[bad_u], minlength=n_comps) > 0
+
+    return dict(
+        rows=rows,
+        atomic_nums=atomic_nums,
+        amounts=amounts,
+        kinds=kinds,
+        per_atom=per_atom,
+        errors=errors,
+        oxide_types=row_oxide_types,
+        invalid=invalid,
+    )
+
+
+def get_mp2020_corrections(
+    compositions: Sequence[str | Composition | dict[str, float]],
+    *,
+    oxide_types: Sequence[str | None] | None = None,
+    sulfide_types: Sequence[str | None] | None = None,
+    oxidation_states: Sequence[dict[str, float] | None] | None = None,
+    hubbards: Sequence[dict[str, float] | None] | None = None,
+) -> np.ndarray:
+    """Vectorized MaterialsProject2020Compatibility energy corrections for many
+    compositions at once. Per-element anion and GGA/GGA+U mixing corrections are
+    looked up in precomputed tables indexed by atomic number and summed over a sparse
+    composition matrix.
+
+    The only structure-dependent inputs are the oxide and sulfide types which
+    pymatgen determines from bond lengths. Pass them in (e.g. from
+    pymatgen.analysis.structure_analyzer.oxide_type()) for compositions that need
+    them. Without them, pymatgen's formula-based defaults for entries without
+    structure are used.
+
+    Args:
+        compositions (Sequence[str | Composition | dict[str, float]]): Formula strings,
+            pymatgen Compositions or dicts mapping element symbols to amounts.
+        oxide_types (Sequence[str | None], optional): Per composition 'oxide',
+            'peroxide', 'superoxide', 'ozonide' or 'hydroxide'. None entries use
+            formula-based detection of common peroxides etc. Defaults to None.
+        sulfide_types (Sequence[str | None], optional): Per composition 'sulfide',
+            'polysulfide' or 'sulfate' (no correction). None entries mean 'sulfide'.
+            Defaults to None.
+        oxidation_states (Sequence[dict[str, float] | None], optional): Per
+            composition oxidation states by element symbol. None entries are guessed
+            from composition where needed (cached). Defaults to None.
+        hubbards (Sequence[dict[str, float] | None], optional): Per composition
+            Hubbard U values by element symbol. None entries mean a GGA calculation.
+            Defaults to None.
+
+    Returns:
+        np.ndarray: Total (not per-atom) energy corrections in eV. NaN for
+            compositions whose Hubbard U values are incompatible with MP2020.
+    """
+    table = _mp2020_adjustment_table(
+        compositions,
+        oxide_types=oxide_types,
+        sulfide_types=sulfide_types,
+        oxidation_states=oxidation_states,
+        hubbards=hubbards,
+    )
+    corrections = np.bincount(
+        table["rows"],
+        weights=table["per_atom"] * table["amounts"],
+        minlength=len(compositions),
+    )
+    corrections[table["invalid"]] = np.nan
+    return corrections
+
+
+def process_entries_mp2020(
+    entries: Sequence[ComputedEntry],
+) -> list[ComputedEntry]:
+    """Fast drop-in for MaterialsProject2020Compatibility().process_entries(entries,
+    clean=True). Corrections are computed with get_mp2020_corrections() and only the
+    oxide/sulfide type detection of entries with structures (which needs bond-length
+    analysis) goes through pymatgen entry by entry.
+
+    Like pymatgen, entries are corrected in place (previous energy adjustments are
+    removed) and incompatible entries (wrong run type, POTCARs or U values) are
+    excluded from the returned list. Unlike pymatgen, guessed oxidation states are
+    not stored in entry.data.
+
+    Args:
+        entries (Sequence[ComputedEntry]): ComputedEntries or
+            ComputedStructureEntries from MP-compatible VASP calculations.
+
+    Returns:
+        list[ComputedEntry]: Corrected entries compatible with MP2020, in input order.
+    """
+    from pymatgen.analysis.structure_analyzer import oxide_type, sulfide_type
+    from pymatgen.entries.compatibility import CompatibilityError, PotcarCorrection
+    from pymatgen.entries.computed_entries import CompositionEnergyAdjustment
+    from pymatgen.io.vasp.sets import MPRelaxSet
+
+    potcar_check = PotcarCorrection(MPRelaxSet)
+    compositions, oxide_types, sulfide_types, is_compatible = [], [], [], []
+    for entry in entries:
+        entry.energy_adjustments = []
+        comp = entry.composition
+        compositions.append(comp)
+
+        try:
+            if (run_type := entry.parameters.get("run_type")) not in ("GGA", "GGA+U"):
+                raise CompatibilityError(f"Invalid {run_type=}")
+            if entry.parameters.get("software", "vasp") == "vasp":
+                potcar_check.get_correction(entry)
+            is_compatible.append(True)
+        except CompatibilityError:
+            is_compatible.append(False)
+
+        # structure-dependent anion types (the slow path)
+        ox_type = entry.data.get("oxide_type")
+        if (
+            not ox_type
+            and "O" in comp
+            and len(comp) > 1
+            and hasattr(entry, "structure")
+        ):
+            ox_type = oxide_type(entry.structure, 1.05)
+        oxide_types.append(ox_type)
+        sf_type = entry.data.get("sulfide_type")
+        if (
+            not sf_type
+            and "S" in comp
+            and len(comp) > 1
+            and hasattr(entry, "structure")
+        ):
+            sf_type = sulfide_type(entry.structure) or "sulfate"
+        sulfide_types.append(sf_type)
+
+    table = _mp2020_adjustment_table(
+        compositions,
+        oxide_types=oxide_types,
+        sulfide_types=sulfide_types,
+        oxidation_states=[entry.data.get("oxidation_states") for entry in entries],
+        hubbards=[entry.parameters.get("hubbards") for entry in entries],
+    )
+    is_compatible = np.array(is_compatible, dtype=bool) & ~table["invalid"]
+    compat_dict = _mp2020_tables()["compat_dict"]
+    applied = np.flatnonzero((table["kinds"] >= 0) & is_compatible[table["rows"]])
+    # stable sort by kind within each entry gives pymatgen's adjustment order
+    applied = applied[np.lexsort((table["kinds"][applied], table["rows"][applied]))]
+    for idx in applied:
+        row, kind = table["rows"][idx], table["kinds"][idx]
+        if kind == _KIND_S:
+            label = "MP2020 anion correction (S)"
+        elif kind == _KIND_O:
+            label = f"MP2020 anion correction ({table['oxide_types'][row]})"
+        elif kind == _KIND_U:
+            symbol = Element.from_Z(table["atomic_nums"][idx]).symbol
+            label = f"MP2020 GGA/GGA+U mixing correction ({symbol})"
+        else:
+            label = f"MP2020 anion correction ({MP2020_ANIONS[kind - 2]})"
+        entries[row].energy_adjustments.append(
+            CompositionEnergyAdjustment(
+                table["per_atom"][idx],
+                table["amounts"][idx],
+                uncertainty_per_atom=table["errors"][idx],
+                name=label,
+                cls=compat_dict,
+            )
+        )
+
+    return [
+        entry
+        for entry, compatible in zip(entries, is_compatible, strict=True)
+        if compatible
+    ]
@@ -0,0 +1,815 @@
+"""Batched, vectorized evaluation of distances to the convex hull for many entries at
+once against a pymatgen (Patched)PhaseDiagram.
+"""
+
+import functools
+import gzip
+import itertools
+import json
+import os
+import pickle
+from collections import defaultdict
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from types import SimpleNamespace
+from typing import Any
+
+import numpy as np
+from pymatgen.analysis.phase_diagram import (
+    Entry,
+    PatchedPhaseDiagram,
+    PDEntry,
+    PhaseDiagram,
+)
+from pymatgen.core import Composition, Element
+from tqdm import tqdm
+
+from matbench_discovery.energy import N_ELEMENTS, composition_matrix
+
+# same tolerances as PhaseDiagram._get_facet_and_simplex() and get_decomposition()
+IN_FACET_TOL = PhaseDiagram.numerical_tol / 10
+DECOMP_AMOUNT_TOL = PhaseDiagram.numerical_tol
+
+
+def hull_energies_per_atom(
+    qhull_data: np.ndarray,
+    facets: np.ndarray | Sequence[Sequence[int]],
+    coords: np.ndarray,
+    *,
+    max_chunk_elements: int = 2**24,
+) -> np.ndarray:
+    """Energy per atom of the convex hull at many compositions of one phase diagram.
+
+    Equivalent to calling PhaseDiagram.get_hull_energy_per_atom() for each composition
+    but vectorized: barycentric coordinates of all query points w.r.t. all facets
+    are computed with one batched matrix product, and each point is assigned the first
+    facet containing it (same facet order and tolerance as pymatgen).
+
+    Args:
+        qhull_data (np.ndarray): PhaseDiagram.qhull_data, i.e. (n_entries, dim) array
+            of atomic fractions of elements[1:] followed by energy per atom.
+        facets (np.ndarray): PhaseDiagram.facets, (n_facets, dim) indices into
+            qhull_data.
+        coords (np.ndarray): (n_queries, dim - 1) atomic fractions of query
+            compositions w.r.t. the phase diagram's elements[1:]
+            (see PhaseDiagram.pd_coords()).
+        max_chunk_elements (int, optional): Max size of the intermediate
+            (n_queries, n_facets, dim) barycentric coordinate array. Queries are
+            processed in chunks to stay below this. Defaults to 2**24 (128 MB).
+
+    Returns:
+        np.ndarray: Hull energies per atom, NaN for points not in any facet.
+    """
+    facets = np.asarray(facets, dtype=int)
+    coords = np.asarray(coords, dtype=float).reshape(len(coords), -1)
+    vertices = qhull_data[facets]  # (n_facets, dim, dim)
+    facet_energies = vertices[..., -1]
+    # augmented vertex matrix [coords, 1] as in pymatgen.util.coord.Simplex
+    aug = vertices.copy()
+    aug[..., -1] = 1
+    aug_inv = np.linalg.inv(aug)
+
+    n_facets, dim = facet_energies.shape
+    points = np.concatenate([coords, np.ones((len(coords), 1))], axis=1)
+    hull_energies = np.full(len(coords), np.nan)
+    chunk_size = max(1, max_chunk_elements // max(1, n_facets * dim))
+
+    for start in range(0, len(points), chunk_size):
+        chunk = points[start : start + chunk_size]
+        bary = np.einsum("qi,fij->qfj", chunk, aug_inv)  # (n_chunk, n_facets, dim)
+        in_facet = (bary >= -IN_FACET_TOL).all(axis=-1)
+        first_facet = in_facet.argmax(axis=1)
+        found = in_facet.any(axis=1)
+
+        amounts = bary[np.arange(len(chunk)), first_facet]
+        amounts[np.abs(amounts) <= DECOMP_AMOUNT_TOL] = 0  # as in get_decomposition()
+        energies = (amounts * facet_energies[first_facet]).sum(axis=1)
+        hull_energies[start : start + chunk_size] = np.where(found, energies, np.nan)
+
+    return hull_energies
+
+
+def _hull_energies_task(
+    args: tuple[np.ndarray, np.ndarray, np.ndarray],
+) -> np.ndarray:
+    return hull_energies_per_atom(*args)
+
+
+def _pd_hull_data(pd: PhaseDiagram) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Atomic numbers of elements, qhull_data and facets of a PhaseDiagram."""
+    atomic_nums = np.array([el.Z for el in pd.elements])
+    return atomic_nums, pd.qhull_data, np.asarray(pd.facets)
+
+
+class HullStore:
+    """Compact, versioned, memory-mapped on-disk convex hull that replaces pickled
+    (Patched)PhaseDiagrams for computing energies above the hull.
+
+    Only what's needed to evaluate the hull is stored: energy per atom and composition
+    of each stable entry (deduplicated across chemical systems) and the facets of each
+    chemical system (sub-space of a PatchedPhaseDiagram) as indices into the stable
+    entries. Arrays are saved as .npy files in a directory and opened with
+    np.load(mmap_mode="r"), plus an index.json mapping chemical systems to their
+    position in the store. Querying a chemical system only reads that system's facets
+    and vertices from disk. Unlike pickles, the format doesn't depend on pymatgen class
+    layouts.
+
+    Chemical systems are resolved like PatchedPhaseDiagram.get_pd_for_entry(): exact
+    match first, else the first stored superset. If there's no superset (where
+    PatchedPhaseDiagram falls back to an approximate SLSQP decomposition), the exact
+    hull is built from all stored stable entries within the chemical system.
+
+    Example:
+        store = HullStore.from_pickle("2023-02-07-ppd-mp.pkl.gz", "ppd-mp-hull")
+        store = HullStore("ppd-mp-hull")  # e.g. in another process
+        e_above_hull = store.get_e_above_hull(entry, allow_negative=True)
+        e_above_hull = get_e_above_hull_batch(store, entries, workers=8)
+    """
+
+    format_version = 1
+    array_names = (
+        "entry_energies",  # energy per atom of each stable entry
+        "entry_atomic_numbers",  # CSR compositions of stable entries
+        "entry_amounts",
+        "entry_offsets",
+        "space_atomic_numbers",  # elements of each chemical system in pd.elements order
+        "space_offsets",
+        "facets",  # flattened (n_facets, n_elements) stable entry indices per system
+        "facet_offsets",
+    )
+
+    def __init__(self, path: str) -> None:
+        """Open a hull store previously created with HullStore.write().
+
+        Args:
+            path (str): Directory containing the store's index.json and .npy files.
+
+        Raises:
+            ValueError: If the store was written in a different format version.
+        """
+        self.path = str(path)
+        with open(f"{path}/index.json") as file:
+            index = json.load(file)
+        if (version := index["format_version"]) != self.format_version:
+            raise ValueError(
+                f"Unsupported hull store {version=}, expected {self.format_version}"
+            )
+        self.chem_systems: list[str] = index["chem_systems"]
+        self.entry_ids: list[str | None] = index["entry_ids"]
+        for name in self.array_names:
+            setattr(self, name, np.load(f"{path}/{name}.npy", mmap_mode="r"))
+        self._hull_data: dict[int | str, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    @functools.cached_property
+    def _chem_sys_to_idx(self) -> dict[str, int]:
+        return {chem_sys: idx for idx, chem_sys in enumerate(self.chem_systems)}
+
+    @functools.cached_property
+    def _spaces(self) -> list[frozenset[str]]:
+        return [frozenset(chem_sys.split("-")) for chem_sys in self.chem_systems]
+
+    @classmethod
+    def write(cls, path: str, phase_diagram: PhaseDiagram) -> "HullStore":
+        """Convert a PhaseDiagram or PatchedPhaseDiagram into a new store at path
+        (overwriting existing files).
+
+        Args:
+            path (str): Directory to save the store in. Created if missing.
+            phase_diagram (PhaseDiagram): PhaseDiagram or PatchedPhaseDiagram to
+                convert. For a PatchedPhaseDiagram, each sub-space is stored as a
+                separate chemical system.
+
+        Returns:
+            HullStore: The newly written store.
+        """
+        if isinstance(phase_diagram, PatchedPhaseDiagram):
+            pds = phase_diagram.pds
+        else:
+            pds = {frozenset(phase_diagram.elements): phase_diagram}
+
+        entry_idx: dict[int, int] = {}  # id(entry) -> position in stable entries
+        entries: list[Entry] = []
+        chem_systems, space_atomic_nums, facets, facet_offsets = [], [], [], [0]
+        for space, pd in pds.items():
+            chem_systems.append("-".join(sorted(el.symbol for el in space)))
+            space_atomic_nums.append([el.Z for el in pd.elements])
+            for facet in pd.facets:
+                for qhull_idx in facet:
+                    entry = pd.qhull_entries[qhull_idx]
+                    if id(entry) not in entry_idx:
+                        entry_idx[id(entry)] = len(entries)
+                        entries.append(entry)
+                    facets.append(entry_idx[id(entry)])
+            facet_offsets.append(len(facets))
+
+        comps = [entry.composition for entry in entries]
+        arrays = dict(
+            entry_energies=np.array([e.energy_per_atom for e in entries], dtype=float),
+            entry_atomic_numbers=np.array(
+                [el.Z for comp in comps for el in comp], dtype=np.uint8
+            ),
+            entry_amounts=np.array(
+                [amt for comp in comps for amt in comp.values()], dtype=float
+            ),
+            entry_offsets=np.cumsum([0] + [len(comp) for comp in comps]),
+            space_atomic_numbers=np.array(
+                [z for nums in space_atomic_nums for z in nums], dtype=np.uint8
+            ),
+            space_offsets=np.cumsum([0] + [len(nums) for nums in space_atomic_nums]),
+            facets=np.array(facets, dtype=np.int32),
+            facet_offsets=np.array(facet_offsets, dtype=np.int64),
+        )
+        # index is removed first and written last so an interrupted write leaves no
+        # openable store behind
+        if os.path.isfile(index_path := f"{path}/index.json"):
+            os.remove(index_path)
+        os.makedirs(path, exist_ok=True)
+        for name, arr in arrays.items():
+            np.save(f"{path}/{name}.npy", arr)
+        index = dict(
+            format_version=cls.format_version,
+            chem_systems=chem_systems,
+            entry_ids=[getattr(entry, "entry_id", None) for entry in entries],
+        )
+        with open(index_path, "w") as file:
+            json.dump(index, file)
+        return cls(path)
+
+    @classmethod
+    def from_pickle(cls, pickle_path: str, path: str) -> "HullStore":
+        """Convert a pickled (and optionally gzipped) PatchedPhaseDiagram like
+        DATA_FILES.mp_patched_phase_diagram into a new store at path.
+
+        Args:
+            pickle_path (str): Path to .pkl or .pkl.gz file.
+            path (str): Directory to save the store in.
+
+        Returns:
+            HullStore: The newly written store.
+        """
+        opener = gzip.open if pickle_path.endswith(".gz") else open
+        with opener(pickle_path, "rb") as file:
+            phase_diagram = pickle.load(file)  # noqa: S301
+        return cls.write(path, phase_diagram)
+
+    @classmethod
+    def from_data_file(
+        cls, path: str, key: str = "mp_patched_phase_diagram", **kwargs: Any
+    ) -> "HullStore":
+        """Open the store at path or, if it doesn't exist yet, create it from the
+        pickled phase diagram in DATA_FILES (downloaded if needed).
+
+        Args:
+            path (str): Directory of the store.
+            key (str, optional): Which pickled phase diagram to convert. Defaults to
+                'mp_patched_phase_diagram'.
+            **kwargs: Passed to matbench_discovery.data.fetch(), e.g. version or
+                cache_dir.
+
+        Returns:
+            HullStore: The opened or newly written store.
+        """
+        if os.path.isfile(f"{path}/index.json"):
+            return cls(path)
+
+        from matbench_discovery.data import fetch
+
+        return cls.from_pickle(fetch(key, **kwargs), path)
+
+    def __len__(self) -> int:
+        """Number of chemical systems in the store."""
+        return len(self.chem_systems)
+
+    def __contains__(self, chem_sys: object) -> bool:
+        """Whether a chemical system (e.g. 'Fe-Li-O') is stored explicitly."""
+        return chem_sys in self._chem_sys_to_idx
+
+    def __repr__(self) -> str:
+        """Show path, number of chemical systems and number of stable entries."""
+        n_stable = len(self.entry_energies)
+        return f"{type(self).__name__}({self.path!r}, {len(self)=:,}, {n_stable=:,})"
+
+    def __getstate__(self) -> dict[str, str]:
+        """Only pickle the path, unpickling re-maps the same files."""
+        return {"path": self.path}
+
+    def __setstate__(self, state: dict[str, str]) -> None:
+        """Re-open the memory-mapped files after unpickling."""
+        self.__init__(state["path"])  # type: ignore[misc]
+
+    def _fractions(
+        self, entry_indices: np.ndarray, atomic_nums: np.ndarray
+    ) -> np.ndarray:
+        """Atomic fractions of the given elements in stable entries."""
+        columns = {z: col for col, z in enumerate(atomic_nums.tolist())}
+        fractions = np.zeros((len(entry_indices), len(columns)))
+        for row, entry_idx in enumerate(entry_indices):
+            start, end = self.entry_offsets[entry_idx : entry_idx + 2]
+            amounts = self.entry_amounts[start:end]
+            n_atoms = sum(amounts.tolist())  # same summation as Composition.num_atoms
+            for z, amount in zip(self.entry_atomic_numbers[start:end], amounts):
+                if z in columns:
+                    fractions[row, columns[z]] = amount / n_atoms
+        return fractions
+
+    def _read_space(self, idx: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Reassemble qhull_data and facets of a stored chemical system."""
+        atomic_nums = np.array(
+            self.space_atomic_numbers[slice(*self.space_offsets[idx : idx + 2])]
+        )
+        flat_facets = self.facets[slice(*self.facet_offsets[idx : idx + 2])]
+        entry_indices, facets = np.unique(flat_facets, return_inverse=True)
+        qhull_data = np.column_stack(
+            [
+                self._fractions(entry_indices, atomic_nums[1:]),
+                self.entry_energies[entry_indices],
+            ]
+        )
+        return atomic_nums, qhull_data, facets.reshape(-1, len(atomic_nums))
+
+    def _build_space(
+        self, elements: frozenset[str]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Build the hull of a chemical system not covered by any stored system from
+        all stable entries inside it.
+        """
+        pd_elements = sorted(map(Element, elements))
+        atomic_nums = [el.Z for el in pd_elements]
+        allowed = np.zeros(N_ELEMENTS, dtype=bool)
+        allowed[atomic_nums] = True
+        # count (not OR) elements outside the system per entry
+        is_outside = (~allowed[self.entry_atomic_numbers]).astype(np.int64)
+        n_outside = np.add.reduceat(is_outside, self.entry_offsets[:-1])
+        entries = []
+        for entry_idx in np.flatnonzero(n_outside == 0):
+            start, end = self.entry_offsets[entry_idx : entry_idx + 2]
+            comp = Composition(
+                dict(
+                    zip(
+                        map(Element.from_Z, self.entry_atomic_numbers[start:end]),
+                        self.entry_amounts[start:end],
+                    )
+                )
+            )
+            energy = self.entry_energies[entry_idx] * comp.num_atoms
+            entries.append(PDEntry(comp, energy))
+        # raises ValueError if elemental references are missing
+        return _pd_hull_data(PhaseDiagram(entries, elements=pd_elements))
+
+    def get_hull_data(
+        self, chem_sys: str | Iterable[str]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get the hull covering a chemical system in the form expected by
+        hull_energies_per_atom(). Results are cached per chemical system.
+
+        Args:
+            chem_sys (str | Iterable[str]): Chemical system like 'Fe-Li-O' or
+                iterable of element symbols.
+
+        Raises:
+            ValueError: If the chemical system contains elements without stable
+                elemental reference entry in the store.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: Atomic numbers of the hull's
+                elements, qhull_data (atomic fractions of elements[1:] followed by
+                energy per atom of each vertex) and facets (indices into qhull_data).
+        """
+        elements = frozenset(
+            chem_sys.split("-") if isinstance(chem_sys, str) else map(str, chem_sys)
+        )
+        chem_sys = "-".join(sorted(elements))
+        key: int | str | None = self._chem_sys_to_idx.get(chem_sys)
+        if key is None:
+            key = next(
+                (idx for idx, space in enumerate(self._spaces) if space >= elements),
+                chem_sys,
+            )
+        if key not in self._hull_data:
+            self._hull_data[key] = (
+                self._read_space(key)
+                if isinstance(key, int)
+                else self._build_space(elements)
+            )
+        return self._hull_data[key]
+
+    def get_hull_energy_per_atom(self, comp: Composition) -> float:
+        """Energy per atom of the convex hull at a given composition.
+
+        Args:
+            comp (Composition): Composition to evaluate the hull at.
+
+        Raises:
+            ValueError: If the hull can't be evaluated for the composition.
+
+        Returns:
+            float: Hull energy in eV/atom.
+        """
+        atomic_nums, qhull_data, facets = self.get_hull_data(comp.chemical_system)
+        coords = [
+            [comp.get_atomic_fraction(Element.from_Z(z)) for z in atomic_nums[1:]]
+        ]
+        hull_energy = hull_energies_per_atom(qhull_data, facets, coords)[0]
+        if np.isnan(hull_energy):
+            raise ValueError(f"Unable to get decomposition for {comp}")
+        return float(hull_energy)
+
+    def get_e_above_hull(self, entry: Entry, *, allow_negative: bool = False) -> float:
+        """Energy above the convex hull for an entry. Same as
+        PhaseDiagram.get_e_above_hull().
+
+        Args:
+            entry (Entry): pymatgen Entry (PDEntry, ComputedEntry or
+                ComputedStructureEntry).
+            allow_negative (bool, optional): Whether to allow entries below the hull.
+                Defaults to False.
+
+        Raises:
+            ValueError: If the entry is below the hull and allow_negative=False or if
+                the hull can't be evaluated for the entry's composition.
+
+        Returns:
+            float: Energy above the hull in eV/atom.
+        """
+        hull_energy = self.get_hull_energy_per_atom(entry.composition)
+        e_above_hull = entry.energy_per_atom - hull_energy
+        if allow_negative or e_above_hull >= -PhaseDiagram.numerical_tol:
+            return e_above_hull
+        raise ValueError(f"No valid decomposition found for {entry}! ({e_above_hull=})")
+
+
+def _get_hull_data(
+    phase_diagram: PhaseDiagram | HullStore,
+    entry: Entry,
+    pd_hulls: dict[int, tuple[np.ndarray, np.ndarray, np.ndarray]],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray] | None:
+    """Get the hull covering an entry's chemical system or None if not covered.
+    pd_hulls caches converted PhaseDiagram patches by id(pd).
+    """
+    if isinstance(phase_diagram, HullStore):
+        return phase_diagram.get_hull_data(entry.composition.chemical_system)
+    if isinstance(phase_diagram, PatchedPhaseDiagram):
+        try:
+            pd = phase_diagram.get_pd_for_entry(entry)
+        except ValueError:
+            return None
+    elif {*entry.elements} <= {*phase_diagram.elements}:
+        pd = phase_diagram
+    else:
+        return None
+    if id(pd) not in pd_hulls:
+        pd_hulls[id(pd)] = _pd_hull_data(pd)
+    return pd_hulls[id(pd)]
+
+
+def get_e_above_hull_batch(
+    phase_diagram: PhaseDiagram | HullStore,
+    entries: Sequence[Entry],
+    *,
+    workers: int = 1,
+) -> np.ndarray:
+    """Energy above the convex hull for many entries at once. Matches
+    phase_diagram.get_e_above_hull(entry, allow_negative=True) for each entry.
+
+    Entries are grouped by the (sub-)phase diagram that covers their chemical system.
+    For a PatchedPhaseDiagram or HullStore, that patch is looked up once per chemical
+    system. All entries in a group are then evaluated together with
+    hull_energies_per_atom(). Groups are spread across a process pool if workers > 1.
+    Only NumPy arrays are sent to worker processes, not PhaseDiagram objects.
+
+    Args:
+        phase_diagram (PhaseDiagram | HullStore): PhaseDiagram, PatchedPhaseDiagram or
+            HullStore to compute hull distances against.
+        entries (Sequence[Entry]): pymatgen Entries (PDEntry, ComputedEntry or
+            ComputedStructureEntry). Their energy_per_atom (including any energy
+            corrections) is compared to the hull.
+        workers (int, optional): Number of processes. Values < 1 mean os.cpu_count().
+            Defaults to 1.
+
+    Returns:
+        np.ndarray: Energies above the hull in eV/atom (negative for entries below the
+            hull). Entries whose chemical system isn't covered by any patch of a
+            PatchedPhaseDiagram fall back to phase_diagram.get_e_above_hull().
+    """
+    e_above_hull = np.full(len(entries), np.nan)
+    groups: dict[int, list[int]] = defaultdict(list)  # id(hull data) -> entry indices
+    hulls: dict[int, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+    pd_hulls: dict[int, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+    hull_for_chem_sys: dict[str, tuple[np.ndarray, np.ndarray, np.ndarray] | None] = {}
+    fallback: list[int] = []
+
+    for idx, entry in enumerate(entries):
+        chem_sys = entry.composition.chemical_system
+        if chem_sys not in hull_for_chem_sys:
+            hull_for_chem_sys[chem_sys] = _get_hull_data(phase_diagram, entry, pd_hulls)
+        if (hull_data := hull_for_chem_sys[chem_sys]) is None:
+            fallback.append(idx)
+        else:
+            groups[id(hull_data)].append(idx)
+            hulls[id(hull_data)] = hull_data
+
+    comp_mat = composition_matrix([entry.composition for entry in entries])
+    n_atoms = np.asarray(comp_mat.sum(axis=1)).ravel()
+    energies_per_atom = np.array([entry.energy_per_atom for entry in entries])
+
+    tasks = []
+    for hull_id, indices in groups.items():
+        atomic_nums, qhull_data, facets = hulls[hull_id]
+        coords = (
+            comp_mat[indices][:, atomic_nums[1:]].toarray() / n_atoms[indices, None]
+        )
+        tasks.append((qhull_data, facets, coords))
+
+    if workers < 1:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(tasks) < 2:
+        results = list(map(_hull_energies_task, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(executor.map(_hull_energies_task, tasks, chunksize=8))
+
+    for indices, hull_energies in zip(groups.values(), results, strict=True):
+        e_above_hull[indices] = energies_per_atom[indices] - hull_energies
+
+    for idx in fallback:
+        e_above_hull[idx] = phase_diagram.get_e_above_hull(
+            entries[idx], allow_negative=True
+        )
+
+    return e_above_hull
+
+
+def _set_stable_entries(ppd: PatchedPhaseDiagram) -> None:
+    """Collect stable entries from all patches, same as PatchedPhaseDiagram.__init__()
+    does after building them.
+    """
+    stable_entries = {se for pd in ppd.pds.values() for se in pd._stable_entries}  # noqa: SLF001
+    ppd._stable_entries = tuple(stable_entries | {*ppd.el_refs.values()})  # noqa: SLF001
+    ppd._stable_spaces = tuple(frozenset(e.elements) for e in ppd._stable_entries)  # noqa: SLF001
+    PatchedPhaseDiagram._get_stable_entries_in_space.cache_clear()  # noqa: SLF001
+
+
+def _subspaces(space: frozenset[Element]) -> Iterator[frozenset[Element]]:
+    """All non-empty subsets of a chemical system (including itself)."""
+    elements = sorted(space)
+    for n_elems in range(1, len(elements) + 1):
+        for subset in itertools.combinations(elements, n_elems):
+            yield frozenset(subset)
+
+
+def add_entries_to_ppd(
+    ppd: PatchedPhaseDiagram, entries: Sequence[Entry], *, workers: int = 1
+) -> dict[Entry, tuple[float, float]]:
+    """Insert new entries into a PatchedPhaseDiagram in place without rebuilding it.
+
+    Only patches whose chemical system contains a new hull candidate's chemical system
+    are rebuilt (from their previous entries plus the new ones). New patches are added
+    for chemical systems not covered by any existing patch and existing patches that
+    are subsets of a new patch are dropped as redundant. New entries are
+    hull candidates under the same rule as in PatchedPhaseDiagram.__init__(): negative
+    formation energy, or the lowest-energy entry of an element.
+
+    Args:
+        ppd (PatchedPhaseDiagram): Phase diagram to update. Modified in place.
+        entries (Sequence[Entry]): New pymatgen Entries to insert. Entries with
+            elements not yet in ppd require an elemental reference among them.
+        workers (int, optional): Number of processes for computing hull distances of
+            affected existing entries before and after the update, see
+            get_e_above_hull_batch(). Defaults to 1.
+
+    Raises:
+        ValueError: If entries contain elements without terminal entry.
+
+    Returns:
+        dict[Entry, tuple[float, float]]: Existing entries whose energy above the hull
+            changed by more than PhaseDiagram.numerical_tol, mapped to their old and
+            new e_above_hull.
+    """
+    el_refs = dict(ppd.el_refs)
+    for entry in entries:
+        if entry.composition.is_element:
+            elem = entry.elements[0]
+            if (
+                elem not in el_refs
+                or entry.energy_per_atom < el_refs[elem].energy_per_atom
+            ):
+                el_refs[elem] = entry
+    new_elements = {el for entry in entries for el in entry.elements} - {*ppd.elements}
+    if missing := new_elements - {*el_refs}:
+        raise ValueError(
+            f"Missing terminal entries for elements {sorted(map(str, missing))}"
+        )
+
+    def is_hull_candidate(entry: Entry) -> bool:
+        comp = entry.composition
+        if comp.is_element:
+            return el_refs[comp.elements[0]] is entry
+        e_form = entry.energy_per_atom - sum(
+            el_refs[el].energy_per_atom * comp.get_atomic_fraction(el)
+            for el in comp.elements
+        )
+        return e_form < -PhaseDiagram.formation_energy_tol
+
+    new_qhull_entries = [entry for entry in entries if is_hull_candidate(entry)]
+    new_by_space: dict[frozenset[Element], list[Entry]] = defaultdict(list)
+    for entry in new_qhull_entries:
+        new_by_space[frozenset(entry.elements)].append(entry)
+
+    # only existing entries whose chemical system contains a new hull candidate's
+    # chemical system can change hull distance
+    entries_by_el: dict[Element, set[int]] = defaultdict(set)
+    for idx, entry in enumerate(ppd.all_entries):
+        for elem in entry.elements:
+            entries_by_el[elem].add(idx)
+    affected_idx = set().union(
+        *(
+            set.intersection(*(entries_by_el[el] for el in space))
+            for space in new_by_space
+        )
+    )
+    affected_entries = [ppd.all_entries[idx] for idx in sorted(affected_idx)]
+    e_above_hull_old = get_e_above_hull_batch(ppd, affected_entries, workers=workers)
+
+    # collect entries for every patch that needs rebuilding
+    spaces_by_el: dict[Element, set[frozenset[Element]]] = defaultdict(set)
+    for space in ppd.pds:
+        for elem in space:
+            spaces_by_el[elem].add(space)
+    patch_entries: dict[frozenset[Element], list[Entry]] = {}
+    uncovered: set[frozenset[Element]] = set()
+    for space, space_entries in new_by_space.items():
+        supersets = set.intersection(*(spaces_by_el[el] for el in space))
+        for superset in supersets:
+            patch_entries.setdefault(superset, list(ppd.pds[superset].all_entries))
+            patch_entries[superset] += space_entries
+        if not supersets and len(space) > 1:
+            uncovered.add(space)
+
+    qhull_by_space: dict[frozenset[Element], list[Entry]] = defaultdict(list)
+    for entry, space in zip(ppd.qhull_entries, ppd._qhull_spaces):  # noqa: SLF001
+        qhull_by_space[space].append(entry)
+    redundant: set[frozenset[Element]] = set()
+    for space in uncovered:
+        if any(space < other for other in uncovered):
+            continue
+        patch_entries[space] = []
+        for subspace in _subspaces(space):
+            patch_entries[space] += qhull_by_space[subspace] + new_by_space[subspace]
+            if subspace != space and subspace in ppd.pds:
+                redundant.add(subspace)
+
+    # update PatchedPhaseDiagram attributes set in its __init__()
+    ppd.all_entries = [*ppd.all_entries, *entries]
+    ppd.qhull_entries = (*ppd.qhull_entries, *new_qhull_entries)
+    ppd._qhull_spaces = tuple(frozenset(e.elements) for e in ppd.qhull_entries)  # noqa: SLF001
+    ppd.el_refs = el_refs
+    ppd.elements = sorted({*ppd.elements, *new_elements})
+    ppd.dim = len(ppd.elements)
+
+    pds = {space: pd for space, pd in ppd.pds.items() if space not in redundant}
+    for space, space_entries in patch_entries.items():
+        if space not in redundant:
+            pds[space] = PhaseDiagram(space_entries)
+    ppd.spaces = sorted(pds, key=len)
+    ppd.pds = {space: pds[space] for space in ppd.spaces}
+
+    _set_stable_entries(ppd)
+
+    e_above_hull_new = get_e_above_hull_batch(ppd, affected_entries, workers=workers)
+    return {
+        entry: (old, new)
+        for entry, old, new in zip(
+            affected_entries, e_above_hull_old, e_above_hull_new, strict=True
+        )
+        if abs(new - old) > PhaseDiagram.numerical_tol
+    }
+
+
+# light-weight copies of all hull candidate entries, set once per worker process
+_worker_entries: list[PDEntry] = []
+
+
+def _init_ppd_worker(entries: list[PDEntry]) -> None:
+    _worker_entries[:] = entries
+
+
+def _build_patches(
+    patches: list[tuple[frozenset[Element], list[int]]],
+) -> list[tuple[frozenset[Element], list[Element], dict[str, Any]]]:
+    """Compute the convex hulls of several PatchedPhaseDiagram patches. Entries are
+    passed and returned as indices into _worker_entries to keep inter-process
+    communication small.
+    """
+    results = []
+    for space, indices in patches:
+        space_entries = [_worker_entries[idx] for idx in indices]
+        entry_idx = {id(entry): idx for entry, idx in zip(space_entries, indices)}
+        pd = PhaseDiagram(space_entries)
+        computed_data = pd.computed_data | {
+            "all_entries": [entry_idx[id(e)] for e in pd.all_entries],
+            "qhull_entries": [entry_idx[id(e)] for e in pd.qhull_entries],
+            "el_refs": [(el, entry_idx[id(e)]) for el, e in pd.el_refs.items()],
+        }
+        results.append((space, pd.elements, computed_data))
+    return results
+
+
+def build_ppd(
+    entries: Sequence[Entry],
+    *,
+    workers: int = 1,
+    pbar: bool = False,
+    **kwargs: Any,
+) -> PatchedPhaseDiagram:
+    """Build a PatchedPhaseDiagram with the convex hulls of its chemical sub-spaces
+    computed in parallel.
+
+    Chemical sub-spaces are determined by PatchedPhaseDiagram.__init__() itself so the
+    result has the same patches as a serial build. The hull of each patch is then
+    computed in a process pool. Since hull construction cost grows steeply with the
+    number of elements, patches are scheduled largest first (by estimated cost) and
+    small patches are batched together to limit inter-process overhead. Workers only
+    receive light-weight PDEntry copies (once per process) and return entry indices,
+    so the patches of the returned object reference the original entries.
+
+    Args:
+        entries (Sequence[Entry]): pymatgen Entries (PDEntry, ComputedEntry or
+            ComputedStructureEntry) to build the phase diagram from.
+        workers (int, optional): Number of processes. Values < 1 mean os.cpu_count().
+            workers=1 builds the PatchedPhaseDiagram serially. Defaults to 1.
+        pbar (bool, optional): Whether to show a progress bar. Defaults to False.
+        **kwargs: Passed to PatchedPhaseDiagram.__init__(), e.g. elements or
+            keep_all_spaces.
+
+    Returns:
+        PatchedPhaseDiagram: Same as PatchedPhaseDiagram(entries, **kwargs).
+    """
+    if workers < 1:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        return PatchedPhaseDiagram(entries, verbose=pbar, **kwargs)
+
+    # run PatchedPhaseDiagram.__init__() with a placeholder patch for each chemical
+    # space, the actual patches are built in parallel below
+    ppd = PatchedPhaseDiagram.__new__(PatchedPhaseDiagram)
+    placeholder = SimpleNamespace(_stable_entries=())
+    ppd._get_pd_patch_for_space = lambda space: (space, placeholder)  # type: ignore[method-assign]  # noqa: SLF001
+    PatchedPhaseDiagram.__init__(ppd, entries, **kwargs)
+    del ppd._get_pd_patch_for_space  # noqa: SLF001
+
+    # find entries in each space by looking up all its subspaces instead of testing
+    # every qhull entry against every space like PatchedPhaseDiagram does
+    qhull_idx_by_space: dict[frozenset[Element], list[int]] = defaultdict(list)
+    for idx, space in enumerate(ppd._qhull_spaces):  # noqa: SLF001
+        qhull_idx_by_space[space].append(idx)
+    patches = []
+    for space in ppd.spaces:
+        indices = sorted(
+            idx for sub in _subspaces(space) for idx in qhull_idx_by_space.get(sub, [])
+        )
+        patches.append((space, indices))
+
+    # Quickhull cost grows like n_entries^(dim // 2): schedule expensive patches first
+    # and batch cheap ones into tasks of at most ~1/(8 workers) of the total cost
+    costs = [len(indices) ** (len(space) // 2) for space, indices in patches]
+    max_task_cost = sum(costs) / (8 * workers)
+    tasks: list[list[tuple[frozenset[Element], list[int]]]] = []
+    task_cost = max_task_cost
+    for cost, patch in sorted(zip(costs, patches), key=lambda pair: -pair[0]):
+        if task_cost + cost > max_task_cost:
+            tasks.append([])
+            task_cost = 0
+        tasks[-1].append(patch)
+        task_cost += cost
+
+    light_entries = [PDEntry(e.composition, e.energy) for e in ppd.qhull_entries]
+    to_entry = ppd.qhull_entries.__getitem__
+    patch_indices = dict(patches)
+    pds: dict[frozenset[Element], PhaseDiagram] = {}
+    with (
+        ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_ppd_worker,
+            initargs=(light_entries,),
+        ) as executor,
+        tqdm(total=len(patches), disable=not pbar, desc="Building PPD") as progress,
+    ):
+        futures = [executor.submit(_build_patches, task) for task in tasks]
+        for future in as_completed(futures):
+            for space, elements, computed_data in future.result():
+                computed_data |= {
+                    "all_entries": [*map(to_entry, computed_data["all_entries"])],
+                    "qhull_entries": [*map(to_entry, computed_data["qhull_entries"])],
+                    "el_refs": [
+                        (el, to_entry(idx)) for el, idx in computed_data["el_refs"]
+                    ],
+                }
+                space_entries = [*map(to_entry, patch_indices[space])]
+                pds[space] = PhaseDiagram(
+                    space_entries, elements, computed_data=computed_data
+                )
+                progress.update()
+
+    ppd.pds = {space: pds[space] for space in ppd.spaces}
+    _set_stable_entries(ppd)
+    return ppd
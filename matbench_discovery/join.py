@@ -0,0 +1,332 @@
+"""Join ML energy predictions from slurm job array shards with WBM
+ComputedStructureEntries, apply MP2020 energy corrections and compute corrected
+formation energies in a streaming, parallel pipeline.
+"""
+
+import contextlib
+import gzip
+import os
+import warnings
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
+from glob import glob
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+from pymatgen.core import Structure
+from pymatgen.entries.computed_entries import ComputedStructureEntry
+from tqdm import tqdm
+
+from matbench_discovery.data import (
+    as_dict_handler,
+    columnar_cache_path,
+    default_cache_dir,
+    fetch,
+    figshare_versions,
+    load,
+    read_parquet,
+)
+from matbench_discovery.energy import get_e_form_per_atom_batch, process_entries_mp2020
+from matbench_discovery.enums import Key
+
+
+def read_json_shard(
+    file_path: str, drop_cols: Sequence[str] | None = None
+) -> pd.DataFrame:
+    """Read a slurm job array output file indexed by material ID, dropping
+    trajectories to save memory.
+
+    Args:
+        file_path (str): Path to the shard file.
+        drop_cols (Sequence[str], optional): Columns to drop if present. Defaults to
+            None meaning all columns containing "_trajectory".
+
+    Returns:
+        pd.DataFrame: Shard data indexed by material ID.
+    """
+    df_shard = pd.read_json(file_path).set_index(Key.mat_id)
+    if drop_cols is None:
+        drop_cols = df_shard.filter(like="_trajectory").columns
+    return df_shard.drop(columns=drop_cols, errors="ignore")
+
+
+def iter_shard_chunks(
+    file_paths: Iterable[str],
+    *,
+    reader: Callable[[str], pd.DataFrame] = read_json_shard,
+    chunk_size: int = 10_000,
+) -> Iterator[pd.DataFrame]:
+    """Stream rows of many shard files as dataframes of chunk_size rows (the last chunk
+    may be smaller). At most one chunk plus one shard is held in memory at a time.
+
+    Args:
+        file_paths (Iterable[str]): Shard files to read in order.
+        reader (Callable[[str], pd.DataFrame], optional): Reads one shard into a
+            dataframe. Defaults to read_json_shard.
+        chunk_size (int, optional): Number of rows per chunk. Defaults to 10_000.
+
+    Yields:
+        pd.DataFrame: Consecutive chunks of the concatenated shards.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"{chunk_size=} must be positive")
+    buffer: list[pd.DataFrame] = []
+    n_rows = 0
+    for file_path in file_paths:
+        df_shard = reader(file_path)
+        buffer.append(df_shard)
+        n_rows += len(df_shard)
+        while n_rows >= chunk_size:
+            df_buffer = pd.concat(buffer)
+            yield df_buffer.iloc[:chunk_size]
+            buffer = [df_buffer.iloc[chunk_size:]]
+            n_rows -= chunk_size
+    if n_rows > 0:
+        yield pd.concat(buffer)
+
+
+def correct_chunk(
+    df_chunk: pd.DataFrame,
+    cse_dicts: pd.Series,
+    *,
+    energy_col: str,
+    e_form_col: str,
+    struct_col: str | None = None,
+    json_lines: bool = False,
+) -> tuple[pd.DataFrame, str]:
+    """Transfer ML energies (and relaxed structures) to WBM ComputedStructureEntries,
+    apply MP2020 energy corrections and compute corrected formation energies.
+
+    Structures matter since MP2020 corrections for oxides and sulfides depend on atomic
+    distances.
+
+    Args:
+        df_chunk (pd.DataFrame): ML predictions indexed by material ID.
+        cse_dicts (pd.Series): ComputedStructureEntry dicts indexed by material ID.
+        energy_col (str): Column of df_chunk with uncorrected ML energies (eV).
+        e_form_col (str): Name of the output column for corrected formation energies
+            (eV/atom).
+        struct_col (str, optional): Column of df_chunk with ML-relaxed structures (as
+            dicts or Structures). Defaults to None meaning keep the CSE structures.
+        json_lines (bool, optional): Whether to also return the chunk incl. relaxed
+            structures and corrected CSEs serialized as JSON Lines. Defaults to False.
+
+    Raises:
+        ValueError: If cse_dicts is missing material IDs in df_chunk.
+
+    Returns:
+        tuple[pd.DataFrame, str]: Numeric columns of df_chunk plus e_form_col (NaN for
+            entries the compatibility scheme rejects) and the JSON Lines string (empty
+            if json_lines=False).
+    """
+    if missing := set(df_chunk.index) - set(cse_dicts.index):
+        raise ValueError(
+            f"{len(missing)} material IDs without CSE, e.g. {[*missing][:5]}"
+        )
+
+    cses = []
+    for mat_id, energy in df_chunk[energy_col].items():
+        cse = ComputedStructureEntry.from_dict(cse_dicts[mat_id])
+        cse._energy = energy  # cse._energy is the uncorrected energy  # noqa: SLF001
+        if struct_col is not None:
+            struct = df_chunk.at[mat_id, struct_col]  # noqa: PD008
+            if isinstance(struct, dict):
+                struct = Structure.from_dict(struct)
+            cse._structure = struct  # noqa: SLF001
+        cses.append(cse)
+
+    processed = process_entries_mp2020(cses)
+    is_valid = {id(cse) for cse in processed}
+    e_forms = get_e_form_per_atom_batch(
+        [cse.energy for cse in cses], [cse.composition for cse in cses]
+    )
+    df_out = df_chunk.select_dtypes("number").copy()
+    df_out[e_form_col] = [
+        e_form if id(cse) in is_valid else float("nan")
+        for cse, e_form in zip(cses, e_forms, strict=True)
+    ]
+
+    lines = ""
+    if json_lines:
+        df_json = df_chunk.assign(**{e_form_col: df_out[e_form_col], Key.cse: cses})
+        lines = df_json.reset_index().to_json(
+            orient="records", lines=True, default_handler=as_dict_handler
+        )
+    return df_out, lines
+
+
+def _correct_chunk_task(
+    args: tuple[pd.DataFrame, str, dict[str, Any]],
+) -> tuple[pd.DataFrame, str]:
+    """Read CSEs for a chunk from the Parquet cache in the worker process (so they
+    never pass through the parent process) and run correct_chunk().
+    """
+    df_chunk, cse_parquet_path, kwargs = args
+    df_cse = read_parquet(cse_parquet_path, columns=[Key.cse], ids=list(df_chunk.index))
+    return correct_chunk(df_chunk, df_cse.set_index(Key.mat_id)[Key.cse], **kwargs)
+
+
+def join_predictions(
+    file_paths: str | Sequence[str],
+    out_path: str,
+    *,
+    energy_col: str,
+    e_form_col: str,
+    struct_col: str | None = None,
+    reader: Callable[[str], pd.DataFrame] = read_json_shard,
+    json_path: str | None = None,
+    chunk_size: int = 10_000,
+    workers: int = 1,
+    decimals: int | None = 4,
+    pbar: bool = True,
+    cse_key: str = "wbm_computed_structure_entries",
+    version: str = figshare_versions[-1],
+    cache_dir: str | Path = default_cache_dir,
+    load_kwargs: dict[str, Any] | None = None,
+    allow_rejected: bool = False,
+) -> pd.DataFrame:
+    """Join ML predictions from many shard files with WBM ComputedStructureEntries,
+    apply MP2020 energy corrections and compute corrected formation energies.
+
+    Shards are streamed in chunks of chunk_size rows. Each chunk is processed with
+    correct_chunk() in a worker process that reads only that chunk's CSEs from the
+    Parquet cache of cse_key. Results are appended to out_path (and json_path) in shard
+    order as soon as they're ready. At most 2 * workers chunks are in flight, so peak
+    memory is bounded by chunk_size rather than dataset size. Output files are written
+    to temporary paths and only moved into place when complete.
+
+    Args:
+        file_paths (str | Sequence[str]): Shard files or glob pattern matching them.
+        out_path (str): CSV file (compression inferred from extension, e.g. .csv.gz)
+            to write numeric prediction columns and e_form_col to.
+        energy_col (str): Column with uncorrected ML energies (eV).
+        e_form_col (str): Name of the output column for corrected formation energies.
+        struct_col (str, optional): Column with ML-relaxed structures. Defaults to
+            None meaning energies are corrected with the WBM CSE structures.
+        reader (Callable[[str], pd.DataFrame], optional): Reads one shard into a
+            dataframe indexed by material ID. Defaults to read_json_shard.
+        json_path (str, optional): If set, also write all columns incl. relaxed
+            structures and corrected CSEs as (gzipped if path ends in .gz) JSON array
+            of records, readable with pd.read_json(json_path) like the .json.gz files
+            written by df.reset_index().to_json(). Records are appended chunk by chunk.
+            Defaults to None.
+        chunk_size (int, optional): Rows per chunk. Defaults to 10_000.
+        workers (int, optional): Number of processes. Values < 1 mean os.cpu_count().
+            Defaults to 1.
+        decimals (int | None, optional): Round numeric output columns to this many
+            decimals. Defaults to 4. None means no rounding.
+        pbar (bool, optional): Whether to show a progress bar. Defaults to True.
+        cse_key (str, optional): DATA_FILES key of the CSEs to join with. Defaults to
+            'wbm_computed_structure_entries'.
+        version (str, optional): Figshare version of the CSE data file. Defaults to
+            the latest.
+        cache_dir (str | Path, optional): Where the CSE data file is cached. Defaults
+            to default_cache_dir.
+        load_kwargs (dict[str, Any], optional): Extra keyword arguments for
+            matbench_discovery.data.load() when building the CSE Parquet cache.
+            Defaults to None.
+        allow_rejected (bool, optional): Whether to keep entries the MP2020
+            compatibility scheme rejects (with NaN e_form_col) instead of raising.
+            Rejected IDs are reported in a warning either way. Defaults to False.
+
+    Raises:
+        ValueError: If no shard files are found or (unless allow_rejected) if MP2020
+            rejects entries with finite ML energies.
+
+    Returns:
+        pd.DataFrame: The numeric columns written to out_path.
+    """
+    if isinstance(file_paths, str):
+        file_paths = sorted(glob(file_paths))
+    if not file_paths:
+        raise ValueError("No shard files to join")
+    if workers < 1:
+        workers = os.cpu_count() or 1
+
+    # build the Parquet cache once up front, workers then read row subsets from it
+    data_kwargs = dict(version=version, cache_dir=cache_dir)
+    load(cse_key, columns=[Key.cse], ids=[], **data_kwargs, **(load_kwargs or {}))
+    cse_path = columnar_cache_path(fetch(cse_key, **data_kwargs))
+    chunk_kwargs = dict(
+        energy_col=energy_col,
+        e_form_col=e_form_col,
+        struct_col=struct_col,
+        json_lines=json_path is not None,
+    )
+    tasks = (
+        (df_chunk, cse_path, chunk_kwargs)
+        for df_chunk in iter_shard_chunks(
+            file_paths, reader=reader, chunk_size=chunk_size
+        )
+    )
+
+    out_dir, out_name = os.path.split(out_path)
+    tmp_out_path = os.path.join(out_dir, f".tmp-{out_name}")
+    tmp_json_path = None
+    if json_path is not None:
+        json_dir, json_name = os.path.split(json_path)
+        tmp_json_path = os.path.join(json_dir, f".tmp-{json_name}")
+    json_opener = gzip.open if str(json_path).endswith(".gz") else open
+
+    dfs: list[pd.DataFrame] = []
+    json_started = False  # whether any records were written to json_path yet
+    try:
+        with contextlib.ExitStack() as stack:
+            json_file = tmp_json_path and stack.enter_context(
+                json_opener(tmp_json_path, "wt")
+            )
+            progress = stack.enter_context(
+                tqdm(desc="Joining predictions", unit=" rows", disable=not pbar)
+            )
+            for df_out, lines in _ordered_map(_correct_chunk_task, tasks, workers):
+                is_rejected = df_out[e_form_col].isna() & df_out[energy_col].notna()
+                if is_rejected.any():
+                    rejected = list(df_out.index[is_rejected])
+                    msg = f"MP2020 rejected {len(rejected)} entries: {rejected}"
+                    if not allow_rejected:
+                        raise ValueError(f"{msg}, pass allow_rejected=True to keep")
+                    warnings.warn(msg, stacklevel=2)
+                if decimals is not None:
+                    df_out = df_out.round(decimals)
+                df_out.to_csv(tmp_out_path, mode="a" if dfs else "w", header=not dfs)
+                if json_file and lines:
+                    # join JSON Lines records of all chunks into one JSON array
+                    json_file.write(",\n" if json_started else "[\n")
+                    json_file.write(",\n".join(lines.splitlines()))
+                    json_started = True
+                dfs.append(df_out)
+                progress.update(len(df_out))
+            if json_file:
+                json_file.write("\n]\n" if json_started else "[]\n")
+        if not dfs:
+            raise ValueError(f"No rows in {len(file_paths)} shard files")
+        if tmp_json_path:
+            os.replace(tmp_json_path, json_path)
+        os.replace(tmp_out_path, out_path)
+    finally:
+        for tmp_path in (tmp_out_path, tmp_json_path):
+            if tmp_path and os.path.isfile(tmp_path):
+                os.remove(tmp_path)
+
+    return pd.concat(dfs)
+
+
+def _ordered_map(
+    func: Callable[[Any], Any], items: Iterable[Any], workers: int
+) -> Iterator[Any]:
+    """Like executor.map() but only consumes items as results are consumed, keeping at
+    most 2 * workers tasks in flight so memory stays bounded for long input streams.
+    """
+    if workers == 1:
+        yield from map(func, items)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: deque[Future[Any]] = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
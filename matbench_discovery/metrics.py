@@ -14,6 +14,98 @@ __author__ = "Janosh Riebesell"
 __date__ = "2023-02-01"
 
 
+def _align(
+    each_true: Sequence[float] | np.ndarray | pd.Series,
+    each_pred: Sequence[float] | np.ndarray | pd.Series,
+) -> tuple[Sequence[float] | np.ndarray, Sequence[float] | np.ndarray]:
+    """Align two pd.Series on the union of their indices (in each_true's order, then
+    labels only in each_pred) so the positional NumPy code in this module compares
+    values of the same material. Other inputs are returned unchanged.
+    """
+    if (
+        isinstance(each_true, pd.Series)
+        and isinstance(each_pred, pd.Series)
+        and not each_true.index.equals(each_pred.index)
+    ):
+        index = each_true.index.union(each_pred.index, sort=False)
+        return each_true.reindex(index), each_pred.reindex(index)
+    return each_true, each_pred
+
+
+def confusion_codes(
+    each_true: Sequence[float] | np.ndarray,
+    each_pred: Sequence[float] | np.ndarray,
+    *,
+    stability_threshold: float | None = 0,
+    fillna: bool = True,
+) -> np.ndarray:
+    """Encode each stability prediction as an integer class label: 0 for true positive,
+    1 for false negative, 2 for false positive, 3 for true negative (same order as
+    classify_stable()) and -1 for unclassifiable samples (NaN target or NaN prediction
+    if not fillna). Two pd.Series are first aligned on their index (union), all other
+    inputs are compared by position. Inputs are broadcast against each other, e.g. a
+    (n_samples, 1) target array and (n_samples, n_models) prediction array return
+    codes for all models.
+
+    Args:
+        each_true (Sequence[float] | np.ndarray): Ground truth energy above convex
+            hull values.
+        each_pred (Sequence[float] | np.ndarray): Model predicted energy above convex
+            hull values.
+        stability_threshold (float | None, optional): Maximum energy above convex hull
+            for a material to still be considered stable. Defaults to 0.
+        fillna (bool): Whether to fill NaNs as the model predicting unstable. Defaults
+            to True.
+
+    Returns:
+        np.ndarray: int8 array of class labels in [-1, 3] with broadcast input shape.
+    """
+    threshold = stability_threshold or 0  # guard against None
+    each_true, each_pred = _align(each_true, each_pred)
+    each_true = np.asarray(each_true, dtype=float)
+    each_pred = np.asarray(each_pred, dtype=float)
+
+    # bit 1 set for actual negatives, bit 0 for model negatives
+    codes = 2 * (each_true > threshold) + (each_pred > threshold)
+    pred_is_nan = np.isnan(each_pred)
+    # fill NaNs as unstable
+    codes = np.where(pred_is_nan, codes | 1 if fillna else -1, codes)
+    return np.where(np.isnan(each_true), -1, codes).astype(np.int8)
+
+
+def confusion_counts(
+    each_true: Sequence[float] | np.ndarray,
+    each_pred: Sequence[float] | np.ndarray,
+    *,
+    stability_threshold: float | None = 0,
+    fillna: bool = True,
+) -> tuple[int, int, int, int]:
+    """Count true/false positive/negative stability predictions in a single
+    np.bincount reduction over the codes returned by confusion_codes().
+
+    Args:
+        each_true (Sequence[float] | np.ndarray): Ground truth energy above convex
+            hull values.
+        each_pred (Sequence[float] | np.ndarray): Model predicted energy above convex
+            hull values.
+        stability_threshold (float | None, optional): Maximum energy above convex hull
+            for a material to still be considered stable. Defaults to 0.
+        fillna (bool): Whether to fill NaNs as the model predicting unstable. Defaults
+            to True.
+
+    Returns:
+        tuple[int, int, int, int]: Number of true positives, false negatives, false
+            positives and true negatives (in this order).
+    """
+    codes = confusion_codes(
+        each_true, each_pred, stability_threshold=stability_threshold, fillna=fillna
+    )
+    n_true_pos, n_false_neg, n_false_pos, n_true_neg = np.bincount(
+        codes[codes >= 0], minlength=4
+    )
+    return n_true_pos, n_false_neg, n_false_pos, n_true_neg
+
+
 def classify_stable(
     e_above_hull_true: pd.Series,
     e_above_hull_pred: pd.Series,
@@ -40,31 +132,34 @@ def classify_stable(
     Returns:
         tuple[TP, FN, FP, TN]: Indices as pd.Series for true positives,
             false negatives, false positives and true negatives (in this order).
+            Boolean arrays if neither input is a pd.Series.
     """
-    actual_pos = e_above_hull_true <= (stability_threshold or 0)  # guard against None
-    actual_neg = e_above_hull_true > (stability_threshold or 0)
-
-    model_pos = e_above_hull_pred <= (stability_threshold or 0)
-    model_neg = e_above_hull_pred > (stability_threshold or 0)
-
-    if fillna:
-        nan_mask = np.isnan(e_above_hull_pred)
-        model_pos[nan_mask] = False  # fill NaNs as unstable
-        model_neg[nan_mask] = True  # fill NaNs as unstable
-
-        n_pos, n_neg, total = model_pos.sum(), model_neg.sum(), len(e_above_hull_pred)
-        if n_pos + n_neg != total:
-            raise ValueError(
-                f"after filling NaNs, the sum of positive ({n_pos}) and negative "
-                f"({n_neg}) predictions should add up to {total=}"
-            )
-
-    true_pos = actual_pos & model_pos
-    false_neg = actual_pos & model_neg
-    false_pos = actual_neg & model_pos
-    true_neg = actual_neg & model_neg
+    index = None
+    if isinstance(e_above_hull_true, pd.Series) and isinstance(
+        e_above_hull_pred, pd.Series
+    ):
+        e_above_hull_true, e_above_hull_pred = _align(
+            e_above_hull_true, e_above_hull_pred
+        )
+        index = e_above_hull_pred.index
+    elif isinstance(e_above_hull_true, pd.Series | pd.DataFrame):
+        index = e_above_hull_true.index
+    elif isinstance(e_above_hull_pred, pd.Series | pd.DataFrame):
+        index = e_above_hull_pred.index
 
-    return true_pos, false_neg, false_pos, true_neg
+    codes = confusion_codes(
+        e_above_hull_true,
+        e_above_hull_pred,
+        stability_threshold=stability_threshold,
+        fillna=fillna,
+    )
+    true_pos, false_neg, false_pos, true_neg = (codes == code for code in range(4))
+    if index is None:
+        return true_pos, false_neg, false_pos, true_neg
+    return tuple(  # type: ignore[return-value]
+        pd.Series(mask, index=index)
+        for mask in (true_pos, false_neg, false_pos, true_neg)
+    )
 
 
 def stable_metrics(
@@ -96,11 +191,10 @@ def stable_metrics(
         dict[str, float]: dictionary of classification metrics with keys DAF, Precision,
             Recall, Accuracy, F1, TPR, FPR, TNR, FNR, MAE, RMSE, R2.
     """
-    n_true_pos, n_false_neg, n_false_pos, n_true_neg = map(
-        sum,
-        classify_stable(
-            each_true, each_pred, stability_threshold=stability_threshold, fillna=fillna
-        ),
+    # pd.Series are aligned by index before taking the positional NumPy path
+    each_true, each_pred = _align(each_true, each_pred)
+    n_true_pos, n_false_neg, n_false_pos, n_true_neg = confusion_counts(
+        each_true, each_pred, stability_threshold=stability_threshold, fillna=fillna
     )
 
     n_total_pos = n_true_pos + n_false_neg
@@ -138,3 +232,127 @@ def stable_metrics(
         RMSE=((each_true - each_pred) ** 2).mean() ** 0.5,
         R2=r2_score(each_true, each_pred),
     )
+
+
+def compute_metrics(
+    each_true: pd.Series,
+    df_each_pred: pd.DataFrame,
+    *,
+    subsets: dict[str, pd.Series | pd.DataFrame | np.ndarray] | None = None,
+    thresholds: Sequence[float] = (STABILITY_THRESHOLD,),
+    fillna: bool = True,
+) -> pd.DataFrame:
+    """Compute stability classification and regression metrics for many models, data
+    subsets and stability thresholds at once. Confusion counts and regression metrics
+    are obtained as NumPy reductions over all models (and thresholds) simultaneously
+    instead of calling stable_metrics() once per model and subset.
+
+    Args:
+        each_true (pd.Series): True energy above convex hull (eV/atom).
+        df_each_pred (pd.DataFrame): Predicted energy above convex hull (eV/atom), one
+            column per model. Must share each_true's index.
+        subsets (dict[str, pd.Series | pd.DataFrame | np.ndarray], optional): Map from
+            subset names to boolean masks selecting which materials to include. A 1d
+            mask applies to all models. A 2d mask of shape (n_materials, n_models)
+            selects different materials for each model, e.g. each model's 10k most
+            stable predictions. Defaults to {"full": all materials}.
+        thresholds (Sequence[float], optional): Stability thresholds in eV/atom to
+            classify materials as stable. Defaults to (STABILITY_THRESHOLD,).
+        fillna (bool): Whether to fill NaNs as the model predicting unstable. Defaults
+            to True.
+
+    Returns:
+        pd.DataFrame: Tidy metrics table with (subset, threshold, model) MultiIndex and
+            the same metric columns as returned by stable_metrics().
+    """
+    if subsets is None:
+        subsets = {"full": np.ones(len(each_true), dtype=bool)}
+    models = list(df_each_pred)
+    e_true = each_true.to_numpy(dtype=float)
+    e_pred = df_each_pred.to_numpy(dtype=float)
+    thresholds = np.asarray(thresholds, dtype=float)
+
+    true_is_nan, pred_is_nan = np.isnan(e_true)[:, None], np.isnan(e_pred)
+    n_models = len(models)
+    # confusion codes for all models, shape (n_thresholds, n_materials, n_models)
+    codes = np.stack(
+        [
+            confusion_codes(
+                e_true[:, None], e_pred, stability_threshold=threshold, fillna=fillna
+            )
+            for threshold in thresholds
+        ]
+    )
+    # offset codes by 4 * model index so one bincount gives counts for all models
+    model_offsets = 4 * np.arange(n_models)
+
+    err = e_pred - e_true[:, None]
+    dfs: list[pd.DataFrame] = []
+    for subset, mask in subsets.items():
+        mask = np.asarray(mask, dtype=bool)
+        mask = mask if mask.ndim == 2 else mask[:, None]
+
+        # confusion counts, shape (n_models, n_thresholds)
+        counts = np.empty((4, n_models, len(thresholds)), dtype=int)
+        for thresh_idx, codes_i in enumerate(codes):
+            keep = mask & (codes_i >= 0)
+            offset_codes = (codes_i + model_offsets)[keep]
+            counts[..., thresh_idx] = (
+                np.bincount(offset_codes, minlength=4 * n_models).reshape(n_models, 4).T
+            )
+        n_true_pos, n_false_neg, n_false_pos, n_true_neg = counts
+
+        # regression metrics over non-NaN pairs, shape (n_models,)
+        is_valid = mask & ~true_is_nan & ~pred_is_nan
+        n_valid = is_valid.sum(axis=0)
+        err_valid = np.where(is_valid, err, 0)
+        true_valid = np.where(is_valid, e_true[:, None], 0)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            n_total_pos = n_true_pos + n_false_neg
+            n_total_neg = n_true_neg + n_false_pos
+            prevalence = n_total_pos / (n_total_pos + n_total_neg)
+            precision = n_true_pos / (n_true_pos + n_false_pos)
+            recall = n_true_pos / n_total_pos
+
+            mae = np.abs(err_valid).sum(axis=0) / n_valid
+            ss_res = (err_valid**2).sum(axis=0)
+            true_mean = true_valid.sum(axis=0) / n_valid
+            ss_tot = (np.where(is_valid, e_true[:, None] - true_mean, 0) ** 2).sum(0)
+            # like sklearn.metrics.r2_score for constant targets
+            r2 = np.where(
+                ss_tot != 0, 1 - ss_res / ss_tot, np.where(ss_res == 0, 1.0, 0.0)
+            )
+            metrics = dict(
+                F1=2 * (precision * recall) / (precision + recall),
+                DAF=precision / prevalence,
+                Precision=precision,
+                Recall=recall,
+                Accuracy=(n_true_pos + n_true_neg) / n_valid[:, None],
+                TPR=recall,
+                FPR=n_false_pos / n_total_neg,
+                TNR=n_true_neg / n_total_neg,
+                FNR=n_false_neg / n_total_pos,
+                TP=n_true_pos,
+                FP=n_false_pos,
+                TN=n_true_neg,
+                FN=n_false_neg,
+                MAE=mae[:, None],
+                RMSE=(ss_res / n_valid)[:, None] ** 0.5,
+                R2=r2[:, None],
+            )
+
+        for thresh_idx, threshold in enumerate(thresholds):
+            df_subset = pd.DataFrame(
+                {
+                    key: np.broadcast_to(val, n_true_pos.shape)[:, thresh_idx]
+                    for key, val in metrics.items()
+                },
+                index=pd.MultiIndex.from_product(
+                    [[subset], [threshold], models],
+                    names=["subset", "threshold", "model"],
+                ),
+            )
+            dfs.append(df_subset)
+
+    return pd.concat(dfs)
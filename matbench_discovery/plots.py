@@ -17,10 +17,9 @@ import wandb
 from mpl_toolkits.axes_grid1.anchored_artists import AnchoredSizeBar
 from plotly.validators.scatter.line import DashValidator
 from plotly.validators.scatter.marker import SymbolValidator
-from tqdm import tqdm
 
 from matbench_discovery import STABILITY_THRESHOLD
-from matbench_discovery.metrics import classify_stable
+from matbench_discovery.metrics import confusion_codes
 
 __author__ = "Janosh Riebesell"
 __date__ = "2022-08-05"
@@ -107,25 +106,21 @@ def hist_classified_stable_vs_hull_dist(
     for facet, df_group in (
         df.groupby(kwargs["facet_col"]) if "facet_col" in kwargs else [(None, df)]
     ):
-        true_pos, false_neg, false_pos, true_neg = classify_stable(
-            df_group[each_true_col],
-            df_group[each_pred_col],
+        codes = confusion_codes(
+            df_group[each_true_col].to_numpy(),
+            df_group[each_pred_col].to_numpy(),
             stability_threshold=stability_threshold,
         )
 
         # switch between hist of DFT-computed and model-predicted convex hull distance
         srs_each = df_group[x_col]
-        each_true_pos = srs_each[true_pos]
-        each_true_neg = srs_each[true_neg]
-        each_false_neg = srs_each[false_neg]
-        each_false_pos = srs_each[false_pos]
-        # n_true_pos, n_false_pos, n_true_neg, n_false_neg = map(
-        #     sum, (true_pos, false_pos, true_neg, false_neg)
-        # )
+        each_true_pos = srs_each[codes == 0]
+        each_false_neg = srs_each[codes == 1]
+        each_false_pos = srs_each[codes == 2]
+        each_true_neg = srs_each[codes == 3]
 
-        df_group[clf_col] = np.array(clf_labels)[
-            true_pos * 0 + false_neg * 1 + false_pos * 2 + true_neg * 3
-        ]
+        # unclassifiable rows (NaN DFT hull distance) get code -1 and label None
+        df_group[clf_col] = np.array([*clf_labels, None], dtype=object)[codes]
 
         # calculate histograms for each category
         hist_true_pos, bin_edges = np.histogram(
@@ -263,6 +258,75 @@ def hist_classified_stable_vs_hull_dist(
     return fig
 
 
+def rolling_mae_and_sem(
+    e_above_hull_true: pd.Series,
+    e_above_hull_preds: pd.DataFrame | dict[str, pd.Series],
+    *,
+    window: float = 0.04,
+    bin_width: float = 0.005,
+    x_lim: tuple[float, float] = (-0.2, 0.2),
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Rolling MAE and its standard error in the mean (SEM) as a function of the true
+    distance to the convex hull for one or more models.
+
+    For each bin center c, the window includes all samples with true hull distance in
+    (c - window / 2, c + window / 2]. Instead of masking all samples for every bin,
+    samples are sorted by true hull distance once so that window edges can be found
+    with np.searchsorted and per-window sums of |err|, err^2 and sample counts are
+    differences of prefix sums. This computes all bins for all models in a single
+    vectorized pass.
+
+    Args:
+        e_above_hull_true (pd.Series): Distance to convex hull according to DFT
+            ground truth (in eV / atom).
+        e_above_hull_preds (pd.DataFrame | dict[str, pd.Series]): Predicted distance to
+            convex hull by models, one column per model (in eV / atom). NaN predictions
+            are ignored.
+        window (float, optional): Rolling MAE averaging window. Defaults to 0.04.
+        bin_width (float, optional): Spacing between bin centers. Defaults to 0.005.
+        x_lim (tuple[float, float], optional): Range of bin centers. Defaults to
+            (-0.2, 0.2).
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: Rolling MAE and rolling SEM of the absolute
+            errors, each with bin centers as index and one column per model. Bins
+            with no samples have NaN MAE, bins with fewer than 2 samples NaN SEM.
+    """
+    bins = np.arange(*x_lim, bin_width)
+    df_preds = pd.DataFrame(e_above_hull_preds).reindex(e_above_hull_true.index)
+
+    e_true = e_above_hull_true.to_numpy(dtype=float)
+    keep = ~np.isnan(e_true)
+    sort_idx = np.argsort(e_true[keep], kind="stable")
+    e_true = e_true[keep][sort_idx]
+    errors = df_preds.to_numpy(dtype=float)[keep][sort_idx] - e_true[:, None]
+
+    is_valid = ~np.isnan(errors)
+    abs_err = np.where(is_valid, np.abs(errors), 0)
+    # prefix sums with leading row of zeros so window sums are cum[hi] - cum[lo]
+    cum_count, cum_abs, cum_sq = (
+        np.concatenate([np.zeros((1, arr.shape[1])), arr.cumsum(axis=0)])
+        for arr in (is_valid.astype(float), abs_err, abs_err**2)
+    )
+    low = np.searchsorted(e_true, bins - window / 2, side="right")
+    high = np.searchsorted(e_true, bins + window / 2, side="right")
+
+    count = cum_count[high] - cum_count[low]
+    sum_abs = cum_abs[high] - cum_abs[low]
+    sum_sq = cum_sq[high] - cum_sq[low]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mae = np.where(count > 0, sum_abs / count, np.nan)
+        # sample variance (ddof=1) like scipy.stats.sem, clipped to suppress negative
+        # values from floating point cancellation
+        var = np.clip((sum_sq - count * mae**2) / (count - 1), 0, None)
+        sem = np.where(count > 1, np.sqrt(var / count), np.nan)
+
+    df_rolling_err = pd.DataFrame(mae, index=bins, columns=df_preds.columns)
+    df_err_std = pd.DataFrame(sem, index=bins, columns=df_preds.columns)
+    return df_rolling_err, df_err_std
+
+
 def rolling_mae_vs_hull_dist(
     e_above_hull_true: pd.Series,
     e_above_hull_preds: pd.DataFrame | dict[str, pd.Series],
@@ -280,7 +344,7 @@ def rolling_mae_vs_hull_dist(
     with_sem: bool = True,
     show_dft_acc: bool = False,
     show_dummy_mae: bool = False,
-    pbar: bool = True,
+    pbar: bool = True,  # noqa: ARG001
     **kwargs: Any,
 ) -> plt.Axes | go.Figure:
     r"""Rolling mean absolute error as the energy to the convex hull is varied. A scale
@@ -324,8 +388,8 @@ def rolling_mae_vs_hull_dist(
             meV/atom. Defaults to False.
         show_dummy_mae (bool, optional): If True, plot a line at the dummy MAE of always
             predicting the target mean.
-        pbar (bool, optional): If True, show a progress bar during rolling MAE
-            calculation. Defaults to True.
+        pbar (bool, optional): Unused since rolling MAE calculation was vectorized (see
+            rolling_mae_and_sem()). Kept for backwards compatibility.
         **kwargs: Additional keyword arguments to pass to df.plot().
 
     Returns:
@@ -335,34 +399,14 @@ def rolling_mae_vs_hull_dist(
             rolling error for each column in e_above_hull_errors and the rolling
             standard error in the mean.
     """
-    bins = np.arange(*x_lim, bin_width)
-    models = list(e_above_hull_preds)
-
     if df_rolling_err is None or df_err_std is None:
-        df_rolling_err = pd.DataFrame(columns=models, index=bins)
-        df_err_std = df_rolling_err.copy()
-
-        for model in (
-            prog_bar := tqdm(models, desc="Calculating rolling MAE", disable=not pbar)
-        ):
-            prog_bar.set_postfix_str(model)
-            e_above_hull_pred = e_above_hull_preds[model].dropna()
-            e_above_hull_ref = e_above_hull_true.loc[e_above_hull_pred.index]
-
-            for bin_center in bins:
-                low = bin_center - window / 2
-                high = bin_center + window / 2
-
-                mask = (e_above_hull_ref <= high) & (e_above_hull_ref > low)
-
-                bin_mae = (e_above_hull_pred - e_above_hull_ref).loc[mask].abs().mean()
-                df_rolling_err.loc[bin_center, model] = bin_mae
-
-                # drop NaNs to avoid error, scipy doesn't ignore NaNs
-                each_std = scipy.stats.sem(
-                    (e_above_hull_pred - e_above_hull_ref).loc[mask].dropna().abs()
-                )
-                df_err_std.loc[bin_center, model] = each_std
+        df_rolling_err, df_err_std = rolling_mae_and_sem(
+            e_above_hull_true,
+            e_above_hull_preds,
+            window=window,
+            bin_width=bin_width,
+            x_lim=x_lim,
+        )
     else:
         print("Using pre-calculated rolling MAE")
 
@@ -457,12 +501,13 @@ def rolling_mae_vs_hull_dist(
             line.set_markevery(8)
 
     elif backend == "plotly":
+        bins = list(df_rolling_err.index)
         for idx, model in enumerate(df_rolling_err if with_sem else []):
             # set legendgroup to model name so SEM shading toggles with model curve
             fig.data[idx].legendgroup = model
             # set SEM area to same color as model curve
             fig.add_scatter(
-                x=list(bins) + list(bins)[::-1],  # bins, then bins reversed
+                x=bins + bins[::-1],  # bins, then bins reversed
                 # upper, then lower reversed
                 y=list(df_rolling_err[model] + 3 * df_err_std[model])
                 + list(df_rolling_err[model] - 3 * df_err_std[model])[::-1],
@@ -638,17 +683,20 @@ def cumulative_metrics(
         # sort targets by model ranking
         each_true = e_above_hull_true.loc[each_pred.index]
 
-        true_pos_cum, false_neg_cum, false_pos_cum, _true_neg_cum = map(
-            np.cumsum,
-            classify_stable(
-                each_true, each_pred, stability_threshold=stability_threshold
-            ),
+        codes = confusion_codes(
+            each_true.to_numpy(),
+            each_pred.to_numpy(),
+            stability_threshold=stability_threshold,
+        )
+        true_pos_cum, false_neg_cum, false_pos_cum = (
+            np.cumsum(codes == code) for code in range(3)
         )
 
-        # precision aka positive predictive value (PPV)
-        n_total_pos = true_pos_cum.iloc[-1] + false_neg_cum.iloc[-1]
-        precision_cum = true_pos_cum / (true_pos_cum + false_pos_cum)
-        recall_cum = true_pos_cum / n_total_pos  # aka true_pos_rate aka sensitivity
+        n_total_pos = true_pos_cum[-1] + false_neg_cum[-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # precision aka positive predictive value (PPV)
+            precision_cum = true_pos_cum / (true_pos_cum + false_pos_cum)
+            recall_cum = true_pos_cum / n_total_pos  # aka true_pos_rate aka sensitivity
 
         n_pred_stable = sum(each_pred <= stability_threshold)
         model_range = np.arange(n_pred_stable)  # xs for interpolation
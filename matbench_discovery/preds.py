@@ -3,13 +3,14 @@
 from collections.abc import Sequence
 from typing import Any, Literal
 
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
 from matbench_discovery import ROOT, STABILITY_THRESHOLD, Model
-from matbench_discovery.data import Files, df_wbm, glob_to_df
+from matbench_discovery.data import Files, glob_to_df
 from matbench_discovery.enums import Key
-from matbench_discovery.metrics import stable_metrics
+from matbench_discovery.metrics import compute_metrics
 from matbench_discovery.plots import plotly_colors, plotly_line_styles, plotly_markers
 
 __author__ = "Janosh Riebesell"
@@ -155,99 +156,164 @@ def load_df_wbm_with_preds(
     return df_out
 
 
-# load WBM summary dataframe with all models' formation energy predictions (eV/atom)
-df_preds = load_df_wbm_with_preds().round(3)
-# for combo in [["CHGNet", "M3GNet"]]:
-#     df_preds[" + ".join(combo)] = df_preds[combo].mean(axis=1)
-#     PRED_FILES[" + ".join(combo)] = "combo"
+def _load_preds_and_metrics() -> dict[str, Any]:
+    """Load all models' predictions and compute their metrics. Called once on first
+    access of any of the module-level globals listed in _LAZY_GLOBALS.
 
+    Returns:
+        dict[str, Any]: Map from global variable names to their values.
+    """
+    from matbench_discovery.data import df_wbm
 
-df_metrics = pd.DataFrame()
-df_metrics.attrs["title"] = "Metrics for Full Test Set"
-df_metrics_10k = pd.DataFrame()  # look only at each model's 10k most stable predictions
-df_metrics_10k.attrs["title"] = "Metrics for 10k Most Stable Predictions"
-df_metrics_uniq_protos = pd.DataFrame(index=df_metrics.index)
-df_metrics_uniq_protos.attrs["title"] = "Metrics for unique non-MP prototypes"
-
-for df in (df_metrics, df_metrics_10k, df_metrics_uniq_protos):
-    df.index.name = "model"
-
-full_prevalence = (df_wbm[Key.each_true] <= STABILITY_THRESHOLD).mean()
-uniq_proto_prevalence = (
-    df_wbm.query(Key.uniq_proto)[Key.each_true] <= STABILITY_THRESHOLD
-).mean()
-
-for model in PRED_FILES:
-    each_pred = df_preds[Key.each_true] + df_preds[model] - df_preds[Key.e_form]
-    df_metrics[model] = stable_metrics(df_preds[Key.each_true], each_pred, fillna=True)
-
-    df_uniq_proto_preds = df_preds[df_wbm[Key.uniq_proto]]
-    each_pred_uniq_proto = (
-        df_uniq_proto_preds[Key.each_true]
-        + df_uniq_proto_preds[model]
-        - df_uniq_proto_preds[Key.e_form]
+    # load WBM summary dataframe with all models' formation energy predictions (eV/atom)
+    df_preds = load_df_wbm_with_preds().round(3)
+    # for combo in [["CHGNet", "M3GNet"]]:
+    #     df_preds[" + ".join(combo)] = df_preds[combo].mean(axis=1)
+    #     PRED_FILES[" + ".join(combo)] = "combo"
+
+    full_prevalence = (df_wbm[Key.each_true] <= STABILITY_THRESHOLD).mean()
+    uniq_proto_prevalence = (
+        df_wbm.query(Key.uniq_proto)[Key.each_true] <= STABILITY_THRESHOLD
+    ).mean()
+
+    # all models' energy above convex hull predictions, computed in the same order of
+    # operations as df_each_pred below so metrics are bitwise identical
+    model_names = list(PRED_FILES)
+    df_each_pred_all = (
+        df_preds[model_names]
+        .add(df_preds[Key.each_true], axis="index")
+        .sub(df_preds[Key.e_form], axis="index")
     )
-    df_metrics_uniq_protos[model] = stable_metrics(
-        df_uniq_proto_preds[Key.each_true], each_pred_uniq_proto, fillna=True
+    is_uniq_proto = df_wbm[Key.uniq_proto].reindex(df_preds.index).to_numpy(bool)
+    # look only at each model's 10k most stable predictions in the unique prototype set
+    is_top_10k = pd.DataFrame(data=False, index=df_preds.index, columns=model_names)
+    for model in model_names:
+        most_stable_10k = df_each_pred_all[model][is_uniq_proto].nsmallest(10_000)
+        is_top_10k.loc[most_stable_10k.index, model] = True
+
+    df_all_metrics = compute_metrics(
+        df_preds[Key.each_true],
+        df_each_pred_all,
+        subsets={
+            "full": np.ones(len(df_preds), bool),
+            "uniq_protos": is_uniq_proto,
+            "10k": is_top_10k,
+        },
+        thresholds=(STABILITY_THRESHOLD,),
+        fillna=True,
+    )
+
+    subset_labels = df_all_metrics.index.get_level_values("subset")
+    df_metrics, df_metrics_uniq_protos, df_metrics_10k = (
+        df_all_metrics[subset_labels == subset].droplevel(["subset", "threshold"]).T
+        for subset in ("full", "uniq_protos", "10k")
     )
-    df_metrics_uniq_protos.loc[Key.daf, model] = (
-        df_metrics_uniq_protos[model]["Precision"] / uniq_proto_prevalence
+    for df_met in (df_metrics_uniq_protos, df_metrics_10k):
+        df_met.loc[Key.daf] = df_met.loc["Precision"] / uniq_proto_prevalence
+
+    for df, title in (
+        (df_metrics, "Metrics for Full Test Set"),
+        (df_metrics_10k, "Metrics for 10k Most Stable Predictions"),
+        (df_metrics_uniq_protos, "Metrics for unique non-MP prototypes"),
+    ):
+        df.attrs["title"] = title
+        df.index.name = "model"
+        df.columns.name = None
+
+    # pick F1 as primary metric to sort by
+    df_metrics = df_metrics.round(3).sort_values("F1", axis=1, ascending=False)
+    df_metrics_10k = df_metrics_10k.round(3).sort_values("F1", axis=1, ascending=False)
+    df_metrics_uniq_protos = df_metrics_uniq_protos.round(3).sort_values(
+        "F1", axis=1, ascending=False
     )
 
-    # look only at each model's 10k most stable predictions in the unique prototype set
-    most_stable_10k = each_pred_uniq_proto.nsmallest(10_000)
-    df_metrics_10k[model] = stable_metrics(
-        df_preds[Key.each_true].loc[most_stable_10k.index], most_stable_10k, fillna=True
+    models = list(df_metrics.T.MAE.sort_values().index)
+    # used for consistent markers, line styles and colors for a given model across
+    # plots
+    model_styles = dict(
+        zip(models, zip(plotly_line_styles, plotly_markers, plotly_colors))
     )
-    df_metrics_10k.loc[Key.daf, model] = (
-        df_metrics_10k[model]["Precision"] / uniq_proto_prevalence
+
+    # To avoid confusion for anyone reading this code, we calculate the formation
+    # energy MAE here and report it as the MAE for the energy above the convex hull
+    # prediction. The former is more easily calculated but the two quantities are the
+    # same. The formation energy of a material is the difference in energy between a
+    # material and its constituent elements in their standard states. The distance to
+    # the convex hull is defined as the difference between a material's formation
+    # energy and the minimum formation energy of all possible stable materials made
+    # from the same elements. Since the formation energy of a material is used to
+    # calculate the distance to the convex hull, the error of a formation energy
+    # prediction directly determines the error in the distance to the convex hull
+    # prediction.
+
+    # A further point of clarification: whenever we say convex hull distance we mean
+    # the signed distance that is positive for thermodynamically unstable materials
+    # above the hull and negative for stable materials below it.
+
+    # dataframe of all models' energy above convex hull (EACH) predictions (eV/atom)
+    df_each_pred = pd.DataFrame()
+    for model in models:
+        df_each_pred[model] = (
+            df_preds[Key.each_true] + df_preds[model] - df_preds[Key.e_form]
+        )
+
+    # important: do df_each_pred.std(axis=1) before inserting Key.model_mean_each
+    df_preds[Key.model_std_each] = df_each_pred.std(axis=1)
+    df_each_pred[Key.each_mean_models] = df_preds[Key.each_mean_models] = (
+        df_each_pred.mean(axis=1)
     )
 
+    # dataframe of all models' errors in their EACH predictions (eV/atom)
+    df_each_err = pd.DataFrame()
+    for model in models:
+        df_each_err[model] = df_preds[model] - df_preds[Key.e_form]
 
-# pick F1 as primary metric to sort by
-df_metrics = df_metrics.round(3).sort_values("F1", axis=1, ascending=False)
-df_metrics_10k = df_metrics_10k.round(3).sort_values("F1", axis=1, ascending=False)
-df_metrics_uniq_protos = df_metrics_uniq_protos.round(3).sort_values(
-    "F1", axis=1, ascending=False
-)
+    df_each_err[Key.each_err_models] = df_preds[Key.each_err_models] = (
+        df_each_err.abs().mean(axis=1)
+    )
 
-models = list(df_metrics.T.MAE.sort_values().index)
-# used for consistent markers, line styles and colors for a given model across plots
-model_styles = dict(zip(models, zip(plotly_line_styles, plotly_markers, plotly_colors)))
-
-# To avoid confusion for anyone reading this code, we calculate the formation energy MAE
-# here and report it as the MAE for the energy above the convex hull prediction. The
-# former is more easily calculated but the two quantities are the same. The formation
-# energy of a material is the difference in energy between a material and its
-# constituent elements in their standard states. The distance to the convex hull is
-# defined as the difference between a material's formation energy and the minimum
-# formation energy of all possible stable materials made from the same elements. Since
-# the formation energy of a material is used to calculate the distance to the convex
-# hull, the error of a formation energy prediction directly determines the error in the
-# distance to the convex hull prediction.
-
-# A further point of clarification: whenever we say convex hull distance we mean
-# the signed distance that is positive for thermodynamically unstable materials above
-# the hull and negative for stable materials below it.
-
-# dataframe of all models' energy above convex hull (EACH) predictions (eV/atom)
-df_each_pred = pd.DataFrame()
-for model in models:
-    df_each_pred[model] = (
-        df_preds[Key.each_true] + df_preds[model] - df_preds[Key.e_form]
+    return dict(
+        df_each_err=df_each_err,
+        df_each_pred=df_each_pred,
+        df_metrics=df_metrics,
+        df_metrics_10k=df_metrics_10k,
+        df_metrics_uniq_protos=df_metrics_uniq_protos,
+        df_preds=df_preds,
+        full_prevalence=full_prevalence,
+        model_styles=model_styles,
+        models=models,
+        uniq_proto_prevalence=uniq_proto_prevalence,
     )
 
-# important: do df_each_pred.std(axis=1) before inserting Key.model_mean_each into df
-df_preds[Key.model_std_each] = df_each_pred.std(axis=1)
-df_each_pred[Key.each_mean_models] = df_preds[Key.each_mean_models] = df_each_pred.mean(
-    axis=1
+
+# module-level globals that are only computed on first access (see __getattr__) since
+# loading all model predictions and computing their metrics takes several seconds
+_LAZY_GLOBALS = (
+    "df_each_err",
+    "df_each_pred",
+    "df_metrics",
+    "df_metrics_10k",
+    "df_metrics_uniq_protos",
+    "df_preds",
+    "df_wbm",
+    "full_prevalence",
+    "model_styles",
+    "models",
+    "uniq_proto_prevalence",
 )
 
-# dataframe of all models' errors in their EACH predictions (eV/atom)
-df_each_err = pd.DataFrame()
-for model in models:
-    df_each_err[model] = df_preds[model] - df_preds[Key.e_form]
 
-df_each_err[Key.each_err_models] = df_preds[Key.each_err_models] = (
-    df_each_err.abs().mean(axis=1)
-)
+def __getattr__(name: str) -> Any:
+    """Compute lazy module-level globals like df_preds and df_metrics on first access
+    and cache them in the module namespace so later lookups are regular attribute
+    accesses.
+    """
+    if name not in _LAZY_GLOBALS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if name == "df_wbm":  # re-exported from data, doesn't need model predictions
+        from matbench_discovery.data import df_wbm
+
+        globals()[name] = df_wbm
+        return df_wbm
+    globals().update(_load_preds_and_metrics())
+    return globals()[name]
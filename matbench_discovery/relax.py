@@ -0,0 +1,594 @@
+"""Relax many structures at once with a vectorized FIRE optimizer. Instead of one
+model call per structure per step, a pool of in-flight structures is evaluated with a
+single batched energy/force/stress call per step. Converged structures are swapped out
+for new ones from the input queue so the batch stays full.
+
+Also has per-structure wall-clock budgets so one pathological structure can't stall a
+whole job array shard.
+"""
+
+import contextlib
+import signal
+import threading
+import time
+import warnings
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from ase import Atoms
+    from ase.calculators.calculator import Calculator
+    from ase.optimize.optimize import Optimizer
+
+__author__ = "Janosh Riebesell"
+__date__ = "2026-10-17"
+
+# maps a batch of structures to total energies (eV) of shape (n_structs,), a list of
+# per-structure forces (eV/Å) of shape (n_atoms, 3) and stresses (eV/Å^3) of shape
+# (n_structs, 3, 3) (may be None if cell relaxation is disabled)
+BatchCalculator = Callable[
+    [Sequence["Atoms"]], tuple[np.ndarray, Sequence[np.ndarray], np.ndarray | None]
+]
+
+
+class RelaxTimeoutError(TimeoutError):
+    """A structure exceeded its wall-clock budget. Separate from other exceptions so
+    runners can record timeouts as their own failure class.
+    """
+
+
+@contextlib.contextmanager
+def time_limit(seconds: float | None) -> Iterator[None]:
+    """Raise RelaxTimeoutError in the main thread if the body takes longer than
+    seconds. Uses SIGALRM, so the exception is raised as soon as the interpreter
+    regains control, e.g. after the current model call (compiled code isn't
+    interrupted). A previous SIGALRM handler and timer are restored on exit.
+
+    Use this for relaxation codes without a per-step hook (CHGNet's StructOptimizer,
+    M3GNet's Relaxer, BOWSR). For ASE optimizers, run_ase_optimizer() stops cleanly
+    between steps instead.
+
+    Args:
+        seconds (float | None): Time limit. None or called outside the main thread (or
+            on platforms without SIGALRM) means no limit.
+
+    Raises:
+        RelaxTimeoutError: If the body exceeds the time limit.
+    """
+    is_main_thread = threading.current_thread() is threading.main_thread()
+    if seconds is None or not is_main_thread or not hasattr(signal, "SIGALRM"):
+        if seconds is not None:
+            warnings.warn(
+                "time_limit() needs SIGALRM in the main thread, running without limit",
+                stacklevel=3,
+            )
+        yield
+        return
+
+    active = True  # don't raise if the timer fires while cleaning up
+
+    def handler(_signum: int, _frame: Any) -> None:
+        if active:
+            raise RelaxTimeoutError(f"exceeded time limit of {seconds} s")
+
+    start = time.perf_counter()
+    prev_handler = signal.signal(signal.SIGALRM, handler)
+    prev_delay, _ = signal.setitimer(signal.ITIMER_REAL, max(seconds, 1e-6))
+    try:
+        yield
+    finally:
+        active = False
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, prev_handler)
+        if prev_delay > 0:  # re-arm outer timer with its remaining time
+            remaining = prev_delay - (time.perf_counter() - start)
+            signal.setitimer(signal.ITIMER_REAL, max(remaining, 1e-6))
+
+
+def run_ase_optimizer(
+    optimizer: "Optimizer",
+    *,
+    fmax: float = 0.05,
+    max_steps: int = 500,
+    timeout: float | None = None,
+    grace: float = 60,
+) -> bool:
+    """Run an ASE optimizer with step and wall-clock budgets.
+
+    The wall-clock budget is checked between optimizer steps so a timed out
+    relaxation stops in a consistent state. As a backstop for single steps that hang,
+    time_limit() interrupts the run grace seconds after the budget, after which the
+    calculator's cached results are reset.
+
+    Args:
+        optimizer (Optimizer): ASE optimizer, e.g. FIRE(FrechetCellFilter(atoms)).
+        fmax (float, optional): Force convergence criterion (eV/Å). Defaults to 0.05.
+        max_steps (int, optional): Step budget. Defaults to 500.
+        timeout (float, optional): Wall-clock budget in seconds. Defaults to None
+            meaning no limit.
+        grace (float, optional): Seconds after timeout at which a running step is
+            interrupted. Defaults to 60.
+
+    Raises:
+        RelaxTimeoutError: If the relaxation exceeds the wall-clock budget.
+
+    Returns:
+        bool: Whether the relaxation converged within max_steps.
+    """
+    start = time.perf_counter()
+    converged = False
+    try:
+        with time_limit(None if timeout is None else timeout + grace):
+            for converged in optimizer.irun(fmax=fmax, steps=max_steps):
+                elapsed = time.perf_counter() - start
+                if timeout is not None and not converged and elapsed > timeout:
+                    raise RelaxTimeoutError(
+                        f"exceeded time limit of {timeout} s after "
+                        f"{optimizer.nsteps} steps"
+                    )
+    except RelaxTimeoutError:
+        atoms = getattr(optimizer.atoms, "atoms", optimizer.atoms)  # unwrap filters
+        if (calc := getattr(atoms, "calc", None)) is not None:
+            calc.reset()  # drop results of an interrupted step
+        raise
+    return bool(converged)
+
+
+def ase_batch_calculator(calc: "Calculator") -> BatchCalculator:
+    """Wrap a single-structure ASE calculator into a BatchCalculator that evaluates
+    structures one after another. Useful as a reference and for models without batch
+    support. Models that can batch (e.g. by collating graphs) should implement
+    BatchCalculator directly.
+
+    Args:
+        calc (Calculator): ASE calculator implementing energy, forces and (for cell
+            relaxations) stress.
+
+    Returns:
+        BatchCalculator: Batched version of calc.
+    """
+
+    def predict(
+        atoms_list: Sequence["Atoms"],
+    ) -> tuple[np.ndarray, list[np.ndarray], np.ndarray | None]:
+        energies, forces, stresses = [], [], []
+        has_stress = "stress" in calc.implemented_properties
+        for atoms in atoms_list:
+            atoms.calc = calc
+            energies.append(atoms.get_potential_energy())
+            forces.append(atoms.get_forces())
+            if has_stress:
+                stresses.append(atoms.get_stress(voigt=False))
+        return np.array(energies), forces, np.array(stresses) if has_stress else None
+
+    return predict
+
+
+class _RelaxBatch:
+    """State of all in-flight relaxations, stored as concatenated arrays so FIRE
+    updates are vectorized across structures.
+
+    Degrees of freedom (DOF) follow ASE's UnitCellFilter: per structure, the atomic
+    positions without the cell deformation applied, followed (if relax_cell) by 3
+    rows of the deformation gradient times cell_factor (= number of atoms).
+    """
+
+    def __init__(self, *, relax_cell: bool) -> None:
+        self.relax_cell = relax_cell
+        self.keys: list[Any] = []
+        self.atoms: list[Atoms] = []
+        self.results: list[dict[str, Any]] = []
+        n_extra = 3 if relax_cell else 0
+        self.n_extra = n_extra
+        self.n_atoms = np.zeros(0, dtype=int)
+        self.orig_cells = np.zeros((0, 3, 3))
+        self.dofs = np.zeros((0, 3))  # filter positions (see class docstring)
+        self.vel = np.zeros((0, 3))
+        self.dt, self.alpha = np.zeros((2, 0))
+        self.n_pos = np.zeros(0, dtype=int)  # consecutive downhill steps
+        self.n_steps = np.zeros(0, dtype=int)
+        self.start_times = np.zeros(0)  # time.perf_counter() when added
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def n_dofs(self) -> np.ndarray:
+        return self.n_atoms + self.n_extra
+
+    def row_struct_idx(self) -> np.ndarray:
+        """Index of the structure each DOF row belongs to."""
+        return np.repeat(np.arange(len(self)), self.n_dofs)
+
+    def is_atom_row(self) -> np.ndarray:
+        """Mask of DOF rows holding atomic positions (vs. cell rows)."""
+        starts = np.cumsum(self.n_dofs) - self.n_dofs
+        local_idx = np.arange(self.n_dofs.sum()) - np.repeat(starts, self.n_dofs)
+        return local_idx < np.repeat(self.n_atoms, self.n_dofs)
+
+    def add(self, key: Any, atoms: "Atoms", *, dt: float, alpha: float) -> None:
+        """Add a structure to the batch."""
+        atoms = atoms.copy()
+        dofs = atoms.get_positions()
+        if self.relax_cell:
+            dofs = np.concatenate([dofs, len(atoms) * np.eye(3)])
+        self.keys.append(key)
+        self.atoms.append(atoms)
+        self.results.append({})
+        self.n_atoms = np.append(self.n_atoms, len(atoms))
+        self.orig_cells = np.concatenate([self.orig_cells, [atoms.cell.array]])
+        self.dofs = np.concatenate([self.dofs, dofs])
+        self.vel = np.concatenate([self.vel, np.zeros_like(dofs)])
+        self.dt = np.append(self.dt, dt)
+        self.alpha = np.append(self.alpha, alpha)
+        self.n_pos = np.append(self.n_pos, 0)
+        self.n_steps = np.append(self.n_steps, 0)
+        self.start_times = np.append(self.start_times, time.perf_counter())
+
+    def remove(self, done: np.ndarray) -> list[tuple[Any, dict[str, Any]]]:
+        """Remove structures where done is True and return their results."""
+        finished = [(self.keys[idx], self.results[idx]) for idx in np.flatnonzero(done)]
+        keep = ~done
+        keep_rows = np.repeat(keep, self.n_dofs)
+        self.keys = [key for key, kept in zip(self.keys, keep, strict=True) if kept]
+        self.atoms = [
+            atoms for atoms, kept in zip(self.atoms, keep, strict=True) if kept
+        ]
+        self.results = [
+            res for res, kept in zip(self.results, keep, strict=True) if kept
+        ]
+        self.n_atoms, self.orig_cells = self.n_atoms[keep], self.orig_cells[keep]
+        self.dofs, self.vel = self.dofs[keep_rows], self.vel[keep_rows]
+        self.dt, self.alpha = self.dt[keep], self.alpha[keep]
+        self.n_pos, self.n_steps = self.n_pos[keep], self.n_steps[keep]
+        self.start_times = self.start_times[keep]
+        return finished
+
+    def deform_grads(self) -> np.ndarray:
+        """Deformation gradients of shape (n_structs, 3, 3)."""
+        if not self.relax_cell:
+            return np.tile(np.eye(3), (len(self), 1, 1))
+        cell_rows = ~self.is_atom_row()
+        cell_factors = self.n_atoms.astype(float)[:, None, None]
+        return self.dofs[cell_rows].reshape(-1, 3, 3) / cell_factors
+
+    def update_atoms(self) -> None:
+        """Write DOFs back to atomic positions and cells (UnitCellFilter.set_positions
+        for all structures at once).
+        """
+        atom_rows = self.is_atom_row()
+        deform_grads = self.deform_grads()
+        row_structs = self.row_struct_idx()[atom_rows]
+        # positions = filter positions @ F.T, cells = original cells @ F.T
+        positions = np.einsum(
+            "ri,rji->rj", self.dofs[atom_rows], deform_grads[row_structs]
+        )
+        cells = self.orig_cells @ deform_grads.transpose(0, 2, 1)
+        starts = np.cumsum(self.n_atoms) - self.n_atoms
+        for idx, atoms in enumerate(self.atoms):
+            if self.relax_cell:
+                atoms.set_cell(cells[idx], scale_atoms=False)
+            atoms.set_positions(positions[starts[idx] : starts[idx] + len(atoms)])
+
+    def filter_forces(
+        self, forces: np.ndarray, stresses: np.ndarray | None
+    ) -> np.ndarray:
+        """Generalized forces on all DOFs (UnitCellFilter.get_forces for all
+        structures at once).
+
+        Args:
+            forces (np.ndarray): Concatenated atomic forces of shape (n_atoms, 3).
+            stresses (np.ndarray | None): Stresses of shape (n_structs, 3, 3).
+
+        Returns:
+            np.ndarray: Forces of shape (n_dofs, 3).
+        """
+        if not self.relax_cell:
+            return forces
+        if stresses is None:
+            raise ValueError("Cell relaxation requires stresses from the calculator")
+        atom_rows = self.is_atom_row()
+        deform_grads = self.deform_grads()
+        row_structs = self.row_struct_idx()[atom_rows]
+        cells = np.array([atoms.cell.array for atoms in self.atoms])
+        volumes = np.abs(np.linalg.det(cells))
+        virials = -volumes[:, None, None] * np.asarray(stresses)
+        # transform virials like np.linalg.solve(F, virial.T).T in UnitCellFilter
+        virials = virials @ np.linalg.inv(deform_grads).transpose(0, 2, 1)
+        filter_forces = np.empty_like(self.dofs)
+        filter_forces[atom_rows] = np.einsum(
+            "ri,rij->rj", forces, deform_grads[row_structs]
+        )
+        cell_factors = self.n_atoms.astype(float)[:, None, None]
+        filter_forces[~atom_rows] = (virials / cell_factors).reshape(-1, 3)
+        return filter_forces
+
+
+def relax_structures(
+    structures: Iterable[tuple[Any, "Atoms"]],
+    calculator: BatchCalculator,
+    *,
+    batch_size: int = 32,
+    max_atoms: int | None = None,
+    fmax: float = 0.05,
+    max_steps: int = 500,
+    timeout: float | None = None,
+    relax_cell: bool = True,
+    record_traj: bool = False,
+    dt: float = 0.1,
+    max_step: float = 0.2,
+    dt_max: float = 1.0,
+    n_min: int = 5,
+    f_inc: float = 1.1,
+    f_dec: float = 0.5,
+    alpha_start: float = 0.1,
+    f_alpha: float = 0.99,
+) -> Iterator[tuple[Any, dict[str, Any]]]:
+    """Relax many structures with FIRE, evaluating all in-flight structures with one
+    batched calculator call per step.
+
+    The FIRE update (incl. its per-structure time step and mixing parameter) follows
+    ase.optimize.FIRE and the cell update follows ase.filters.UnitCellFilter, so a
+    single structure takes exactly the same steps as
+    FIRE(UnitCellFilter(atoms)).run(fmax, max_steps). ASE's FrechetCellFilter
+    (log-parametrized cell) is not implemented since its matrix logarithm and
+    Fréchet derivatives don't vectorize across structures.
+
+    Args:
+        structures (Iterable[tuple[Any, Atoms]]): (key, ASE Atoms) pairs, e.g.
+            dict.items() of material IDs to structures. Consumed lazily.
+        calculator (BatchCalculator): Returns energies, forces and stresses for a
+            list of Atoms in one call. Wrap ASE calculators without batch support
+            with ase_batch_calculator().
+        batch_size (int, optional): Max number of structures in flight. Defaults
+            to 32.
+        max_atoms (int, optional): Max total number of atoms in flight (e.g. to
+            bound GPU memory). A single structure larger than max_atoms still runs
+            alone. Defaults to None meaning no limit.
+        fmax (float, optional): Converged when the largest (generalized) force is
+            below this value (eV/Å). Defaults to 0.05.
+        max_steps (int, optional): Max number of optimizer steps per structure. 0
+            means single-point calculations. Defaults to 500.
+        timeout (float, optional): Wall-clock budget in seconds per structure,
+            counted from when it enters the batch. Structures still unconverged after
+            timeout are dropped from the batch. Defaults to None meaning no limit.
+        relax_cell (bool, optional): Whether to relax cell shape and volume.
+            Defaults to True.
+        record_traj (bool, optional): Whether to record positions, cells and
+            energies of every step. Defaults to False.
+        dt (float, optional): Initial FIRE time step. Defaults to 0.1.
+        max_step (float, optional): Max norm of a structure's DOF update per step.
+            Defaults to 0.2.
+        dt_max (float, optional): Max FIRE time step. Defaults to 1.0.
+        n_min (int, optional): Downhill steps before dt and alpha are adapted.
+            Defaults to 5.
+        f_inc (float, optional): Time step increase factor. Defaults to 1.1.
+        f_dec (float, optional): Time step decrease factor. Defaults to 0.5.
+        alpha_start (float, optional): Initial velocity mixing parameter. Defaults
+            to 0.1.
+        f_alpha (float, optional): Mixing parameter decay factor. Defaults to 0.99.
+
+    Raises:
+        ValueError: If batch_size < 1.
+
+    Yields:
+        tuple[Any, dict[str, Any]]: Key and result dict for each structure in the
+            order they finish. Results have keys energy, atoms (relaxed Atoms
+            without calculator), forces, stress (if the calculator returns
+            stresses), n_steps and converged, plus trajectory (dict of positions,
+            cells and energies) if record_traj. If a batched calculator call raises,
+            it's retried in halves so only structures for which the calculator raises
+            on their own yield {"error": repr(exc)}. If all structures succeed on
+            their own (e.g. the batch ran out of GPU memory), later steps call the
+            calculator on half as many structures at a time. Structures exceeding
+            timeout yield {"error": repr(RelaxTimeoutError(...)), "n_steps": n_steps}.
+    """
+    if batch_size < 1:
+        raise ValueError(f"{batch_size=} must be positive")
+    queue = iter(structures)
+    batch = _RelaxBatch(relax_cell=relax_cell)
+    calc_size = batch_size  # max structures per calculator call, shrinks on failure
+    pending = next(queue, None)
+
+    while True:
+        # swap new structures from the queue into free slots
+        while pending is not None and len(batch) < batch_size:
+            n_atoms = int(batch.n_atoms.sum()) + len(pending[1])
+            if max_atoms is not None and len(batch) > 0 and n_atoms > max_atoms:
+                break
+            batch.add(*pending, dt=dt, alpha=alpha_start)
+            if record_traj:
+                batch.results[-1]["trajectory"] = dict(
+                    positions=[], cells=[], energies=[]
+                )
+            pending = next(queue, None)
+        if len(batch) == 0:
+            return
+
+        calc_results, calc_size = _calc_chunked(batch.atoms, calculator, calc_size)
+        failed = np.array([isinstance(res, str) for res in calc_results])
+        if failed.any():  # drop structures for which the calculator raises
+            for idx in np.flatnonzero(failed):
+                batch.results[idx] = {"error": calc_results[idx]}
+            yield from batch.remove(failed)
+            if len(batch) == 0:
+                continue
+        ok_results = [res for res in calc_results if not isinstance(res, str)]
+        energies = np.array([energy for energy, *_ in ok_results])
+        forces = [struct_forces for _, struct_forces, _ in ok_results]
+        stresses = None
+        if all(stress is not None for *_, stress in ok_results):
+            stresses = np.array([stress for *_, stress in ok_results])
+
+        all_forces = np.concatenate(forces)
+        filter_forces = batch.filter_forces(all_forces, stresses)
+        row_structs = batch.row_struct_idx()
+        max_forces = np.zeros(len(batch))
+        np.maximum.at(max_forces, row_structs, np.linalg.norm(filter_forces, axis=1))
+        converged = max_forces < fmax
+        done = converged | (batch.n_steps >= max_steps)
+        timed_out = np.zeros(len(batch), dtype=bool)
+        if timeout is not None:
+            timed_out = ~done & (time.perf_counter() - batch.start_times > timeout)
+        for idx in np.flatnonzero(timed_out):
+            n_steps = int(batch.n_steps[idx])
+            exc = RelaxTimeoutError(
+                f"exceeded time limit of {timeout} s after {n_steps} steps"
+            )
+            batch.results[idx] = {"error": repr(exc), "n_steps": n_steps}
+
+        starts = np.cumsum(batch.n_atoms) - batch.n_atoms
+        for idx, result in enumerate(batch.results):
+            atoms = batch.atoms[idx]
+            if timed_out[idx]:
+                continue
+            if record_traj:
+                traj = result["trajectory"]
+                traj["positions"].append(atoms.get_positions())
+                traj["cells"].append(atoms.cell.array.copy())
+                traj["energies"].append(float(energies[idx]))
+            if not done[idx]:
+                continue
+            result["energy"] = float(energies[idx])
+            result["atoms"] = atoms.copy()
+            result["forces"] = all_forces[starts[idx] : starts[idx] + len(atoms)]
+            if stresses is not None:
+                result["stress"] = np.asarray(stresses[idx])
+            result["n_steps"] = int(batch.n_steps[idx])
+            result["converged"] = bool(converged[idx])
+
+        if (finished := done | timed_out).any():
+            filter_forces = filter_forces[~finished[row_structs]]
+            yield from batch.remove(finished)
+        if len(batch) > 0:
+            _fire_step(
+                batch,
+                filter_forces,
+                max_step=max_step,
+                dt_max=dt_max,
+                n_min=n_min,
+                f_inc=f_inc,
+                f_dec=f_dec,
+                alpha_start=alpha_start,
+                f_alpha=f_alpha,
+            )
+            batch.update_atoms()
+
+
+_CalcResult = tuple[float, np.ndarray, np.ndarray | None] | str
+
+
+def _split_results(
+    energies: np.ndarray, forces: Sequence[np.ndarray], stresses: np.ndarray | None
+) -> list[_CalcResult]:
+    """Split a batched calculator's output into per-structure (energy, forces, stress)
+    tuples.
+    """
+    return [
+        (energy, forces[idx], None if stresses is None else stresses[idx])
+        for idx, energy in enumerate(energies)
+    ]
+
+
+def _calc_bisect(
+    atoms_list: Sequence["Atoms"], calculator: BatchCalculator, exc: Exception
+) -> list[_CalcResult]:
+    """Evaluate structures in ever smaller halves after the calculator raised exc for
+    all of them, until each structure either succeeds or raises on its own.
+
+    Returns:
+        list[_CalcResult]: (energy, forces, stress) per structure or the repr of the
+            exception if the structure fails on its own.
+    """
+    if len(atoms_list) == 1:
+        return [repr(exc)]
+    results: list[_CalcResult] = []
+    mid = len(atoms_list) // 2
+    for half in (atoms_list[:mid], atoms_list[mid:]):
+        try:
+            results += _split_results(*calculator(half))
+        except Exception as half_exc:
+            results += _calc_bisect(half, calculator, half_exc)
+    return results
+
+
+def _calc_chunked(
+    atoms_list: Sequence["Atoms"], calculator: BatchCalculator, chunk_size: int
+) -> tuple[list[_CalcResult], int]:
+    """Evaluate structures with one calculator call per chunk_size structures. If a
+    call raises, its chunk is retried in halves with _calc_bisect() so only structures
+    that fail on their own are lost. If all of them succeed on their own (e.g. the
+    chunk ran out of GPU memory), chunk_size is halved for later calls.
+
+    Returns:
+        tuple[list[_CalcResult], int]: (energy, forces, stress) or error repr per
+            structure and the chunk size to use for the next call.
+    """
+    results: list[_CalcResult] = []
+    for start in range(0, len(atoms_list), chunk_size):
+        chunk = atoms_list[start : start + chunk_size]
+        try:
+            results += _split_results(*calculator(chunk))
+        except Exception as exc:
+            chunk_results = _calc_bisect(chunk, calculator, exc)
+            if len(chunk) > 1 and not any(isinstance(r, str) for r in chunk_results):
+                chunk_size = max(1, len(chunk) // 2)
+            results += chunk_results
+    return results, chunk_size
+
+
+def _fire_step(
+    batch: _RelaxBatch,
+    forces: np.ndarray,
+    *,
+    max_step: float,
+    dt_max: float,
+    n_min: int,
+    f_inc: float,
+    f_dec: float,
+    alpha_start: float,
+    f_alpha: float,
+) -> None:
+    """One ase.optimize.FIRE step for all structures in the batch, with per-structure
+    dot products and norms computed as segment sums over DOF rows.
+    """
+    row_structs = batch.row_struct_idx()
+    n_structs = len(batch)
+
+    def struct_sum(values: np.ndarray) -> np.ndarray:
+        return np.bincount(row_structs, weights=values, minlength=n_structs)
+
+    vel = batch.vel
+    vf = struct_sum((forces * vel).sum(axis=1))
+    f_norm = np.sqrt(struct_sum((forces * forces).sum(axis=1)))
+    v_norm = np.sqrt(struct_sum((vel * vel).sum(axis=1)))
+    # velocities start at 0 so the first step of each structure skips the mixing
+    started = batch.n_steps > 0
+    downhill = started & (vf > 0)
+    uphill = started & ~(vf > 0)
+
+    # mix velocities towards force direction on downhill steps
+    mix = np.zeros(n_structs)
+    np.divide(batch.alpha * v_norm, f_norm, out=mix, where=downhill & (f_norm > 0))
+    keep = np.where(downhill, 1 - batch.alpha, 1.0)
+    keep[uphill] = 0  # reset velocities on uphill steps
+    vel = keep[row_structs, None] * vel + mix[row_structs, None] * forces
+
+    speed_up = downhill & (batch.n_pos > n_min)
+    batch.dt[speed_up] = np.minimum(batch.dt[speed_up] * f_inc, dt_max)
+    batch.alpha[speed_up] *= f_alpha
+    batch.n_pos[downhill] += 1
+    batch.alpha[uphill] = alpha_start
+    batch.dt[uphill] *= f_dec
+    batch.n_pos[uphill] = 0
+
+    vel += batch.dt[row_structs, None] * forces
+    step = batch.dt[row_structs, None] * vel
+    step_norm = np.sqrt(struct_sum((step * step).sum(axis=1)))
+    scale = np.ones(n_structs)
+    np.divide(max_step, step_norm, out=scale, where=step_norm > max_step)
+    batch.vel = vel
+    batch.dofs = batch.dofs + scale[row_structs, None] * step
+    batch.n_steps += 1
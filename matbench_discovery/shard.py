@@ -0,0 +1,155 @@
+"""Split structures into job array shards of balanced estimated cost instead of equal
+row counts. Relaxation cost grows with the number of sites and their neighbor counts,
+so np.array_split leaves a few array tasks running far longer than the rest.
+"""
+
+import heapq
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from matbench_discovery.enums import Key
+
+__author__ = "Janosh Riebesell"
+__date__ = "2026-10-17"
+
+
+def estimate_costs(
+    n_sites: pd.Series,
+    volumes: pd.Series | None = None,
+    *,
+    timings: pd.Series | None = None,
+    cutoff: float = 6.0,
+) -> pd.Series:
+    """Estimate the relative cost of relaxing each structure.
+
+    Message-passing models do work proportional to the number of edges in the
+    structure's graph, i.e. n_sites * neighbors per site where neighbors per site is
+    the number density times the cutoff sphere volume. If timings from a previous run
+    are passed, they're used as is for the structures they cover and the remaining
+    estimates are rescaled to seconds by the median ratio of timings to estimates.
+
+    Args:
+        n_sites (pd.Series): Number of sites per structure indexed by material ID.
+        volumes (pd.Series, optional): Cell volumes (Å^3) with the same index. Defaults
+            to None meaning cost is proportional to n_sites.
+        timings (pd.Series, optional): Measured seconds per structure from previous
+            runs indexed by material ID. May cover any subset of n_sites.index.
+            Defaults to None.
+        cutoff (float, optional): Model's neighbor cutoff radius in Å. Defaults to 6.
+
+    Raises:
+        ValueError: If n_sites or volumes contain non-positive or missing values.
+
+    Returns:
+        pd.Series: Estimated costs indexed like n_sites. In seconds if timings were
+            passed, else arbitrary units.
+    """
+    costs = n_sites.astype(float)
+    if volumes is not None:
+        sphere_vol = 4 / 3 * math.pi * cutoff**3
+        costs = costs * (1 + costs / volumes.reindex(costs.index) * sphere_vol)
+    if not (costs > 0).all():  # also catches NaNs
+        n_bad = len(costs) - (costs > 0).sum()
+        raise ValueError(f"{n_bad} structures with missing or non-positive size")
+    costs.name = "cost"
+
+    if timings is not None:
+        timings = timings.dropna().reindex(costs.index).dropna()
+        if len(timings) > 0:
+            costs *= np.median(timings / costs[timings.index])
+            costs[timings.index] = timings
+    return costs
+
+
+def balance_shards(costs: pd.Series, n_shards: int) -> pd.Series:
+    """Assign structures to shards so each shard's total cost is about the same with
+    the longest processing time heuristic: going from most to least expensive, each
+    structure goes to the shard with the lowest total cost so far. The result is at most
+    4/3 times the optimal maximum shard cost. Ties are broken by material ID and shard
+    index so the assignment is deterministic.
+
+    Args:
+        costs (pd.Series): Estimated cost per structure indexed by material ID.
+        n_shards (int): Number of shards, e.g. the slurm job array size.
+
+    Raises:
+        ValueError: If n_shards < 1.
+
+    Returns:
+        pd.Series: 0-based shard index per structure indexed like costs.
+    """
+    if n_shards < 1:
+        raise ValueError(f"{n_shards=} must be positive")
+    order = np.lexsort((costs.index.astype(str), -costs.to_numpy()))
+    shard_loads = [(0.0, shard_idx) for shard_idx in range(n_shards)]
+    shards = np.empty(len(costs), dtype=int)
+    for row_idx in order:
+        load, shard_idx = heapq.heappop(shard_loads)
+        shards[row_idx] = shard_idx
+        heapq.heappush(shard_loads, (load + costs.iloc[row_idx], shard_idx))
+    return pd.Series(shards, index=costs.index, name="shard")
+
+
+def get_shard_manifest(
+    path: str, costs: pd.Series | None = None, n_shards: int | None = None
+) -> pd.DataFrame:
+    """Load a shard manifest from path or build it from costs with balance_shards()
+    and write it to path if it doesn't exist yet. Since the assignment is
+    deterministic, concurrently starting array tasks write identical files (atomically)
+    so any of them can create it.
+
+    Args:
+        path (str): CSV file with material_id, shard and cost columns.
+        costs (pd.Series, optional): Estimated costs per structure, e.g. from
+            estimate_costs(). Required if path doesn't exist.
+        n_shards (int, optional): Number of shards. Required if path doesn't exist.
+            Checked against the manifest if it exists.
+
+    Raises:
+        ValueError: If path doesn't exist and costs or n_shards is missing, or if an
+            existing manifest has a different number of shards.
+
+    Returns:
+        pd.DataFrame: Manifest indexed by material ID with shard and cost columns.
+    """
+    if os.path.isfile(path):
+        df_manifest = pd.read_csv(path).set_index(Key.mat_id)
+        # balance_shards() leaves no shard empty unless there are fewer structures
+        n_manifest = df_manifest["shard"].max() + 1
+        if n_shards is not None and n_manifest != min(n_shards, len(df_manifest)):
+            raise ValueError(f"{path=} has {n_manifest} shards, expected {n_shards=}")
+        return df_manifest
+
+    if costs is None or n_shards is None:
+        raise ValueError(f"{path=} doesn't exist, pass costs and n_shards to create it")
+    df_manifest = pd.DataFrame(
+        {"shard": balance_shards(costs, n_shards), "cost": costs}
+    )
+    df_manifest.index.name = Key.mat_id
+
+    out_dir, file_name = os.path.split(path)
+    os.makedirs(out_dir or ".", exist_ok=True)
+    tmp_path = os.path.join(out_dir, f".tmp-{os.getpid()}-{file_name}")
+    try:
+        df_manifest.to_csv(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+    return df_manifest
+
+
+def shard_ids(df_manifest: pd.DataFrame, shard_idx: int) -> list[str]:
+    """Material IDs assigned to shard_idx in a manifest from get_shard_manifest().
+
+    Args:
+        df_manifest (pd.DataFrame): Shard manifest indexed by material ID.
+        shard_idx (int): 0-based shard index.
+
+    Returns:
+        list[str]: Material IDs in manifest order (empty if the shard has none).
+    """
+    return list(df_manifest.index[df_manifest["shard"] == shard_idx])
@@ -1,9 +1,29 @@
-"""Slurm job submission helper function."""
+"""Slurm job submission helper function (with a local multi-core backend for machines
+without Slurm), job array bookkeeping to resubmit only missing or failed tasks and
+crash-safe result journal for job array shards.
+"""
 
+import atexit
+import json
 import os
+import shlex
+import signal
+import socket
 import subprocess
 import sys
-from collections.abc import Sequence
+import threading
+import time as time_mod
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
+from glob import glob
+from types import FrameType, TracebackType
+from typing import Any, Self
+
+import pandas as pd
+
+from matbench_discovery.data import as_dict_handler
+from matbench_discovery.enums import Key
 
 # taken from https://slurm.schedmd.com/job_array.html#env_vars, lower-cased and
 # and removed the SLURM_ prefix
@@ -11,6 +31,9 @@ SLURM_KEYS = (
     "job_id array_job_id array_task_id array_task_count mem_per_node nodelist"
     "submit_host job_partition job_user job_account tasks_per_node job_qos"
 ).split()
+# CLI args that make slurm_submit() submit the calling script instead of returning
+SUBMIT_MODES = ("slurm-submit", "local-submit", "slurm-resubmit", "local-resubmit")
+ARRAY_MANIFEST = "array-manifest.json"  # file name of job array manifest in out_dir
 
 
 def _get_calling_file_path(frame: int = 1) -> str:
@@ -37,12 +60,29 @@ def slurm_submit(
     slurm_flags: str | Sequence[str] = (),
     array: str | None = None,
     pre_cmd: str = "",
+    executor: str | None = None,
+    workers: int | None = None,
 ) -> dict[str, str]:
     """Slurm submits a python script using `sbatch --wrap 'python path/to/file.py'`.
 
     Usage: Call this function at the top of the script (before doing any real work) and
     then submit a job with `python path/to/that/script.py slurm-submit`. The slurm job
-    will run the whole script.
+    will run the whole script. On machines without Slurm, run
+    `python path/to/that/script.py local-submit` instead to run all array tasks on
+    local CPU cores with run_local_array().
+
+    The absolute out_dir is exported to the job as SBATCH_OUTPUT so scripts that
+    derive out_dir from e.g. the current date can read it back with
+    os.getenv("SBATCH_OUTPUT", ...) and all tasks (incl. resubmitted ones or ones
+    starting after midnight) write to the same directory.
+
+    Array submissions are recorded in out_dir/array-manifest.json. Tasks that report
+    their status with ArrayTask can be checked with array_status(out_dir) and once the
+    array is finished, `python path/to/that/script.py slurm-resubmit` (or
+    local-resubmit) submits a new array with only the missing or failed task IDs. If
+    out_dir has no manifest (e.g. since it contains the date and the array was
+    submitted on an earlier day), resubmit uses the out_dir and job_name of the most
+    recent manifest for the same script in a sibling directory.
 
     Args:
         job_name (str): Slurm job name.
@@ -56,14 +96,23 @@ def slurm_submit(
         slurm_flags (str | list[str], optional): Extra slurm CLI flags. Defaults to ().
             Examples: ('--nodes 1', '--gpus-per-node 1') or ('--mem', '16G').
         array (str, optional): Slurm array specifier. Defaults to None. Example:
-            '9' (for SLURM_ARRAY_TASK_ID from 0-9 inclusive), '1-10' or '1-10%2', etc.
+            '0-9' (for SLURM_ARRAY_TASK_ID from 0-9 inclusive), '1,3,5', '1-10%2'
+            (at most 2 tasks running at once), etc.
         pre_cmd (str, optional): Things like `module load` commands and environment
             variables to set before running the python script go here. Example:
             pre_cmd='ENV_VAR=42' or 'module load pytorch;'. Defaults to "". If running
             on CPU, pre_cmd="unset OMP_NUM_THREADS" allows PyTorch to use all cores.
+        executor (str, optional): Key of SUBMIT_EXECUTORS to submit with, 'slurm' or
+            'local'. Defaults to None meaning 'local' if the script was called with
+            'local-submit', else 'slurm'.
+        workers (int, optional): Max number of array tasks to run at once with the
+            local executor. Defaults to None meaning number of CPU cores (further
+            limited by the %N suffix of array).
 
     Raises:
-        SystemExit: Exit code will be subprocess.run(['sbatch', ...]).returncode.
+        SystemExit: Exit code will be subprocess.run(['sbatch', ...]).returncode or the
+            highest exit code of the locally run array tasks.
+        ValueError: If resubmitting without array or executor is unknown.
 
     Returns:
         dict[str, str]: Slurm variables like job ID, array task ID, compute nodes IDs,
@@ -71,17 +120,36 @@ def slurm_submit(
     """
     py_file_path = py_file_path or _get_calling_file_path(frame=2)
 
-    os.makedirs(out_dir, exist_ok=True)  # slurm fails if out_dir is missing
-
     # ensure pre_cmd ends with a semicolon
     if pre_cmd and not pre_cmd.strip().endswith(";"):
         pre_cmd += ";"
 
+    submit_mode = next((arg for arg in sys.argv if arg in SUBMIT_MODES), None)
+    if submit_mode in ("slurm-resubmit", "local-resubmit"):
+        if array is None:
+            raise ValueError(f"{submit_mode} only works for job arrays, got {array=}")
+        _, max_running = parse_array_spec(array)
+        if manifest := _find_array_manifest(out_dir, job_name, py_file_path):
+            out_dir, job_name = manifest["out_dir"], manifest["job_name"]
+            print(f"Resubmitting {job_name=} in {out_dir=}")
+        df_status = array_status(out_dir)
+        print(f"Array task status counts: {df_status.status.value_counts().to_dict()}")
+        redo_ids = list(df_status.index[df_status.status != "done"])
+        if not redo_ids:
+            raise SystemExit(f"All {len(df_status)} array tasks done, nothing to do")
+        array = format_array_spec(redo_ids, max_running)
+
+    os.makedirs(out_dir, exist_ok=True)  # slurm fails if out_dir is missing
+    # pass out_dir to the job so scripts don't recompute it (e.g. on a later day)
+    export_out_dir = f"export SBATCH_OUTPUT={shlex.quote(os.path.abspath(out_dir))};"
+    wrap_cmd = " ".join(
+        filter(None, (export_out_dir, pre_cmd, f"python {py_file_path}"))
+    )
     cmd = [
         *("sbatch", "--job-name", job_name),
         *("--output", f"{out_dir}/slurm-%A{'-%a' if array else ''}.log"),
         *(slurm_flags.split() if isinstance(slurm_flags, str) else slurm_flags),
-        *("--wrap", f"{pre_cmd or ''} python {py_file_path}".strip()),
+        *("--wrap", wrap_cmd),
     ]
     for flag in (f"{time=}", f"{account=}", f"{partition=}", f"{array=}"):
         key, val = flag.split("=")
@@ -105,16 +173,622 @@ def slurm_submit(
 
     # print sbatch command into slurm log file and at job submission time
     # but not into terminal or Jupyter
-    if (is_slurm_job and is_log_file) or "slurm-submit" in sys.argv:
+    is_sbatch_submit = submit_mode in ("slurm-submit", "slurm-resubmit")
+    if (is_slurm_job and is_log_file) or is_sbatch_submit:
         print(f"\n{' '.join(cmd)}\n".replace(" --", "\n  --"))
     if is_slurm_job and is_log_file:
         for key, val in slurm_vars.items():
             print(f"{key}={val}")
 
-    if "slurm-submit" not in sys.argv:
+    if submit_mode is None:
         return slurm_vars  # if not submitting slurm job, resume outside code as normal
 
-    result = subprocess.run(cmd, check=True)
+    executor = executor or submit_mode.split("-")[0]
+    if executor not in SUBMIT_EXECUTORS:
+        raise ValueError(f"Unknown {executor=}, must be one of {[*SUBMIT_EXECUTORS]}")
+    if array is not None:
+        _record_array_submission(out_dir, job_name, py_file_path, array, executor)
+    returncode = SUBMIT_EXECUTORS[executor](
+        cmd,
+        job_name=job_name,
+        out_dir=out_dir,
+        py_file_path=py_file_path,
+        array=array,
+        pre_cmd=pre_cmd,
+        time=time,
+        workers=workers,
+    )
+
+    # after submission, exit with slurm (or local array) exit code
+    raise SystemExit(returncode)
+
+
+def parse_array_spec(array: str) -> tuple[list[int], int | None]:
+    """Parse a slurm --array specifier like '1-10', '0,4-6', '1-9:2%3'.
+
+    Args:
+        array (str): Comma-separated task IDs or ranges with optional :step and an
+            optional %N suffix limiting the number of simultaneously running tasks.
+
+    Raises:
+        ValueError: If array is not a valid specifier.
+
+    Returns:
+        tuple[list[int], int | None]: Sorted unique task IDs and max concurrent tasks
+            (None if unlimited).
+    """
+    spec, _, limit = array.partition("%")
+    task_ids: set[int] = set()
+    try:
+        for part in spec.split(","):
+            bounds, _, step = part.partition(":")
+            start, _, stop = bounds.partition("-")
+            task_ids.update(range(int(start), int(stop or start) + 1, int(step or 1)))
+        max_running = int(limit) if limit else None
+    except ValueError:
+        raise ValueError(f"Invalid slurm {array=}") from None
+    if not task_ids or (max_running is not None and max_running < 1):
+        raise ValueError(f"Invalid slurm {array=}")
+    return sorted(task_ids), max_running
+
+
+def format_array_spec(task_ids: Sequence[int], max_running: int | None = None) -> str:
+    """Inverse of parse_array_spec(): compress task IDs into a slurm --array specifier
+    with consecutive IDs merged into ranges, e.g. [1, 2, 3, 7] -> '1-3,7'.
+
+    Args:
+        task_ids (Sequence[int]): Task IDs.
+        max_running (int, optional): Max number of simultaneously running tasks,
+            appended as %N suffix. Defaults to None meaning no limit.
+
+    Returns:
+        str: Slurm array specifier.
+    """
+    ranges: list[list[int]] = []
+    for task_id in sorted(set(task_ids)):
+        if ranges and task_id == ranges[-1][-1] + 1:
+            ranges[-1][-1] = task_id
+        else:
+            ranges.append([task_id, task_id])
+    spec = ",".join(f"{lo}-{hi}" if hi > lo else f"{lo}" for lo, hi in ranges)
+    return f"{spec}%{max_running}" if max_running else spec
+
+
+def parse_slurm_time(time: str) -> float | None:
+    """Convert a slurm time limit to seconds. Accepted formats are 'minutes',
+    'minutes:seconds', 'hours:minutes:seconds', 'days-hours', 'days-hours:minutes' and
+    'days-hours:minutes:seconds'.
+
+    Args:
+        time (str): Slurm time limit.
+
+    Raises:
+        ValueError: If time is not a valid slurm time limit.
+
+    Returns:
+        float | None: Time limit in seconds. None for 'UNLIMITED' or 'infinite'.
+    """
+    if time.lower() in ("unlimited", "infinite"):
+        return None
+    days, _, clock = time.rpartition("-")
+    try:
+        parts = [int(part) for part in clock.split(":")]
+        if len(parts) > 3:
+            raise ValueError
+        if days:  # hours[:minutes[:seconds]]
+            hours, minutes, seconds = [*parts, 0, 0][:3]
+            hours += 24 * int(days)
+        elif len(parts) == 3:
+            hours, minutes, seconds = parts
+        else:  # minutes[:seconds]
+            hours, (minutes, seconds) = 0, [*parts, 0][:2]
+    except ValueError:
+        raise ValueError(f"Invalid slurm {time=}") from None
+    return float(3600 * hours + 60 * minutes + seconds)
+
+
+def run_local_array(
+    job_name: str,
+    out_dir: str,
+    py_file_path: str,
+    *,
+    array: str | None = None,
+    pre_cmd: str = "",
+    time: str | None = None,
+    workers: int | None = None,
+    kill_wait: float = 30,
+) -> int:
+    """Run a python script (or each task of a job array) on local CPU cores the way
+    slurm would, for machines without slurm. Each task runs in its own process with the
+    SLURM_* environment variables scripts read (SLURM_JOB_ID, SLURM_ARRAY_JOB_ID,
+    SLURM_ARRAY_TASK_ID, SLURM_ARRAY_TASK_COUNT, ...) set and its stdout and stderr
+    written to the same log file slurm would use. Tasks exceeding the time limit get
+    SIGTERM and kill_wait seconds later SIGKILL like with slurm's KillWait.
+
+    Args:
+        job_name (str): Job name, exported as SLURM_JOB_NAME.
+        out_dir (str): Directory to write logs to.
+        py_file_path (str): Python script to run.
+        array (str, optional): Slurm array specifier, see parse_array_spec(). Defaults
+            to None meaning run a single non-array job.
+        pre_cmd (str, optional): Shell commands to run before the script. Defaults to
+            "".
+        time (str, optional): Slurm time limit per task, see parse_slurm_time().
+            Defaults to None meaning no limit.
+        workers (int, optional): Max number of tasks running at once. Defaults to None
+            meaning number of CPU cores. Further limited by the %N suffix of array.
+        kill_wait (float, optional): Seconds between SIGTERM and SIGKILL for tasks
+            exceeding the time limit. Defaults to 30 (slurm's default KillWait).
+
+    Returns:
+        int: 0 if all tasks succeeded, else the highest task exit code (128 + signal
+            number for tasks killed by a signal).
+    """
+    task_ids, max_running = parse_array_spec(array) if array else ([None], None)
+    n_cpus = os.cpu_count() or 1
+    workers = min(workers or n_cpus, max_running or n_cpus, len(task_ids))
+    timeout = parse_slurm_time(time) if time else None
+    job_id = os.getpid()
+    if pre_cmd and not pre_cmd.strip().endswith(";"):
+        pre_cmd += ";"
+    shell_cmd = f"{pre_cmd} {sys.executable} {py_file_path}".strip()
+
+    os.makedirs(out_dir, exist_ok=True)
+    base_env = os.environ | {
+        "SBATCH_OUTPUT": os.path.abspath(out_dir),  # see slurm_submit()
+        "SLURM_JOB_NAME": job_name,
+        "SLURM_SUBMIT_DIR": os.getcwd(),
+        "SLURM_SUBMIT_HOST": socket.gethostname(),
+        "SLURM_JOB_PARTITION": "local",
+        "SLURM_CPUS_PER_TASK": str(max(n_cpus // workers, 1)),
+    }
+    base_env.setdefault("OMP_NUM_THREADS", base_env["SLURM_CPUS_PER_TASK"])
+    if array:
+        base_env |= {
+            "SLURM_ARRAY_JOB_ID": str(job_id),
+            "SLURM_ARRAY_TASK_COUNT": str(len(task_ids)),
+            "SLURM_ARRAY_TASK_MIN": str(task_ids[0]),
+            "SLURM_ARRAY_TASK_MAX": str(task_ids[-1]),
+        }
+    running: set[subprocess.Popen[bytes]] = set()
+    lock = threading.Lock()
+    cancelled = threading.Event()
+
+    def run_task(task_idx: int, task_id: int | None) -> int:
+        if cancelled.is_set():
+            return 0
+        env = base_env | {"SLURM_JOB_ID": str(job_id + task_idx)}
+        log_path = f"{out_dir}/slurm-{job_id}.log"
+        if task_id is not None:
+            env["SLURM_ARRAY_TASK_ID"] = str(task_id)
+            log_path = f"{out_dir}/slurm-{job_id}-{task_id}.log"
+        with open(log_path, "w") as log_file:
+            # new session so signals reach the python process, not just the shell
+            proc = subprocess.Popen(
+                shell_cmd,
+                shell=True,  # noqa: S602
+                env=env,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+            with lock:
+                running.add(proc)
+            try:
+                returncode = proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                os.killpg(proc.pid, signal.SIGTERM)
+                try:
+                    returncode = proc.wait(timeout=kill_wait)
+                except subprocess.TimeoutExpired:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                    returncode = proc.wait()
+            finally:
+                with lock:
+                    running.discard(proc)
+        return 128 - returncode if returncode < 0 else returncode
+
+    print(f"Running {len(task_ids)} {job_name} task(s) on {workers} local worker(s)")
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            returncodes = list(executor.map(run_task, *zip(*enumerate(task_ids))))
+    except BaseException:  # e.g. KeyboardInterrupt: don't leave orphaned tasks
+        cancelled.set()
+        with lock:
+            for proc in running:
+                os.killpg(proc.pid, signal.SIGTERM)
+        raise
+
+    failed = {
+        task_id: code
+        for task_id, code in zip(task_ids, returncodes, strict=True)
+        if code != 0
+    }
+    if failed:
+        print(f"{len(failed)} task(s) failed (task ID: exit code): {failed}")
+    return max(returncodes)
+
+
+def _run_sbatch(cmd: list[str], **kwargs: Any) -> int:  # noqa: ARG001
+    """Submit cmd with sbatch and return its exit code."""
+    return subprocess.run(cmd, check=True).returncode
+
+
+# maps executor names to functions taking the sbatch command and the keyword arguments
+# of slurm_submit() and returning an exit code. register new backends here
+SUBMIT_EXECUTORS: dict[str, Callable[..., int]] = {
+    "slurm": _run_sbatch,
+    "local": lambda _cmd, **kwargs: run_local_array(**kwargs),
+}
+
+
+def _write_json(path: str, data: dict[str, Any]) -> None:
+    """Write data to a JSON file atomically so readers never see partial files."""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as file:
+        json.dump(data, file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _record_array_submission(
+    out_dir: str, job_name: str, py_file_path: str, array: str, executor: str
+) -> None:
+    """Create or update out_dir/array-manifest.json with the expected task IDs (from
+    the first submission) and a log of (re)submissions.
+    """
+    manifest_path = f"{out_dir}/{ARRAY_MANIFEST}"
+    manifest: dict[str, Any] = {}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+    if not manifest.get("task_ids"):
+        manifest |= {
+            "out_dir": os.path.abspath(out_dir),
+            "job_name": job_name,
+            "py_file_path": py_file_path,
+            "task_ids": parse_array_spec(array)[0],
+        }
+    submitted_at = datetime.now(tz=UTC).isoformat(timespec="seconds")
+    manifest.setdefault("submissions", []).append(
+        {"array": array, "executor": executor, "submitted_at": submitted_at}
+    )
+    _write_json(manifest_path, manifest)
+
+
+def _find_array_manifest(
+    out_dir: str, job_name: str, py_file_path: str
+) -> dict[str, Any] | None:
+    """Find the job array manifest to resubmit: out_dir's own or else the most
+    recently updated one for the same script in a sibling directory of out_dir (e.g.
+    yesterday's if out_dir contains the date), preferring ones with the same job_name.
+
+    Returns:
+        dict[str, Any] | None: The manifest with out_dir set to the directory it's in
+            or None if there's none.
+    """
+    own_path = f"{out_dir}/{ARRAY_MANIFEST}"
+    if os.path.isfile(own_path):
+        with open(own_path) as file:
+            return json.load(file) | {"out_dir": os.path.abspath(out_dir)}
+
+    candidates = []
+    parent_dir = os.path.dirname(os.path.abspath(out_dir))
+    for path in glob(f"{parent_dir}/*/{ARRAY_MANIFEST}"):
+        with open(path) as file:
+            manifest = json.load(file)
+        if manifest.get("py_file_path") == py_file_path:
+            sort_key = (manifest["job_name"] == job_name, os.path.getmtime(path))
+            candidates += [(sort_key, manifest | {"out_dir": os.path.dirname(path)})]
+    return max(candidates, key=lambda cand: cand[0])[1] if candidates else None
+
+
+class ArrayTask:
+    """Status record of one job array task, written to
+    out_dir/array-tasks/task-<id>.json so array_status() can tell which tasks finished,
+    failed or never ran. Does nothing outside of slurm array tasks (i.e. if
+    SLURM_ARRAY_TASK_ID is not set) so scripts can use it unconditionally.
+
+    Usage:
+        task = ArrayTask(out_dir, out_path).start()
+        for mat_id, struct in structures.items():
+            try:
+                ...
+            except Exception as exc:
+                task.fail(mat_id, exc)
+        task.finish()  # after writing out_path
+
+    If the process exits before finish() (uncaught exception, SystemExit e.g. from
+    ShardJournal's SIGTERM handler), the task is recorded as failed. Tasks killed
+    without a chance to clean up (SIGKILL, node failure) stay 'running'.
+    """
+
+    def __init__(
+        self, out_dir: str, out_path: str, *, task_id: int | None = None
+    ) -> None:
+        """Create a status record for an array task.
+
+        Args:
+            out_dir (str): Job array output directory passed to slurm_submit().
+            out_path (str): File the task writes its results to. The task only counts
+                as done if this file exists.
+            task_id (int, optional): Defaults to SLURM_ARRAY_TASK_ID.
+        """
+        env_task_id = os.getenv("SLURM_ARRAY_TASK_ID")
+        if task_id is None and env_task_id is not None:
+            task_id = int(env_task_id)
+        self.task_id = task_id
+        self.out_path = out_path
+        self.status_path = f"{out_dir}/array-tasks/task-{task_id}.json"
+        self.failed_ids: list[str] = []
+        # exception class name -> material IDs, e.g. to tell timeouts from crashes
+        self.failure_types: dict[str, list[str]] = {}
+        self.start_time = time_mod.time()
+
+    def __repr__(self) -> str:
+        """Show task ID and number of failed materials."""
+        n_failed = len(self.failed_ids)
+        return f"{type(self).__name__}(task_id={self.task_id}, {n_failed=})"
+
+    def _write(self, status: str, **kwargs: Any) -> None:
+        """Write the task's status record."""
+        if self.task_id is None:
+            return
+        end_time = time_mod.time() if status != "running" else None
+        record = {
+            "task_id": self.task_id,
+            "status": status,
+            "out_path": self.out_path,
+            "job_id": os.getenv("SLURM_JOB_ID"),
+            "host": socket.gethostname(),
+            "start_time": self.start_time,
+            "end_time": end_time,
+            "runtime": end_time and end_time - self.start_time,
+            "failed_ids": self.failed_ids,
+            "failure_types": self.failure_types,
+        }
+        _write_json(self.status_path, record | kwargs)
+
+    def start(self) -> Self:
+        """Record the task as running."""
+        if self.task_id is not None:
+            os.makedirs(os.path.dirname(self.status_path), exist_ok=True)
+        self.start_time = time_mod.time()
+        self._write("running")
+        atexit.register(self._on_exit)
+        return self
+
+    def fail(self, mat_id: str, exc: BaseException | None = None) -> None:
+        """Record a material that failed (e.g. relaxation raised or timed out) but let
+        the task continue.
+
+        Args:
+            mat_id (str): Material ID.
+            exc (BaseException, optional): The exception, its class name is recorded
+                as failure type (e.g. RelaxTimeoutError). Defaults to None.
+        """
+        self.failed_ids.append(mat_id)
+        failure_type = type(exc).__name__ if exc is not None else "unknown"
+        self.failure_types.setdefault(failure_type, []).append(mat_id)
+
+    def finish(self) -> None:
+        """Record the task as done (or failed if out_path wasn't written)."""
+        atexit.unregister(self._on_exit)
+        if os.path.isfile(self.out_path):
+            self._write("done")
+        else:
+            self._write("failed", error=f"{self.out_path=} not written")
+
+    def _on_exit(self) -> None:
+        self._write("failed", error="exited before finish()")
+
+
+def array_status(out_dir: str) -> pd.DataFrame:
+    """Check the status of all tasks in a job array submitted with slurm_submit()
+    against the filesystem.
+
+    Args:
+        out_dir (str): Job array output directory passed to slurm_submit().
+
+    Raises:
+        FileNotFoundError: If out_dir has no array manifest.
+
+    Returns:
+        pd.DataFrame: One row per expected task ID with columns status ('done',
+            'failed', 'running' or 'missing' for tasks that never started or whose
+            output file is gone), out_path, job_id, host, start_time, end_time,
+            runtime (in seconds), failed_ids (material IDs that failed in otherwise
+            completed tasks), failure_types (failed_ids grouped by exception class)
+            and error.
+    """
+    manifest_path = f"{out_dir}/{ARRAY_MANIFEST}"
+    if not os.path.isfile(manifest_path):
+        raise FileNotFoundError(f"No job array manifest at {manifest_path=}")
+    with open(manifest_path) as file:
+        manifest = json.load(file)
+
+    cols = ["status", "out_path", "job_id", "host", "start_time", "end_time"]
+    cols += ["runtime", "failed_ids", "failure_types", "error"]
+    rows = []
+    for task_id in manifest["task_ids"]:
+        status_path = f"{out_dir}/array-tasks/task-{task_id}.json"
+        record = {"status": "missing"}
+        if os.path.isfile(status_path):
+            with open(status_path) as file:
+                record = json.load(file)
+        if record["status"] == "done" and not os.path.isfile(record["out_path"]):
+            record["status"] = "missing"
+        rows.append({col: record.get(col) for col in cols})
+
+    return pd.DataFrame(rows, index=pd.Index(manifest["task_ids"], name="task_id"))
+
+
+def shard_out_path(out_dir: str, task_id: int, ext: str = ".json.gz") -> str:
+    """Output file of a job array task, for use with ArrayTask and ShardJournal.
+
+    Keyed on the array task ID only (not the job ID) so each shard has a single output
+    file and a resubmitted task (see slurm_submit()) resumes the journal of the
+    interrupted one.
+
+    Args:
+        out_dir (str): Directory of the job array.
+        task_id (int): Slurm array task ID.
+        ext (str, optional): File extension. Defaults to ".json.gz".
+
+    Returns:
+        str: out_dir/shard-<zero-padded task ID><ext>
+    """
+    return f"{out_dir}/shard-{task_id:>03}{ext}"
+
+
+class ShardJournal:
+    """Append-only JSON Lines journal of per-material results for a slurm job array
+    shard, so relaxations survive time limits and preemption.
+
+    Records are buffered and appended to the journal file (and fsynced) every
+    flush_every records, on SIGTERM (which slurm sends before killing a job at its time
+    limit or on preemption) and when used as a context manager on exit. A restarted
+    job reads the journal and skips finished material IDs. Once the shard is done,
+    compact() writes the final shard file and deletes the journal. Use
+    shard_out_path() for out_path so resubmitted array tasks find the journal.
+
+    Usage:
+        with ShardJournal(out_path) as journal:
+            for mat_id, struct in structures.items():
+                if mat_id in journal:
+                    continue
+                journal.add(mat_id, {"model_energy": ..., "model_structure": ...})
+        df_out = journal.compact()
+
+    At its time limit, slurm sends SIGTERM to all job processes and SIGKILL only
+    KillWait seconds (default 30) later, which leaves enough time to flush.
+    """
+
+    def __init__(
+        self,
+        out_path: str,
+        *,
+        journal_path: str | None = None,
+        flush_every: int = 100,
+    ) -> None:
+        """Open (and if it exists, resume) the journal for out_path.
+
+        Args:
+            out_path (str): Path of the final shard file written by compact().
+            journal_path (str, optional): Defaults to f"{out_path}.journal.jsonl".
+            flush_every (int, optional): Write buffered records to disk every
+                flush_every records. Defaults to 100.
+
+        Raises:
+            ValueError: If flush_every < 1.
+        """
+        if flush_every < 1:
+            raise ValueError(f"{flush_every=} must be positive")
+        self.out_path = out_path
+        self.journal_path = journal_path or f"{out_path}.journal.jsonl"
+        self.flush_every = flush_every
+        self._buffer: list[str] = []
+        self._prev_handler: Any = None
+        self.done: set[str] = set()
+
+        if os.path.isfile(self.journal_path):
+            self.done = {rec[Key.mat_id] for rec in self._read_records()}
+        elif dir_name := os.path.dirname(self.journal_path):
+            os.makedirs(dir_name, exist_ok=True)
+
+    def __repr__(self) -> str:
+        """Show journal path and number of finished materials."""
+        return f"{type(self).__name__}({self.journal_path!r}, {len(self)=})"
+
+    def __len__(self) -> int:
+        """Number of finished materials."""
+        return len(self.done)
+
+    def __contains__(self, mat_id: str) -> bool:
+        """Whether a material has results in the journal (incl. unflushed ones)."""
+        return mat_id in self.done
+
+    def _read_records(self) -> list[dict[str, Any]]:
+        """Read complete records from the journal. A partial last line (from a crash
+        mid-write) is truncated so later appends start on a fresh line.
+        """
+        with open(self.journal_path, "rb+") as file:
+            data = file.read()
+            complete = data[: data.rfind(b"\n") + 1]
+            if len(complete) < len(data):
+                file.truncate(len(complete))
+        return [json.loads(line) for line in complete.splitlines() if line.strip()]
+
+    def add(self, mat_id: str, record: dict[str, Any]) -> None:
+        """Add a material's results. Objects with as_dict() (e.g. pymatgen
+        Structures) are serialized as dicts.
+
+        Args:
+            mat_id (str): Material ID.
+            record (dict[str, Any]): Results (column name to value) for this material.
+        """
+        line = json.dumps({Key.mat_id: mat_id} | record, default=as_dict_handler)
+        self._buffer.append(line + "\n")
+        self.done.add(mat_id)
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """Append buffered records to the journal and fsync it."""
+        if not self._buffer:
+            return
+        lines, self._buffer = "".join(self._buffer), []
+        with open(self.journal_path, "a") as file:
+            file.write(lines)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def to_df(self) -> pd.DataFrame:
+        """Flush and load all journal records indexed by material ID (last record wins
+        for duplicate IDs).
+        """
+        self.flush()
+        records = self._read_records() if os.path.isfile(self.journal_path) else []
+        if not records:
+            return pd.DataFrame(index=pd.Index([], name=Key.mat_id))
+        df_out = pd.DataFrame(records)
+        return df_out.drop_duplicates(Key.mat_id, keep="last").set_index(Key.mat_id)
+
+    def compact(self) -> pd.DataFrame:
+        """Write all records to out_path (in the same format as
+        df.reset_index().to_json(out_path)) and delete the journal.
+
+        Returns:
+            pd.DataFrame: The shard's results indexed by material ID.
+        """
+        df_out = self.to_df()
+        tmp_path = f"{self.out_path}.tmp"
+        compression = "gzip" if self.out_path.endswith(".gz") else None
+        df_out.reset_index().to_json(
+            tmp_path, default_handler=as_dict_handler, compression=compression
+        )
+        os.replace(tmp_path, self.out_path)
+        if os.path.isfile(self.journal_path):
+            os.remove(self.journal_path)
+        return df_out
+
+    def _handle_sigterm(self, signum: int, frame: FrameType | None) -> None:
+        self.flush()
+        if callable(self._prev_handler):
+            self._prev_handler(signum, frame)
+        raise SystemExit(128 + signum)
+
+    def __enter__(self) -> Self:
+        """Install a SIGTERM handler that flushes the journal before exiting."""
+        self._prev_handler = signal.signal(signal.SIGTERM, self._handle_sigterm)
+        return self
 
-    # after sbatch submission, exit with slurm exit code
-    raise SystemExit(result.returncode)
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        """Flush the journal and restore the previous SIGTERM handler."""
+        self.flush()
+        signal.signal(signal.SIGTERM, self._prev_handler or signal.SIG_DFL)
+        self._prev_handler = None
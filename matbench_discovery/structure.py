@@ -1,10 +1,20 @@
-"""Perturb atomic coordinates of a pymatgen structure.
+"""Perturb atomic coordinates of a pymatgen structure and store large numbers of
+structures in a compact, memory-mapped format.
 
-Used for CGCNN+P training set augmentation.
+Perturbations are used for CGCNN+P training set augmentation.
 """
 
+import functools
+import json
+import os
+from collections.abc import Iterable, Iterator
+from typing import TYPE_CHECKING, Any
+
 import numpy as np
-from pymatgen.core import Structure
+from pymatgen.core import Element, Lattice, Structure
+
+if TYPE_CHECKING:
+    from ase import Atoms
 
 __author__ = "Janosh Riebesell"
 __date__ = "2022-12-02"
@@ -37,6 +47,260 @@ def perturb_structure(struct: Structure, gamma: float = 1.5) -> Structure:
     return perturbed
 
 
+@functools.cache
+def _atomic_number(symbol: str) -> int:
+    return Element(symbol).Z
+
+
+def _struct_to_arrays(
+    struct: Structure | dict[str, Any],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get lattice matrix, fractional coordinates and atomic numbers from a Structure
+    or its as_dict() output (or a ComputedStructureEntry dict which has the structure
+    under the "structure" key). Dicts are parsed directly without instantiating a
+    pymatgen Structure.
+    """
+    if isinstance(struct, Structure):
+        if not struct.is_ordered:
+            raise ValueError(f"Disordered structures not supported, got {struct}")
+        return (
+            struct.lattice.matrix,
+            struct.frac_coords,
+            np.array([site.specie.Z for site in struct]),
+        )
+
+    if "structure" in struct:  # ComputedStructureEntry dict
+        struct = struct["structure"]
+    atomic_nums = []
+    for site in struct["sites"]:
+        if len(site["species"]) != 1 or site["species"][0].get("occu", 1) != 1:
+            raise ValueError(f"Disordered sites not supported, got {site=}")
+        atomic_nums.append(_atomic_number(site["species"][0]["element"]))
+    return (
+        np.asarray(struct["lattice"]["matrix"], dtype=float),
+        np.array([site["abc"] for site in struct["sites"]], dtype=float),
+        np.array(atomic_nums),
+    )
+
+
+class StructureStore:
+    """Compact, memory-mapped store of ordered crystal structures.
+
+    Lattices, fractional coordinates and atomic numbers of all structures are packed
+    into contiguous arrays with CSR-style site offsets (sites of structure i are rows
+    site_offsets[i]:site_offsets[i + 1] of frac_coords and atomic_numbers). Arrays are
+    saved as .npy files in a directory and opened with np.load(mmap_mode="r"), so
+    opening a store is instant, structures are only read from disk when accessed and
+    processes on the same node opening (or unpickling) the same store share one copy
+    in the OS page cache. Site properties, charges and oxidation states are not stored.
+
+    Example:
+        store = StructureStore.write("wbm-init-structs", structs, material_ids)
+        store = StructureStore("wbm-init-structs")  # e.g. in another process
+        struct = store["wbm-1-1"]  # pymatgen Structure
+        lattice, frac_coords, atomic_numbers = store.get_arrays("wbm-1-1")
+        atoms = store.get_atoms(0)  # ASE Atoms, access by ID or position
+    """
+
+    array_names = ("lattices", "frac_coords", "atomic_numbers", "site_offsets")
+
+    def __init__(self, path: str) -> None:
+        """Open a structure store previously created with StructureStore.write().
+
+        Args:
+            path (str): Directory containing the store's .npy files.
+        """
+        self.path = str(path)
+        for name in self.array_names:
+            setattr(self, name, np.load(f"{path}/{name}.npy", mmap_mode="r"))
+        with open(f"{path}/material_ids.json") as file:
+            self.material_ids: list[str] = json.load(file)
+
+    @functools.cached_property
+    def _id_to_idx(self) -> dict[str, int]:
+        return {mat_id: idx for idx, mat_id in enumerate(self.material_ids)}
+
+    @classmethod
+    def write(
+        cls,
+        path: str,
+        structures: Iterable[Structure | dict[str, Any]],
+        material_ids: Iterable[str],
+    ) -> "StructureStore":
+        """Pack structures into a new store at path (overwriting existing files).
+
+        Args:
+            path (str): Directory to save the store in. Created if missing.
+            structures (Iterable[Structure | dict]): Ordered pymatgen Structures or
+                their dict representations (plain or wrapped in a
+                ComputedStructureEntry dict).
+            material_ids (Iterable[str]): Unique ID for each structure.
+
+        Raises:
+            ValueError: On duplicate IDs, mismatched lengths or disordered structures.
+
+        Returns:
+            StructureStore: The newly written store.
+        """
+        lattices, frac_coords, atomic_nums = [], [], []
+        for struct in structures:
+            lattice, coords, nums = _struct_to_arrays(struct)
+            lattices.append(lattice)
+            frac_coords.append(coords.reshape(-1, 3))
+            atomic_nums.append(nums)
+
+        # material_ids consumed only after structures so both can be lazy iterables
+        material_ids = list(map(str, material_ids))
+        if len(set(material_ids)) != len(material_ids):
+            raise ValueError("material_ids must be unique")
+        if len(lattices) != len(material_ids):
+            raise ValueError(f"{len(lattices)=} structures but {len(material_ids)=}")
+
+        site_counts = [len(nums) for nums in atomic_nums]
+        arrays = dict(
+            lattices=np.array(lattices, dtype=float).reshape(-1, 3, 3),
+            frac_coords=np.concatenate([np.empty((0, 3)), *frac_coords]),
+            atomic_numbers=np.concatenate([[], *atomic_nums]).astype(np.uint8),
+            site_offsets=np.concatenate([[0], np.cumsum(site_counts)]).astype(np.int64),
+        )
+        os.makedirs(path, exist_ok=True)
+        for name, arr in arrays.items():
+            np.save(f"{path}/{name}.npy", arr)
+        with open(f"{path}/material_ids.json", "w") as file:
+            json.dump(material_ids, file)
+        return cls(path)
+
+    @classmethod
+    def from_data_file(
+        cls, key: str, path: str, *, column: str | None = None, **kwargs: Any
+    ) -> "StructureStore":
+        """Build a store from one of the data files in DATA_FILES, streaming records
+        with matbench_discovery.data.iter_records() so the whole file never has to be
+        hydrated into pymatgen objects.
+
+        Args:
+            key (str): Which data file to convert, e.g. 'wbm_initial_structures' or
+                'mp_computed_structure_entries'.
+            path (str): Directory to save the store in.
+            column (str, optional): Column holding the structure dicts. Defaults to
+                iter_records() default column for key.
+            **kwargs: Passed to iter_records(), e.g. version or cache_dir.
+
+        Returns:
+            StructureStore: The newly written store.
+        """
+        from matbench_discovery.data import iter_records
+
+        material_ids: list[str] = []
+
+        def structs() -> Iterator[dict[str, Any]]:
+            for batch in iter_records(key, column=column, **kwargs):
+                for mat_id, dct in batch:
+                    material_ids.append(mat_id)
+                    yield dct
+
+        # write() consumes structs() before material_ids, so IDs are complete by then
+        return cls.write(path, structs(), material_ids)
+
+    def __len__(self) -> int:
+        """Number of structures in the store."""
+        return len(self.material_ids)
+
+    def __contains__(self, mat_id: object) -> bool:
+        """Whether a material ID is in the store."""
+        return mat_id in self._id_to_idx
+
+    def __getitem__(self, key: str | int) -> Structure:
+        """Get a structure by material ID or position, see get_structure()."""
+        return self.get_structure(key)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over material IDs."""
+        return iter(self.material_ids)
+
+    def __repr__(self) -> str:
+        """Show path, number of structures and number of sites."""
+        n_sites = len(self.atomic_numbers)
+        return f"{type(self).__name__}({self.path!r}, {len(self)=:,}, {n_sites=:,})"
+
+    def __getstate__(self) -> dict[str, str]:
+        """Only pickle the path, unpickling re-maps the same files."""
+        return {"path": self.path}
+
+    def __setstate__(self, state: dict[str, str]) -> None:
+        """Re-open the memory-mapped files after unpickling."""
+        self.__init__(state["path"])  # type: ignore[misc]
+
+    def index(self, key: str | int) -> int:
+        """Get the position of a structure in the store from its material ID (or
+        position, allowing negative indices).
+        """
+        if isinstance(key, str):
+            if key not in self._id_to_idx:
+                raise KeyError(f"{key=} not in {self}")
+            return self._id_to_idx[key]
+        if not -len(self) <= key < len(self):
+            raise IndexError(f"{key=} out of range for {self}")
+        return int(key) % len(self)
+
+    def get_arrays(self, key: str | int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get a structure as read-only array views into the memory-mapped store.
+
+        Args:
+            key (str | int): Material ID or position in the store.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: 3x3 lattice matrix (rows are
+                lattice vectors), n_sites x 3 fractional coordinates and n_sites
+                atomic numbers.
+        """
+        idx = self.index(key)
+        start, end = self.site_offsets[idx : idx + 2]
+        return (
+            self.lattices[idx],
+            self.frac_coords[start:end],
+            self.atomic_numbers[start:end],
+        )
+
+    def get_structure(self, key: str | int) -> Structure:
+        """Get a structure from the store as a pymatgen Structure.
+
+        Args:
+            key (str | int): Material ID or position in the store.
+
+        Returns:
+            Structure: pymatgen Structure with material ID in its properties.
+        """
+        lattice, frac_coords, atomic_nums = self.get_arrays(key)
+        return Structure(
+            Lattice(np.array(lattice)),
+            atomic_nums.tolist(),
+            np.array(frac_coords),
+            properties={"material_id": self.material_ids[self.index(key)]},
+        )
+
+    def get_atoms(self, key: str | int) -> "Atoms":
+        """Get a structure from the store as ASE Atoms (with periodic boundary
+        conditions).
+
+        Args:
+            key (str | int): Material ID or position in the store.
+
+        Returns:
+            Atoms: ASE Atoms with material ID in atoms.info.
+        """
+        from ase import Atoms
+
+        lattice, frac_coords, atomic_nums = self.get_arrays(key)
+        return Atoms(
+            numbers=np.array(atomic_nums),
+            cell=np.array(lattice),
+            scaled_positions=np.array(frac_coords),
+            pbc=True,
+            info={"material_id": self.material_ids[self.index(key)]},
+        )
+
+
 if __name__ == "__main__":
     import matplotlib.pyplot as plt
 
@@ -2,7 +2,6 @@
 import contextlib
 import os
 from importlib.metadata import version
-from typing import Any
 
 import numpy as np
 import pandas as pd
@@ -13,9 +12,16 @@ from pymatgen.core import Structure
 from tqdm import tqdm
 
 from matbench_discovery import Model, timestamp, today
-from matbench_discovery.data import DATA_FILES, as_dict_handler
+from matbench_discovery.data import DATA_FILES, df_wbm
 from matbench_discovery.enums import Key, Task
-from matbench_discovery.slurm import slurm_submit
+from matbench_discovery.relax import time_limit
+from matbench_discovery.shard import estimate_costs, get_shard_manifest, shard_ids
+from matbench_discovery.slurm import (
+    ArrayTask,
+    ShardJournal,
+    shard_out_path,
+    slurm_submit,
+)
 
 __author__ = "Janosh Riebesell"
 __date__ = "2022-08-15"
@@ -61,8 +67,7 @@ slurm_vars = slurm_submit(
 
 # %%
 slurm_array_task_id = int(os.getenv("SLURM_ARRAY_TASK_ID", "0"))
-slurm_array_job_id = os.getenv("SLURM_ARRAY_JOB_ID", "debug")
-out_path = f"{out_dir}/{slurm_array_job_id}-{slurm_array_task_id:>03}.json.gz"
+out_path = shard_out_path(out_dir, slurm_array_task_id)
 
 if os.path.isfile(out_path):
     raise SystemExit(f"{out_path=} already exists, exciting early")
@@ -73,7 +78,13 @@ print(f"{out_path=}")
 
 df_in = pd.read_json(data_path).set_index(Key.mat_id)
 if slurm_array_task_count > 1:
-    df_in = np.array_split(df_in, slurm_array_task_count)[slurm_array_task_id - 1]
+    # shards with balanced estimated cost rather than equal numbers of structures
+    df_manifest = get_shard_manifest(
+        f"{out_dir}/shard-manifest.csv",
+        estimate_costs(df_wbm[Key.n_sites], df_wbm[Key.volume]),
+        slurm_array_task_count,
+    )
+    df_in = df_in.loc[shard_ids(df_manifest, slurm_array_task_id - 1)]
 
 
 # %%
@@ -84,6 +95,7 @@ bayes_optim_kwargs = dict(
     seed=42,
 )
 optimize_kwargs = dict(n_init=100, n_iter=100, alpha=0.026**2)
+relax_timeout = 600  # wall-clock budget per structure in seconds
 model = MEGNet()
 
 
@@ -95,6 +107,7 @@ run_params = {
     "energy_model": energy_model,
     "versions": {dep: version(dep) for dep in ("maml", "numpy", energy_model)},
     "optimize_kwargs": optimize_kwargs,
+    "relax_timeout": relax_timeout,
     "task_type": task_type,
     "slurm_vars": slurm_vars,
     Key.model_params: sum(np.prod(p.shape) for p in model.model.trainable_weights),
@@ -104,7 +117,8 @@ wandb.init(project="matbench-discovery", name=job_name, config=run_params)
 
 
 # %%
-relax_results: dict[str, dict[str, Any]] = {}
+task = ArrayTask(out_dir, out_path).start()
+journal = ShardJournal(out_path)
 input_col = {Task.IS2RE: Key.init_struct, Task.RS2RE: Key.final_struct}[task_type]
 
 if task_type == Task.RS2RE:
@@ -112,36 +126,41 @@ if task_type == Task.RS2RE:
 
 structures = df_in[input_col].map(Structure.from_dict).to_dict()
 
-for material_id in tqdm(structures, desc="Relaxing", disable=None):
-    structure = structures[material_id]
-    if material_id in relax_results:
-        continue
-    try:
-        optimizer = BayesianOptimizer(
-            model=model, structure=structure, **bayes_optim_kwargs
-        )
-        optimizer.set_bounds()
-        # reason for /dev/null: https://github.com/materialsvirtuallab/maml/issues/469
-        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
-            optimizer.optimize(**optimize_kwargs)
-
-        struct_bowsr, energy_bowsr = optimizer.get_optimized_structure_and_energy()
-        results = {
-            f"e_form_per_atom_bowsr_{energy_model}": model.predict_energy(struct_bowsr),
-            "structure_bowsr": struct_bowsr,
-            f"energy_bowsr_{energy_model}": energy_bowsr,
-        }
-
-        relax_results[material_id] = results
-
-    except Exception as exc:
-        print(f"{material_id=} raised {exc=}")
-
-
-# %%
-df_out = pd.DataFrame(relax_results).T
-df_out.index.name = Key.mat_id
-
-df_out.reset_index().to_json(out_path, default_handler=as_dict_handler)
+with journal:
+    for material_id in tqdm(structures, desc="Relaxing", disable=None):
+        structure = structures[material_id]
+        if material_id in journal:
+            continue
+        try:
+            optimizer = BayesianOptimizer(
+                model=model, structure=structure, **bayes_optim_kwargs
+            )
+            optimizer.set_bounds()
+            # reason for /dev/null: https://github.com/materialsvirtuallab/maml/issues/469
+            with (
+                open(os.devnull, "w") as devnull,
+                contextlib.redirect_stdout(devnull),
+                time_limit(relax_timeout),  # raises RelaxTimeoutError
+            ):
+                optimizer.optimize(**optimize_kwargs)
+
+            struct_bowsr, energy_bowsr = optimizer.get_optimized_structure_and_energy()
+            e_form_bowsr = model.predict_energy(struct_bowsr)
+            results = {
+                f"e_form_per_atom_bowsr_{energy_model}": e_form_bowsr,
+                "structure_bowsr": struct_bowsr,
+                f"energy_bowsr_{energy_model}": energy_bowsr,
+            }
+
+            journal.add(material_id, results)
+
+        except Exception as exc:
+            print(f"{material_id=} raised {exc=}")
+            task.fail(material_id, exc)
+
+
+# %% merge journal into the final shard file
+df_out = journal.compact()
+task.finish()
 
 wandb.log_artifact(out_path, type=job_name)
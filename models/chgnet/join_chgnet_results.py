@@ -8,11 +8,11 @@ from glob import glob
 
 import pandas as pd
 from pymatviz import density_scatter
-from tqdm import tqdm
 
-from matbench_discovery.data import as_dict_handler
-from matbench_discovery.energy import get_e_form_per_atom
+from matbench_discovery.data import as_dict_handler, glob_to_df
+from matbench_discovery.energy import get_e_form_per_atom_batch
 from matbench_discovery.enums import Key, Task
+from matbench_discovery.join import read_json_shard
 from matbench_discovery.preds import df_preds
 
 __author__ = "Janosh Riebesell"
@@ -31,38 +31,24 @@ glob_pattern = f"{date}-chgnet-*-wbm-{task_type}*/*.json.gz"
 file_paths = sorted(glob(f"{module_dir}/{glob_pattern}"))
 print(f"Found {len(file_paths):,} files for {glob_pattern = }")
 
-dfs: dict[str, pd.DataFrame] = {}
 
-
-# %%
-failed = {}
-for file_path in tqdm(file_paths):
-    if file_path in dfs:
-        continue
-    try:
-        df_i = pd.read_json(file_path).set_index(Key.mat_id)
-    except Exception as exc:
-        failed[file_path] = str(exc)
-        continue
-    # drop trajectory to save memory
-    dfs[file_path] = df_i.drop(columns="chgnet_trajectory", errors="ignore")
-
-
-print(f"{pd.Series(failed).value_counts()=}")
-
-df_chgnet = pd.concat(dfs.values()).round(4)
+# %% re-running this cell only reads shards that are new or changed since last run
+df_chgnet = glob_to_df(
+    f"{module_dir}/{glob_pattern}",
+    reader=read_json_shard,
+    workers=-1,
+    drop_cols=["chgnet_trajectory"],  # save memory
+    cache_path=f"{module_dir}/{date}-chgnet-wbm-{task_type}-shards.pkl",
+).round(4)
 
 
 # %% compute corrected formation energies
 e_pred_col = "chgnet_energy_no_relax"
 e_form_chgnet_col = f"e_form_per_atom_{e_pred_col.split('_energy')[0]}"
 df_chgnet[Key.formula] = df_preds[Key.formula]
-df_chgnet[e_form_chgnet_col] = [
-    get_e_form_per_atom(dict(energy=ene, composition=formula))
-    for formula, ene in tqdm(
-        df_chgnet.set_index(Key.formula)[e_pred_col].items(), total=len(df_chgnet)
-    )
-]
+df_chgnet[e_form_chgnet_col] = get_e_form_per_atom_batch(
+    df_chgnet[e_pred_col], df_chgnet[Key.formula].tolist()
+)
 df_preds[e_form_chgnet_col] = df_chgnet[e_form_chgnet_col]
 
 
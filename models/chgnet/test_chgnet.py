@@ -8,10 +8,8 @@ pip install -e ./chgnet.
 # %%
 import os
 from importlib.metadata import version
-from typing import Any, Literal
+from typing import Literal
 
-import numpy as np
-import pandas as pd
 import torch
 import wandb
 from chgnet.model import StructOptimizer
@@ -19,10 +17,18 @@ from pymatgen.core import Structure
 from tqdm import tqdm
 
 from matbench_discovery import timestamp, today
-from matbench_discovery.data import DATA_FILES, as_dict_handler, df_wbm
+from matbench_discovery.cache import ResultCache, result_key
+from matbench_discovery.data import DATA_FILES, df_wbm, iter_records
 from matbench_discovery.enums import Key, Task
 from matbench_discovery.plots import wandb_scatter
-from matbench_discovery.slurm import slurm_submit
+from matbench_discovery.relax import time_limit
+from matbench_discovery.shard import estimate_costs, get_shard_manifest, shard_ids
+from matbench_discovery.slurm import (
+    ArrayTask,
+    ShardJournal,
+    shard_out_path,
+    slurm_submit,
+)
 
 __author__ = "Janosh Riebesell"
 __date__ = "2023-03-01"
@@ -49,86 +55,125 @@ slurm_vars = slurm_submit(
 
 # %%
 slurm_array_task_id = int(os.getenv("SLURM_ARRAY_TASK_ID", "0"))
-slurm_array_job_id = os.getenv("SLURM_ARRAY_JOB_ID", "debug")
-out_path = f"{out_dir}/{slurm_array_job_id}-{slurm_array_task_id:>03}.json.gz"
+out_path = shard_out_path(out_dir, slurm_array_task_id)
 
 if os.path.isfile(out_path):
     raise SystemExit(f"{out_path=} already exists, exciting early")
 
 
 # %%
-data_path = {
-    Task.RS2RE: DATA_FILES.wbm_computed_structure_entries,
-    Task.IS2RE: DATA_FILES.wbm_initial_structures,
+data_key = {
+    Task.RS2RE: "wbm_computed_structure_entries",
+    Task.IS2RE: "wbm_initial_structures",
 }[task_type]
+data_path = DATA_FILES[data_key]
 print(f"\nJob started running {timestamp}")
 print(f"{data_path=}")
 e_pred_col = "chgnet_energy"
 ase_filter: Literal["FrechetCellFilter", "ExpCellFilter"] = "FrechetCellFilter"
 max_steps = 500
 fmax = 0.05
-
-df_in = pd.read_json(data_path).set_index(Key.mat_id)
-if slurm_array_task_count > 1:
-    df_in = np.array_split(df_in, slurm_array_task_count)[slurm_array_task_id - 1]
+relax_timeout = 600  # wall-clock budget per structure in seconds
+if max_steps == 0:
+    out_path = out_path.replace(".json.gz", ".csv.gz")
+    if os.path.isfile(out_path):
+        raise SystemExit(f"{out_path=} already exists, exciting early")
+
+# shards have balanced estimated relaxation cost rather than equal numbers of structures
+# so array tasks finish at about the same time. the first task to start writes the
+# manifest, the others read it
+shard = ((slurm_array_task_id - 1) % slurm_array_task_count, slurm_array_task_count)
+df_manifest = get_shard_manifest(
+    f"{out_dir}/shard-manifest.csv",
+    estimate_costs(df_wbm[Key.n_sites], df_wbm[Key.volume]),
+    slurm_array_task_count,
+)
+# stream only this task's shard of the data file instead of parsing the whole file
+input_col = {Task.IS2RE: Key.init_struct, Task.RS2RE: Key.cse}[task_type]
+shard_mat_ids = shard_ids(df_manifest, shard[0])
+records = {
+    mat_id: record["structure"] if task_type == Task.RS2RE else record
+    for batch in iter_records(data_key, ids=shard_mat_ids, column=input_col)
+    for mat_id, record in batch
+}
 
 run_params = {
     "data_path": data_path,
     "versions": {dep: version(dep) for dep in ("chgnet", "numpy", "torch")},
     Key.task_type: task_type,
-    "df": {"shape": str(df_in.shape), "columns": ", ".join(df_in)},
+    "n_structures": len(records),
+    "shard": shard,
     "slurm_vars": slurm_vars,
     "max_steps": max_steps,
+    "relax_timeout": relax_timeout,
     "fmax": fmax,
     "device": device,
     Key.model_params: chgnet.n_params,
 }
+# everything that changes relaxation results goes into the result cache key
+model_info = {
+    "name": "chgnet",
+    "version": version("chgnet"),
+    "checkpoint": chgnet.version,
+}
+relax_params = {
+    "task_type": task_type,
+    "filter": ase_filter,
+    "fmax": fmax,
+    "max_steps": max_steps,
+}
+# reuse results of earlier runs with the same model, params and input structure
+cache = ResultCache()
+run_params["result_cache"] = cache.cache_dir
 
 run_name = f"{job_name}-{slurm_array_task_id}"
 wandb.init(project="matbench-discovery", name=run_name, config=run_params)
 
 
 # %%
-relax_results: dict[str, dict[str, Any]] = {}
-input_col = {Task.IS2RE: Key.init_struct, Task.RS2RE: Key.final_struct}[task_type]
-
-if task_type == Task.RS2RE:
-    df_in[input_col] = [cse["structure"] for cse in df_in[Key.cse]]
-
-structures = df_in[input_col].map(Structure.from_dict).to_dict()
-
-for material_id in tqdm(structures, desc="Relaxing"):
-    if material_id in relax_results:
-        continue
-    try:
-        relax_result = chgnet.relax(
-            structures[material_id],
-            verbose=False,
-            steps=max_steps,
-            fmax=fmax,
-            relax_cell=max_steps > 0,
-            ase_filter=ase_filter,
-        )
-        relax_results[material_id] = {
-            e_pred_col: relax_result["trajectory"].energies[-1]
-        }
-        if max_steps > 0:
-            relax_struct = relax_result["final_structure"]
-            relax_results[material_id]["chgnet_structure"] = relax_struct
-            # traj = relax_result["trajectory"]
-            # relax_results[material_id]["chgnet_trajectory"] = traj.__dict__
-    except Exception as exc:
-        print(f"Failed to relax {material_id}: {exc!r}")
+task = ArrayTask(out_dir, out_path).start()
+journal = ShardJournal(out_path)
+structures = {mat_id: Structure.from_dict(dct) for mat_id, dct in records.items()}
+
+with journal:
+    for material_id in tqdm(structures, desc="Relaxing"):
+        if material_id in journal:
+            continue
+        cache_key = result_key(structures[material_id], model_info, relax_params)
+        if (cached := cache.get(cache_key)) is not None:
+            journal.add(material_id, cached)
+            continue
+        try:
+            with time_limit(relax_timeout):  # raises RelaxTimeoutError
+                relax_result = chgnet.relax(
+                    structures[material_id],
+                    verbose=False,
+                    steps=max_steps,
+                    fmax=fmax,
+                    relax_cell=max_steps > 0,
+                    ase_filter=ase_filter,
+                )
+            result = {e_pred_col: relax_result["trajectory"].energies[-1]}
+            if max_steps > 0:
+                result["chgnet_structure"] = relax_result["final_structure"]
+                # traj = relax_result["trajectory"]
+                # result["chgnet_trajectory"] = traj.__dict__
+            journal.add(material_id, result)
+            cache.put(cache_key, result)
+        except Exception as exc:
+            print(f"Failed to relax {material_id}: {exc!r}")
+            task.fail(material_id, exc)
 
 
 # %%
-df_out = pd.DataFrame(relax_results).T
-df_out.index.name = Key.mat_id
-
 if max_steps == 0:
-    df_out.add_suffix("_no_relax").to_csv(out_path.replace(".json.gz", ".csv.gz"))
+    df_out = journal.to_df()
+    df_out.add_suffix("_no_relax").to_csv(out_path)
+    os.remove(journal.journal_path)
 else:
-    df_out.reset_index().to_json(out_path, default_handler=as_dict_handler)
+    df_out = journal.compact()
+task.finish()
+print(f"{cache!r}")
 
 
 # %%
@@ -8,19 +8,26 @@ https://github.com/materialsvirtuallab/m3gnet.
 import os
 import warnings
 from importlib.metadata import version
-from typing import Any, Literal
+from typing import Literal
 
 import numpy as np
-import pandas as pd
 import wandb
 from m3gnet.models import Relaxer
 from pymatgen.core import Structure
 from tqdm import tqdm
 
 from matbench_discovery import ROOT, timestamp, today
-from matbench_discovery.data import DATA_FILES, as_dict_handler
+from matbench_discovery.cache import ResultCache, checkpoint_hash, result_key
+from matbench_discovery.data import DATA_FILES, df_wbm, iter_records
 from matbench_discovery.enums import Key, Task
-from matbench_discovery.slurm import slurm_submit
+from matbench_discovery.relax import time_limit
+from matbench_discovery.shard import estimate_costs, get_shard_manifest, shard_ids
+from matbench_discovery.slurm import (
+    ArrayTask,
+    ShardJournal,
+    shard_out_path,
+    slurm_submit,
+)
 
 __author__ = "Janosh Riebesell"
 __date__ = "2022-08-15"
@@ -32,6 +39,7 @@ model_type: Literal["orig", "direct", "manual-sampling"] = "orig"
 # set large job array size for smaller data splits and faster testing/debugging
 slurm_array_task_count = 50
 record_traj = False
+relax_timeout = 600  # wall-clock budget per structure in seconds
 job_name = f"m3gnet-{model_type}-wbm-{task_type}"
 out_dir = os.getenv("SBATCH_OUTPUT", f"{module_dir}/{today}-{job_name}")
 
@@ -50,8 +58,7 @@ slurm_vars = slurm_submit(
 
 # %%
 slurm_array_task_id = int(os.getenv("SLURM_ARRAY_TASK_ID", "3"))
-slurm_array_job_id = os.getenv("SLURM_ARRAY_JOB_ID", "debug")
-out_path = f"{out_dir}/{slurm_array_job_id}-{slurm_array_task_id:>03}.json.gz"
+out_path = shard_out_path(out_dir, slurm_array_task_id)
 
 if os.path.isfile(out_path):
     raise SystemExit(f"{out_path=} already exists, exciting early")
@@ -60,31 +67,48 @@ warnings.filterwarnings(action="ignore", category=UserWarning, module="tensorflo
 
 
 # %%
-data_path = {
-    Task.IS2RE: DATA_FILES.wbm_initial_structures,
-    Task.RS2RE: DATA_FILES.wbm_computed_structure_entries,
+data_key = {
+    Task.IS2RE: "wbm_initial_structures",
+    Task.RS2RE: "wbm_computed_structure_entries",
 }[task_type]
+data_path = DATA_FILES[data_key]
 print(f"\nJob started running {timestamp}")
 print(f"{data_path=}")
 e_pred_col = f"m3gnet_{model_type}_energy"
 
-df_in = pd.read_json(data_path).set_index(Key.mat_id)
-if slurm_array_task_count > 1:
-    df_in = np.array_split(df_in, slurm_array_task_count)[slurm_array_task_id - 1]
+# shards have balanced estimated relaxation cost rather than equal numbers of structures
+# so array tasks finish at about the same time. the first task to start writes the
+# manifest, the others read it
+shard = ((slurm_array_task_id - 1) % slurm_array_task_count, slurm_array_task_count)
+df_manifest = get_shard_manifest(
+    f"{out_dir}/shard-manifest.csv",
+    estimate_costs(df_wbm[Key.n_sites], df_wbm[Key.volume]),
+    slurm_array_task_count,
+)
+# stream only this task's shard of the data file instead of parsing the whole file
+input_col = {Task.IS2RE: Key.init_struct, Task.RS2RE: Key.cse}[task_type]
+shard_mat_ids = shard_ids(df_manifest, shard[0])
+records = {
+    mat_id: record["structure"] if task_type == Task.RS2RE else record
+    for batch in iter_records(data_key, ids=shard_mat_ids, column=input_col)
+    for mat_id, record in batch
+}
 
 checkpoint = None
 if model_type == "direct":
     checkpoint = f"{ROOT}/models/m3gnet/2023-05-26-DI-DFTstrictF10-TTRS-128U-442E"
 if model_type == "ms":
     checkpoint = f"{ROOT}/models/m3gnet/2023-05-26-MS-DFTstrictF10-128U-154E"
-relax_results: dict[str, dict[str, Any]] = {}
+task = ArrayTask(out_dir, out_path).start()
+journal = ShardJournal(out_path)
 m3gnet = Relaxer(potential=checkpoint)  # load pre-trained M3GNet model
 
 run_params = {
     "data_path": data_path,
     "versions": {dep: version(dep) for dep in ("m3gnet", "numpy")},
     Key.task_type: task_type,
-    "df": {"shape": str(df_in.shape), "columns": ", ".join(df_in)},
+    "n_structures": len(records),
+    "shard": shard,
     "slurm_vars": slurm_vars,
     Key.model_params: sum(
         np.prod(weight.shape) for weight in m3gnet.potential.model.trainable_weights
@@ -94,41 +118,54 @@ run_params = {
     "out_path": out_path,
     "job_name": job_name,
     "record_traj": record_traj,
+    "relax_timeout": relax_timeout,
+}
+# everything that changes relaxation results goes into the result cache key
+model_info = {
+    "name": f"m3gnet-{model_type}",
+    "version": version("m3gnet"),
+    "checkpoint": checkpoint_hash(checkpoint),
 }
+relax_params = {"task_type": task_type, "record_traj": record_traj}
+# reuse results of earlier runs with the same model, params and input structure
+cache = ResultCache()
+run_params["result_cache"] = cache.cache_dir
 
 run_name = f"{job_name}-{slurm_array_task_id}"
 wandb.init(project="matbench-discovery", name=run_name, config=run_params)
 
 
 # %%
-input_col = {Task.IS2RE: Key.init_struct, Task.RS2RE: Key.final_struct}[task_type]
-
-if task_type == Task.RS2RE:
-    df_in[input_col] = [cse["structure"] for cse in df_in[Key.cse]]
-
-structures = df_in[input_col].map(Structure.from_dict).to_dict()
-
-for material_id in tqdm(structures, desc="Relaxing"):
-    if material_id in relax_results:
-        continue
-    try:
-        result = m3gnet.relax(structures[material_id])
-        relax_results[material_id] = {
-            f"m3gnet_{model_type}_structure": result["final_structure"],
-            e_pred_col: result["trajectory"].energies[-1],
-        }
-        if record_traj:
-            relax_results[f"m3gnet_{model_type}_trajectory"] = result[
-                "trajectory"
-            ].__dict__
-    except Exception as exc:
-        print(f"Failed to relax {material_id}: {exc!r}")
-
-
-# %%
-df_out = pd.DataFrame(relax_results).T
-df_out.index.name = Key.mat_id
-
-df_out.reset_index().to_json(out_path, default_handler=as_dict_handler)
+structures = {mat_id: Structure.from_dict(dct) for mat_id, dct in records.items()}
+
+with journal:
+    for material_id in tqdm(structures, desc="Relaxing"):
+        if material_id in journal:
+            continue
+        cache_key = result_key(structures[material_id], model_info, relax_params)
+        if (cached := cache.get(cache_key)) is not None:
+            journal.add(material_id, cached)
+            continue
+        try:
+            with time_limit(relax_timeout):  # raises RelaxTimeoutError
+                result = m3gnet.relax(structures[material_id])
+            record = {
+                f"m3gnet_{model_type}_structure": result["final_structure"],
+                e_pred_col: result["trajectory"].energies[-1],
+            }
+            if record_traj:
+                traj_dict = result["trajectory"].__dict__
+                record[f"m3gnet_{model_type}_trajectory"] = traj_dict
+            journal.add(material_id, record)
+            cache.put(cache_key, record)
+        except Exception as exc:
+            print(f"Failed to relax {material_id}: {exc!r}")
+            task.fail(material_id, exc)
+
+
+# %% merge journal into the final shard file
+df_out = journal.compact()
+task.finish()
+print(f"{cache!r}")
 
 wandb.log_artifact(out_path, type=f"m3gnet-wbm-{task_type}")
@@ -1,10 +1,8 @@
 # %%
 import os
 from importlib.metadata import version
-from typing import Any, Literal
+from typing import Literal
 
-import numpy as np
-import pandas as pd
 import torch
 import wandb
 from ase.filters import ExpCellFilter, FrechetCellFilter
@@ -17,10 +15,18 @@ from pymatgen.io.ase import AseAtomsAdaptor
 from tqdm import tqdm
 
 from matbench_discovery import ROOT, timestamp, today
-from matbench_discovery.data import DATA_FILES, as_dict_handler, df_wbm
+from matbench_discovery.cache import ResultCache, checkpoint_hash, result_key
+from matbench_discovery.data import DATA_FILES, df_wbm, iter_records
 from matbench_discovery.enums import Key, Task
 from matbench_discovery.plots import wandb_scatter
-from matbench_discovery.slurm import slurm_submit
+from matbench_discovery.relax import run_ase_optimizer
+from matbench_discovery.shard import estimate_costs, get_shard_manifest, shard_ids
+from matbench_discovery.slurm import (
+    ArrayTask,
+    ShardJournal,
+    shard_out_path,
+    slurm_submit,
+)
 
 __author__ = "Janosh Riebesell"
 __date__ = "2023-03-01"
@@ -53,30 +59,45 @@ slurm_vars = slurm_submit(
 
 # %%
 slurm_array_task_id = int(os.getenv("SLURM_ARRAY_TASK_ID", "0"))
-slurm_array_job_id = os.getenv("SLURM_ARRAY_JOB_ID", "debug")
-out_path = f"{out_dir}/{slurm_array_job_id}-{slurm_array_task_id:>03}.json.gz"
+out_path = shard_out_path(out_dir, slurm_array_task_id)
 
 if os.path.isfile(out_path):
     raise SystemExit(f"{out_path=} already exists, exciting early")
 
 
 # %%
-data_path = {
-    Task.RS2RE: DATA_FILES.wbm_computed_structure_entries,
-    Task.IS2RE: DATA_FILES.wbm_initial_structures,
+data_key = {
+    Task.RS2RE: "wbm_computed_structure_entries",
+    Task.IS2RE: "wbm_initial_structures",
 }[task_type]
+data_path = DATA_FILES[data_key]
 print(f"\nJob started running {timestamp}")
 print(f"{data_path=}")
 e_pred_col = "mace_energy"
 max_steps = 500
 force_max = 0.05  # Run until the forces are smaller than this in eV/A
+relax_timeout = 600  # wall-clock budget per structure in seconds
 checkpoint = f"{ROOT}/models/mace/checkpoints/{model_name}.model"
 dtype = "float64"
 mace_calc = mace_mp(model=model_name, device=device, default_dtype=dtype)
 
-df_in = pd.read_json(data_path).set_index(Key.mat_id)
-if slurm_array_task_count > 1:
-    df_in = np.array_split(df_in, slurm_array_task_count)[slurm_array_task_id - 1]
+# shards have balanced estimated relaxation cost rather than equal numbers of structures
+# so array tasks finish at about the same time. the first task to start writes the
+# manifest, the others read it
+shard = ((slurm_array_task_id - 1) % slurm_array_task_count, slurm_array_task_count)
+df_manifest = get_shard_manifest(
+    f"{out_dir}/shard-manifest.csv",
+    estimate_costs(df_wbm[Key.n_sites], df_wbm[Key.volume]),
+    slurm_array_task_count,
+)
+# stream only this task's shard of the data file instead of parsing the whole file
+input_col = {Task.IS2RE: Key.init_struct, Task.RS2RE: Key.cse}[task_type]
+shard_mat_ids = shard_ids(df_manifest, shard[0])
+records = {
+    mat_id: record["structure"] if task_type == Task.RS2RE else record
+    for batch in iter_records(data_key, ids=shard_mat_ids, column=input_col)
+    for mat_id, record in batch
+}
 
 
 # %%
@@ -85,9 +106,11 @@ run_params = {
     "versions": {dep: version(dep) for dep in ("mace", "numpy", "torch")},
     "checkpoint": checkpoint,
     Key.task_type: task_type,
-    "df": {"shape": str(df_in.shape), "columns": ", ".join(df_in)},
+    "n_structures": len(records),
+    "shard": shard,
     "slurm_vars": slurm_vars,
     "max_steps": max_steps,
+    "relax_timeout": relax_timeout,
     "record_traj": record_traj,
     "force_max": force_max,
     "ase_optimizer": ase_optimizer,
@@ -97,66 +120,92 @@ run_params = {
     "dtype": dtype,
     "ase_filter": ase_filter,
 }
+# everything that changes relaxation results goes into the result cache key
+model_info = {
+    "name": model_name,
+    "version": version("mace-torch"),
+    "checkpoint": checkpoint_hash(checkpoint),
+}
+relax_params = {
+    "task_type": task_type,
+    "optimizer": ase_optimizer,
+    "filter": ase_filter,
+    "fmax": force_max,
+    "max_steps": max_steps,
+    "dtype": dtype,
+    "record_traj": record_traj,
+}
+# reuse results of earlier runs with the same model, params and input structure
+cache = ResultCache()
+run_params["result_cache"] = cache.cache_dir
 
 run_name = f"{job_name}-{slurm_array_task_id}"
 wandb.init(project="matbench-discovery", name=run_name, config=run_params)
 
 
 # %%
-relax_results: dict[str, dict[str, Any]] = {}
-input_col = {Task.IS2RE: Key.init_struct, Task.RS2RE: Key.final_struct}[task_type]
-
-if task_type == Task.RS2RE:
-    df_in[input_col] = [cse["structure"] for cse in df_in[Key.cse]]
-
-structs = df_in[input_col].map(Structure.from_dict).to_dict()
+task = ArrayTask(out_dir, out_path).start()
+journal = ShardJournal(out_path)
+structs = {mat_id: Structure.from_dict(dct) for mat_id, dct in records.items()}
 filter_cls = {"frechet": FrechetCellFilter, "exp": ExpCellFilter}[ase_filter]
 
-for material_id in tqdm(structs, desc="Relaxing"):
-    if material_id in relax_results:
-        continue
-    try:
-        mace_traj = None
-        atoms = structs[material_id].to_ase_atoms()
-        atoms.calc = mace_calc
-        if max_steps > 0:
-            atoms = filter_cls(atoms)
-            optim_cls = {"FIRE": FIRE, "LBFGS": LBFGS}[ase_optimizer]
-            optimizer = optim_cls(atoms, logfile="/dev/null")
-
-            if record_traj:
-                coords, lattices = [], []
-                # attach observer functions to the optimizer
-                optimizer.attach(lambda: coords.append(atoms.get_positions()))  # noqa: B023
-                optimizer.attach(lambda: lattices.append(atoms.get_cell()))  # noqa: B023
-
-            optimizer.run(fmax=force_max, steps=max_steps)
-        mace_energy = atoms.get_potential_energy()  # relaxed energy
-        mace_struct = AseAtomsAdaptor.get_structure(
-            getattr(atoms, "atoms", atoms)  # atoms might be wrapped in ase filter
-        )
-
-        relax_results[material_id] = {"structure": mace_struct, "energy": mace_energy}
-
-        coords, lattices = (locals().get(key, []) for key in ("coords", "lattices"))
-        if record_traj and coords and lattices:
-            mace_traj = Trajectory(
-                species=structs[material_id].species,
-                coords=coords,
-                lattice=lattices,
-                constant_lattice=False,
+with journal:
+    for material_id in tqdm(structs, desc="Relaxing"):
+        if material_id in journal:
+            continue
+        cache_key = result_key(structs[material_id], model_info, relax_params)
+        if (cached := cache.get(cache_key)) is not None:
+            journal.add(material_id, cached)
+            continue
+        try:
+            mace_traj = None
+            atoms = structs[material_id].to_ase_atoms()
+            atoms.calc = mace_calc
+            if max_steps > 0:
+                atoms = filter_cls(atoms)
+                optim_cls = {"FIRE": FIRE, "LBFGS": LBFGS}[ase_optimizer]
+                optimizer = optim_cls(atoms, logfile="/dev/null")
+
+                if record_traj:
+                    coords, lattices = [], []
+                    # attach observer functions to the optimizer
+                    optimizer.attach(lambda: coords.append(atoms.get_positions()))  # noqa: B023
+                    optimizer.attach(lambda: lattices.append(atoms.get_cell()))  # noqa: B023
+
+                # stops between steps once over budget, raises RelaxTimeoutError
+                run_ase_optimizer(
+                    optimizer,
+                    fmax=force_max,
+                    max_steps=max_steps,
+                    timeout=relax_timeout,
+                )
+            mace_energy = atoms.get_potential_energy()  # relaxed energy
+            mace_struct = AseAtomsAdaptor.get_structure(
+                getattr(atoms, "atoms", atoms)  # atoms might be wrapped in ase filter
             )
-            relax_results[material_id]["trajectory"] = mace_traj
-    except Exception as exc:
-        print(f"Failed to relax {material_id}: {exc!r}")
-        continue
-
-
-# %%
-df_out = pd.DataFrame(relax_results).T.add_prefix("mace_")
-df_out.index.name = Key.mat_id
-
-df_out.reset_index().to_json(out_path, default_handler=as_dict_handler)
+            result = {"mace_structure": mace_struct, e_pred_col: mace_energy}
+
+            coords, lattices = (locals().get(key, []) for key in ("coords", "lattices"))
+            if record_traj and coords and lattices:
+                mace_traj = Trajectory(
+                    species=structs[material_id].species,
+                    coords=coords,
+                    lattice=lattices,
+                    constant_lattice=False,
+                )
+                result["mace_trajectory"] = mace_traj
+            journal.add(material_id, result)
+            cache.put(cache_key, result)
+        except Exception as exc:
+            print(f"Failed to relax {material_id}: {exc!r}")
+            task.fail(material_id, exc)
+            continue
+
+
+# %% merge journal into the final shard file
+df_out = journal.compact()
+task.finish()
+print(f"{cache!r}")
 
 
 # %%
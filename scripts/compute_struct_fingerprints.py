@@ -17,7 +17,7 @@ from tqdm import tqdm
 from matbench_discovery import DATA_DIR, timestamp
 from matbench_discovery.data import DATA_FILES
 from matbench_discovery.enums import Key
-from matbench_discovery.slurm import slurm_submit
+from matbench_discovery.slurm import ArrayTask, array_status, slurm_submit
 
 __author__ = "Janosh Riebesell"
 __date__ = "2023-03-26"
@@ -53,6 +53,7 @@ if os.path.isfile(out_path):
 
 print(f"\nJob started running {timestamp}")
 print(f"{out_path=}")
+task = ArrayTask(out_dir, out_path).start()  # status record for array_status()
 
 
 # %%
@@ -89,8 +90,10 @@ for struct_col, fp_col in (
             df_in.loc[row.Index, fp_col] = ss_fp
         except Exception as exc:
             print(f"{fp_col} for {row.Index} failed: {exc}")
+            task.fail(row.Index, exc)
 
 df_in.filter(like="site_stats_fingerprint").reset_index().to_json(out_path)
+task.finish()
 
 
 # %%
@@ -103,11 +106,11 @@ if running_as_slurm_job:
 # %%
 out_files = glob(f"{out_dir}/site-stats-*.json.gz")
 
-found_idx = [int(name.split("-")[-1].split(".")[0]) for name in out_files]
 print(f"Found {len(out_files)=:,}")
-missing_files = sorted(set(range(1, slurm_array_task_count + 1)) - set(found_idx))
-if missing_files:
-    print(f"{len(missing_files)=}: {missing_files}")
+# resubmit tasks that are missing or failed with `python this_file.py slurm-resubmit`
+df_status = array_status(out_dir)
+if not_done := list(df_status.index[df_status.status != "done"]):
+    print(f"{len(not_done)} tasks not done: {not_done}")
 
 df_out = pd.concat(pd.read_json(out_file) for out_file in tqdm(out_files))
 df_out = df_out.set_index(Key.mat_id)
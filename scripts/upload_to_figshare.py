@@ -5,7 +5,6 @@ https://colab.research.google.com/drive/13CAM8mL1u7ZsqNhfZLv7bNb1rdhMI64d?usp=sh
 Found notebook in docs: https://help.figshare.com/article/how-to-use-the-figshare-api
 """
 
-import hashlib
 import json
 import os
 import sys
@@ -17,7 +16,7 @@ from requests.exceptions import HTTPError
 from tqdm import tqdm
 
 from matbench_discovery import DATA_DIR, FIGSHARE_DIR, ROOT
-from matbench_discovery.data import DATA_FILES, DataFiles
+from matbench_discovery.data import DATA_FILES, DataFiles, get_file_hash_and_size
 
 __author__ = "Janosh Riebesell"
 __date__ = "2023-04-27"
@@ -59,23 +58,8 @@ def create_article(metadata: dict[str, str | int | float]) -> int:
     return result["id"]
 
 
-def get_file_hash_and_size(
-    file_name: str, chunk_size: int = 10_000_000
-) -> tuple[str, int]:
-    """Get the md5 hash and size of a file. File is read in chunks of chunk_size bytes.
-    Default chunk size is 10_000_000 ~= 10MB.
-    """
-    md5 = hashlib.md5()  # noqa: S324
-    size = 0
-    with open(file_name, "rb") as file:
-        while data := file.read(chunk_size):
-            size += len(data)
-            md5.update(data)
-    return md5.hexdigest(), size
-
-
-def upload_file_to_figshare(article_id: int, file_path: str) -> int:
-    """Upload a file to Figshare and return the file ID."""
+def upload_file_to_figshare(article_id: int, file_path: str) -> tuple[int, str, int]:
+    """Upload a file to Figshare and return the file ID, md5 hash and size."""
     # Initiate new upload
     md5, size = get_file_hash_and_size(file_path)
     data = dict(name=os.path.basename(file_path), md5=md5, size=size)
@@ -98,7 +82,7 @@ def upload_file_to_figshare(article_id: int, file_path: str) -> int:
 
     # Complete upload
     make_request("POST", f"{endpoint}/{file_info['id']}")
-    return file_info["id"]
+    return file_info["id"], md5, size
 
 
 def main(pyproject: dict[str, Any], urls_json_path: str) -> int:
@@ -133,17 +117,18 @@ def main(pyproject: dict[str, Any], urls_json_path: str) -> int:
     }
     try:
         article_id = create_article(metadata)
-        uploaded_files: dict[str, tuple[str, str]] = {}
+        # record md5 and size so matbench_discovery.data.fetch() can verify downloads
+        uploaded_files: dict[str, tuple[str, str, str, int]] = {}
         pbar = tqdm(DATA_FILES, desc="Uploading to Figshare")
         for key in pbar:
             pbar.set_postfix(file=key)
             file_path = f"{DATA_DIR}/{DataFiles.__dict__[key]}"
-            file_id = upload_file_to_figshare(article_id, file_path)
+            file_id, md5, size = upload_file_to_figshare(article_id, file_path)
             file_url = f"https://figshare.com/ndownloader/files/{file_id}"
-            uploaded_files[key] = (file_url, file_path.split("/")[-1])
+            uploaded_files[key] = (file_url, file_path.split("/")[-1], md5, size)
 
         print("\nUploaded files:")
-        for file_path, (file_url, _) in uploaded_files.items():
+        for file_path, (file_url, *_) in uploaded_files.items():
             print(f"{file_path}: {file_url}")
 
         # write uploaded file keys mapped to their URLs to JSON
@@ -0,0 +1,135 @@
+import gzip
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+from pymatgen.core import Lattice, Structure
+
+from matbench_discovery.cache import (
+    ResultCache,
+    checkpoint_hash,
+    result_key,
+    structure_hash,
+)
+
+model = {"name": "model", "version": "1.0.0", "checkpoint": None}
+params = {"optimizer": "FIRE", "fmax": 0.05, "max_steps": 500}
+
+
+@pytest.fixture()
+def struct() -> Structure:
+    return Structure(Lattice.cubic(4.2), ["Na", "Cl"], [[0, 0, 0], [0.5, 0.5, 0.5]])
+
+
+def test_structure_hash(struct: Structure) -> None:
+    struct_hash = structure_hash(struct)
+    assert len(struct_hash) == 64
+    assert structure_hash(struct.as_dict()) == struct_hash
+
+    # invariant to site order, periodic images and float noise below decimals
+    reordered = Structure(
+        struct.lattice, ["Cl", "Na"], [[0.5, -0.5, 1.5], [1e-9, 0, 1 - 1e-9]]
+    )
+    assert structure_hash(reordered) == struct_hash
+
+    # sensitive to species, positions and lattice
+    for mutate in (
+        lambda struct: struct.replace_species({"Na": "K"}),
+        lambda struct: struct.translate_sites([1], [0.01, 0, 0]),
+        lambda struct: struct.scale_lattice(80),
+    ):
+        mutated = struct.copy()
+        mutate(mutated)
+        assert structure_hash(mutated) != struct_hash
+
+
+def test_result_key(struct: Structure, tmp_path: Path) -> None:
+    key = result_key(struct, model, params)
+    assert result_key(structure_hash(struct), model, params) == key
+    # dict order doesn't matter but every value does
+    assert result_key(struct, dict(reversed(model.items())), params) == key
+    assert result_key(struct, model | {"version": "1.0.1"}, params) != key
+    assert result_key(struct, model, params | {"optimizer": "LBFGS"}) != key
+
+    # checkpoints are hashed by content
+    ckpt_dir = tmp_path / "ckpt"
+    ckpt_dir.mkdir()
+    (ckpt_dir / "weights.pt").write_bytes(b"weights")
+    dir_hash = checkpoint_hash(str(ckpt_dir))
+    file_hash = checkpoint_hash(str(ckpt_dir / "weights.pt"))
+    assert dir_hash != file_hash
+    (ckpt_dir / "weights.pt").write_bytes(b"retrained")
+    assert checkpoint_hash(str(ckpt_dir)) != dir_hash
+    assert checkpoint_hash("https://example.com/model") == "https://example.com/model"
+    assert checkpoint_hash(None) is None
+
+
+def test_result_cache(struct: Structure, tmp_path: Path) -> None:
+    cache = ResultCache(str(tmp_path))
+    key = result_key(struct, model, params)
+    assert cache.get(key) is None
+    assert key not in cache
+
+    cache.put(key, {"model_energy": -1.5, "model_structure": struct})
+    assert key in cache
+    assert len(cache) == 1
+    result = cache.get(key)
+    assert result is not None
+    assert result["model_energy"] == -1.5
+    assert Structure.from_dict(result["model_structure"]) == struct
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert repr(cache).endswith("hits=1, misses=1)")
+    assert not any(
+        ".tmp-" in name for _, _, names in os.walk(tmp_path) for name in names
+    )
+
+    # numpy values are stored as Python numbers, missing values aren't cached
+    assert cache.put(key, {"model_energy": np.float32(-1.5), "forces": np.zeros(2)})
+    assert cache.get(key) == {"model_energy": -1.5, "forces": [0.0, 0.0]}
+    for bad_val in (None, float("nan"), np.float32("nan"), object()):
+        assert not cache.put("bad-key", {"model_energy": bad_val})
+    assert "bad-key" not in cache
+
+    # entries with missing values (e.g. written before numpy values were handled)
+    # count as misses and are removed
+    with gzip.open(cache._path(key), "wt") as file:  # noqa: SLF001
+        json.dump({"model_energy": None}, file)
+    assert cache.get(key) is None
+    assert key not in cache
+    cache.put(key, {"model_energy": -1.5})
+
+    # corrupt entries count as misses and are removed
+    with open(cache._path(key), "wb") as file:  # noqa: SLF001
+        file.write(b"not gzip")
+    assert cache.get(key) is None
+    assert key not in cache
+
+    with pytest.raises(ValueError, match="max_bytes=0 must be positive"):
+        ResultCache(str(tmp_path), max_bytes=0)
+    with pytest.raises(ValueError, match="low_water=0 must be in"):
+        ResultCache(str(tmp_path), low_water=0)
+
+
+def test_result_cache_lru_eviction(tmp_path: Path) -> None:
+    cache = ResultCache(str(tmp_path / "cache"))
+    keys = [f"{idx:064x}" for idx in range(10)]
+    for idx, key in enumerate(keys):
+        cache.put(key, {"energy": idx})
+        # distinct mtimes, oldest first
+        os.utime(cache._path(key), (time.time() - 100 + idx,) * 2)  # noqa: SLF001
+    entry_size = os.path.getsize(cache._path(keys[0]))  # noqa: SLF001
+
+    cache.get(keys[0])  # most recently used now
+    assert cache.evict(max_bytes=5.5 * entry_size) == 5
+    assert [key in cache for key in keys] == [True] + [False] * 5 + [True] * 4
+
+    # exceeding max_bytes on put evicts down to low_water * max_bytes
+    small_cache = ResultCache(
+        str(tmp_path / "cache"), max_bytes=int(5.5 * entry_size), low_water=0.5
+    )
+    small_cache.put(keys[1], {"energy": 1})
+    assert len(small_cache) == 2
+    assert keys[1] in small_cache
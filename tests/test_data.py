@@ -1,22 +1,42 @@
+import functools
+import hashlib
+import http.server
 import json
 import os
+import pickle
+import subprocess
+import sys
+import threading
+from collections.abc import Iterator
 from pathlib import Path
 from random import random
 from typing import Any
 from unittest.mock import patch
 
+import numpy as np
 import pandas as pd
 import pytest
 from pymatgen.core import Lattice, Structure
+from pymatgen.entries.computed_entries import ComputedStructureEntry
 
 from matbench_discovery import FIGSHARE_DIR, ROOT
 from matbench_discovery.data import (
     DATA_FILES,
+    LazyMSONable,
     as_dict_handler,
+    columnar_cache_path,
     df_wbm,
+    download_file,
+    fetch,
     figshare_versions,
     glob_to_df,
+    hydrate_dicts,
+    iter_records,
     load,
+    prefetch,
+    read_parquet,
+    shard_bounds,
+    write_parquet,
 )
 from matbench_discovery.enums import Key
 
@@ -35,6 +55,7 @@ structure = Structure(
     [
         ("wbm_summary", True),
         ("wbm_initial_structures", True),
+        ("wbm_initial_structures", "lazy"),
         ("wbm_computed_structure_entries", False),
         ("mp_elemental_ref_entries", True),
         ("mp_energies", True),
@@ -51,9 +72,9 @@ def test_load(
 ) -> None:
     filepath = DATA_FILES[key]
     # intercept HTTP requests and write dummy df to disk instead
-    with patch("urllib.request.urlretrieve") as url_retrieve:
+    with patch("matbench_discovery.data.download_file") as mock_download:
         writer = df_with_pmg_objects.to_json if ".json" in filepath else df_float.to_csv
-        url_retrieve.side_effect = lambda _url, path: writer(path)
+        mock_download.side_effect = lambda _url, path, **_kw: writer(path)
         out = load(
             key,
             hydrate=hydrate,
@@ -66,7 +87,7 @@ def test_load(
     assert f"Downloading {key!r} from {figshare_urls[key][0]}" in stdout
 
     # check we called read_csv/read_json once for each data_name
-    assert url_retrieve.call_count == 1
+    assert mock_download.call_count == 1
 
     assert isinstance(out, pd.DataFrame), f"{key} not a DataFrame"
 
@@ -75,6 +96,332 @@ def test_load(
     pd.testing.assert_frame_equal(out, from_cache)
 
 
+def test_load_columnar_cache(
+    df_with_pmg_objects: pd.DataFrame,
+    capsys: pytest.CaptureFixture[str],
+    tmp_path: Path,
+) -> None:
+    key = "wbm_initial_structures"
+    cache_path = f"{tmp_path}/{getattr(type(DATA_FILES), key)}"
+    parquet_path = columnar_cache_path(cache_path)
+    assert parquet_path == cache_path.replace(".json.bz2", ".parquet")
+
+    with patch("matbench_discovery.data.download_file") as mock_download:
+        mock_download.side_effect = (
+            lambda _url, path, **_kw: df_with_pmg_objects.to_json(path)
+        )
+        df_raw = load(key, cache_dir=tmp_path)
+    assert os.path.isfile(parquet_path), "columnar cache not written"
+
+    # second load should read from Parquet without parsing JSON
+    with patch("pandas.read_json") as read_json:
+        df_cached = load(key, cache_dir=tmp_path)
+    assert read_json.call_count == 0
+    pd.testing.assert_frame_equal(df_raw, df_cached)
+    assert isinstance(df_cached[Key.struct].iloc[0], dict)
+
+    # raw JSON newer than Parquet file means cache is stale and gets rebuilt
+    os.utime(parquet_path, (os.path.getmtime(cache_path) - 10,) * 2)
+    with patch("pandas.read_json", wraps=pd.read_json) as read_json:
+        load(key, cache_dir=tmp_path)
+    assert read_json.call_count == 1
+    assert os.path.getmtime(parquet_path) >= os.path.getmtime(cache_path)
+
+    # corrupt Parquet file falls back to raw JSON
+    with open(parquet_path, "w") as file:
+        file.write("not a parquet file")
+    capsys.readouterr()
+    pd.testing.assert_frame_equal(df_raw, load(key, cache_dir=tmp_path))
+    stdout, _ = capsys.readouterr()
+    assert "falling back to JSON" in stdout
+
+
+@pytest.mark.parametrize("key", ["wbm_initial_structures", "mp_energies"])
+def test_load_columns_ids(
+    df_with_pmg_objects: pd.DataFrame, tmp_path: Path, key: str
+) -> None:
+    df_dummy = df_with_pmg_objects.drop(columns=Key.cse).assign(
+        material_id=[f"wbm-1-{idx}" for idx in range(len(df_with_pmg_objects))]
+    )
+    writer = df_dummy.to_json if ".json" in DATA_FILES[key] else df_dummy.to_csv
+
+    ids = ["wbm-1-1", "wbm-1-3"]
+    with patch("matbench_discovery.data.download_file") as mock_download:
+        mock_download.side_effect = lambda _url, path, **_kw: writer(path, index=False)
+        df_full = load(key, cache_dir=tmp_path)
+        # first load for JSON files reads raw file, all others read from Parquet
+        for _ in range(2):
+            df_sub = load(key, cache_dir=tmp_path, columns=[Key.volume], ids=ids)
+            assert list(df_sub) == [Key.volume]
+            assert list(df_sub.index) == ids
+            pd.testing.assert_frame_equal(df_sub, df_full.loc[ids, [Key.volume]])
+
+    df_rows = load(key, cache_dir=tmp_path, ids=ids)
+    pd.testing.assert_frame_equal(df_rows, df_full.loc[ids])
+    assert load(key, cache_dir=tmp_path, ids=[]).shape == (0, len(df_full.columns))
+
+    with pytest.raises(ValueError, match="missing_cols={'foo'} not in"):
+        load(key, cache_dir=tmp_path, columns=["foo", Key.volume])
+
+
+def test_load_columns_ids_raises(tmp_path: Path) -> None:
+    key = "mp_patched_phase_diagram"
+    with (
+        pytest.raises(ValueError, match="only supported for dataframes"),
+        patch("matbench_discovery.data.download_file"),
+    ):
+        load(key, cache_dir=tmp_path, columns=["foo"])
+
+
+@pytest.fixture()
+def file_server() -> Iterator[tuple[str, bytes, list[str | None]]]:
+    """Local HTTP server serving random bytes with Range request support. Yields base
+    URL, served content and list of Range headers received.
+    """
+    content = os.urandom(100_000)
+    range_headers: list[str | None] = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            range_header = self.headers.get("Range")
+            range_headers.append(range_header)
+            start = int(range_header.split("=")[1].split("-")[0]) if range_header else 0
+            if start >= len(content):
+                self.send_response(416)
+                self.end_headers()
+                return
+            self.send_response(206 if range_header else 200)
+            self.send_header("Content-Length", str(len(content) - start))
+            self.end_headers()
+            self.wfile.write(content[start:])
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", content, range_headers
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_file(
+    file_server: tuple[str, bytes, list[str | None]], tmp_path: Path
+) -> None:
+    url, content, range_headers = file_server
+    md5 = hashlib.md5(content).hexdigest()  # noqa: S324
+    path = f"{tmp_path}/sub/file.bin"
+
+    download_file(url, path, md5=md5, size=len(content), pbar=False)
+    with open(path, "rb") as file:
+        assert file.read() == content
+    assert os.listdir(f"{tmp_path}/sub") == ["file.bin"]
+    assert range_headers == [None]
+
+    # interrupted download resumes from end of .part file
+    os.remove(path)
+    with open(f"{path}.part", "wb") as file:
+        file.write(content[:30_000])
+    download_file(url, path, md5=md5, pbar=False)
+    assert range_headers[-1] == "bytes=30000-"
+    with open(path, "rb") as file:
+        assert file.read() == content
+
+    # complete .part file (server responds 416) is verified and renamed
+    os.rename(path, f"{path}.part")
+    download_file(url, path, md5=md5, size=len(content), pbar=False)
+    assert os.listdir(f"{tmp_path}/sub") == ["file.bin"]
+
+
+def test_download_file_raises(
+    file_server: tuple[str, bytes, list[str | None]], tmp_path: Path
+) -> None:
+    url, content, _range_headers = file_server
+    path = f"{tmp_path}/file.bin"
+
+    # corrupt download is deleted
+    with pytest.raises(ValueError, match="md5 mismatch"):
+        download_file(url, path, md5="0" * 32, pbar=False)
+    assert os.listdir(tmp_path) == []
+
+    # truncated download keeps .part file to resume later
+    with pytest.raises(ValueError, match="but expected 200,000"):
+        download_file(url, path, size=2 * len(content), pbar=False)
+    assert os.listdir(tmp_path) == ["file.bin.part"]
+
+
+def test_fetch_prefetch(
+    file_server: tuple[str, bytes, list[str | None]], tmp_path: Path
+) -> None:
+    url, content, range_headers = file_server
+    keys = ["wbm_summary", "mp_energies"]
+    manifest = {
+        key: [f"{url}/{key}", "file_name", hashlib.md5(content).hexdigest(), 100_000]  # noqa: S324
+        for key in keys
+    }
+    with patch("json.load", return_value={"files": manifest}):
+        paths = prefetch(keys, cache_dir=tmp_path, workers=2)
+        assert len(range_headers) == 2
+        # cached files aren't downloaded again
+        assert fetch(keys[0], cache_dir=tmp_path) == paths[keys[0]]
+    assert len(range_headers) == 2
+
+    assert list(paths) == keys
+    for key, path in paths.items():
+        assert path == f"{tmp_path}/{getattr(type(DATA_FILES), key)}"
+        with open(path, "rb") as file:
+            assert file.read() == content
+
+
+def test_write_read_parquet(df_mixed: pd.DataFrame, tmp_path: Path) -> None:
+    df_in = df_mixed.assign(
+        dicts=[{"foo": idx, "bar": [1.5, None]} for idx in range(len(df_mixed))],
+        mixed=["str", 1, None, {"a": 1}, [1], 2.5, "x", "y", "z", 3],
+    )
+    path = f"{tmp_path}/df.parquet"
+    write_parquet(df_in, path)
+    assert os.listdir(tmp_path) == ["df.parquet"], "temp file not cleaned up"
+
+    pd.testing.assert_frame_equal(df_in, read_parquet(path))
+
+    # non-string column labels are encoded in place rather than duplicated
+    df_int_cols = df_in[["dicts", "mixed"]].set_axis([0, 1], axis="columns")
+    write_parquet(df_int_cols, path)
+    pd.testing.assert_frame_equal(df_int_cols, read_parquet(path))
+
+
+@pytest.mark.parametrize("n_rows, n_shards", [(23, 4), (5, 5), (3, 7), (100, 1)])
+def test_shard_bounds(n_rows: int, n_shards: int) -> None:
+    rows = np.arange(n_rows)
+    for shard_idx, expected in enumerate(np.array_split(rows, n_shards)):
+        start, stop = shard_bounds(n_rows, shard_idx, n_shards)
+        assert list(rows[start:stop]) == list(expected)
+
+    with pytest.raises(ValueError, match="must be in"):
+        shard_bounds(n_rows, n_shards, n_shards)
+
+
+@pytest.mark.parametrize("n_shards, batch_size", [(1, 100), (4, 2), (7, 3)])
+def test_iter_records(tmp_path: Path, n_shards: int, batch_size: int) -> None:
+    n_rows = 23
+    df_dummy = pd.DataFrame(
+        {
+            Key.mat_id: [f"wbm-1-{idx}" for idx in range(n_rows)],
+            Key.init_struct: [
+                Structure(
+                    Lattice.cubic(4 + idx / 10), ("Fe", "O"), ((0, 0, 0), (0.5,) * 3)
+                ).as_dict()
+                for idx in range(n_rows)
+            ],
+        }
+    )
+    key = "wbm_initial_structures"
+    # small row groups to test shards spanning multiple row groups
+    with (
+        patch("matbench_discovery.data.PARQUET_ROW_GROUP_SIZE", 5),
+        patch("matbench_discovery.data.download_file") as mock_download,
+    ):
+        mock_download.side_effect = lambda _url, path, **_kw: df_dummy.to_json(path)
+        shards = [
+            list(
+                iter_records(
+                    key,
+                    shard=(shard_idx, n_shards),
+                    batch_size=batch_size,
+                    cache_dir=tmp_path,
+                )
+            )
+            for shard_idx in range(n_shards)
+        ]
+    assert mock_download.call_count == 1
+
+    # compare to load() since JSON round trip slightly changes floats
+    df_loaded = load(key, cache_dir=tmp_path)
+    assert list(df_loaded.index) == list(df_dummy[Key.mat_id])
+    expected = np.array_split(df_loaded[Key.init_struct], n_shards)
+    for batches, srs_shard in zip(shards, expected, strict=True):
+        assert all(len(batch) <= batch_size for batch in batches)
+        assert all(len(batch) == batch_size for batch in batches[:-1])
+        records = [record for batch in batches for record in batch]
+        assert [mat_id for mat_id, _ in records] == list(srs_shard.index)
+        assert [struct for _, struct in records] == list(srs_shard)
+
+    # select rows by ID, e.g. for cost-balanced shards
+    ids = ["wbm-1-17", "wbm-1-2", "wbm-1-11", "missing"]
+    batches = list(iter_records(key, ids=ids, batch_size=2, cache_dir=tmp_path))
+    assert [[mat_id for mat_id, _ in batch] for batch in batches] == [
+        ["wbm-1-2", "wbm-1-11"],
+        ["wbm-1-17"],
+    ]
+    assert batches[0][0][1] == df_loaded[Key.init_struct]["wbm-1-2"]
+
+
+def test_iter_records_raises(tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match="Unknown key='wbm_summary'"):
+        next(iter_records("wbm_summary", cache_dir=tmp_path))
+    with pytest.raises(ValueError, match="No default column for key="):
+        next(iter_records("mp_elemental_ref_entries", cache_dir=tmp_path))
+    with pytest.raises(ValueError, match="shard_idx=2 must be in"):
+        next(iter_records("wbm_initial_structures", shard=(2, 2), cache_dir=tmp_path))
+    with pytest.raises(ValueError, match="Pass either shard=.+ or ids, not both"):
+        next(
+            iter_records(
+                "wbm_initial_structures", shard=(0, 2), ids=[], cache_dir=tmp_path
+            )
+        )
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("workers, chunk_size", [(1, 1_000), (2, 3), (-1, 4)])
+def test_hydrate_dicts(
+    df_with_pmg_objects: pd.DataFrame,
+    dummy_struct: Structure,
+    workers: int,
+    chunk_size: int,
+) -> None:
+    expected = [dummy_struct] * len(df_with_pmg_objects) * 2
+    dicts = pd.concat([df_with_pmg_objects[Key.struct]] * 2)
+    structs = hydrate_dicts(dicts, workers=workers, chunk_size=chunk_size, pbar=False)
+    assert structs == expected
+    assert all(isinstance(struct, Structure) for struct in structs)
+
+    cses = hydrate_dicts(df_with_pmg_objects[Key.cse], workers=workers, pbar=False)
+    assert all(isinstance(cse, ComputedStructureEntry) for cse in cses)
+
+
+def test_lazy_msonable(
+    df_with_pmg_objects: pd.DataFrame, dummy_struct: Structure, tmp_path: Path
+) -> None:
+    struct = dummy_struct
+    df_lazy = df_with_pmg_objects[[Key.cse]].assign(
+        lazy=hydrate_dicts(df_with_pmg_objects[Key.struct], lazy=True)
+    )
+    proxies = list(df_lazy.lazy)
+    assert all(isinstance(proxy, LazyMSONable) for proxy in proxies)
+    # storing proxies in a dataframe must not decode them
+    assert not any(proxy.is_decoded for proxy in proxies)
+
+    assert proxies[0].volume == struct.volume
+    assert proxies[0].decode() == struct
+    assert proxies[0].is_decoded
+    assert repr(proxies[0]) == repr(struct)
+    assert not any(proxy.is_decoded for proxy in proxies[1:])
+    assert proxies[1] == proxies[2]
+
+    # proxies survive pickling
+    pickled = pickle.loads(pickle.dumps(proxies[1]))  # noqa: S301
+    assert pickled.decode() == struct
+
+    with patch("matbench_discovery.data.download_file") as mock_download:
+        mock_download.side_effect = (
+            lambda _url, path, **_kw: df_with_pmg_objects.to_json(path)
+        )
+        df_out = load("wbm_initial_structures", hydrate="lazy", cache_dir=tmp_path)
+    assert isinstance(df_out[Key.cse].iloc[0], LazyMSONable)
+    assert isinstance(df_out[Key.cse].iloc[0].decode(), ComputedStructureEntry)
+
+
 def test_load_raises(tmp_path: Path) -> None:
     key = "bad-key"
     with pytest.raises(ValueError) as exc:  # noqa: PT011
@@ -189,6 +536,10 @@ def test_as_dict_handler() -> None:
     assert as_dict_handler("foo") is None
     assert as_dict_handler([1, 2, 3]) is None
     assert as_dict_handler({"foo": "bar"}) is None
+    # numpy values are converted rather than dropped
+    assert as_dict_handler(np.float32(-3.5)) == -3.5
+    assert isinstance(as_dict_handler(np.int64(3)), int)
+    assert as_dict_handler(np.array([[1, 2]], dtype=np.float32)) == [[1.0, 2.0]]
 
 
 def test_df_wbm() -> None:
@@ -197,6 +548,36 @@ def test_df_wbm() -> None:
     assert set(df_wbm) > {Key.formula, Key.mat_id, Key.bandgap_pbe}
 
 
+def test_lazy_globals() -> None:
+    # run in subprocess since df_wbm was already loaded when importing this test module
+    code = """
+import matbench_discovery.data as data
+import matbench_discovery.energy as energy
+import matbench_discovery.metrics
+import matbench_discovery.preds as preds
+
+assert "df_wbm" not in vars(data)
+assert energy._load_mp_elem_refs.cache_info().currsize == 0
+assert "df_preds" not in vars(preds) and "df_metrics" not in vars(preds)
+
+# preds.df_wbm comes from data without loading any model predictions
+data.df_wbm = df_wbm = object()
+assert preds.df_wbm is df_wbm
+assert "df_preds" not in vars(preds)
+"""
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=False
+    )
+    assert result.returncode == 0, result.stderr
+    assert "Loading" not in result.stdout, "data files loaded at import time"
+
+    from matbench_discovery import data
+
+    assert "df_wbm" in vars(data), "df_wbm should be cached after first access"
+    with pytest.raises(AttributeError, match="has no attribute 'foo'"):
+        _ = data.foo
+
+
 @pytest.mark.parametrize("pattern", ["*df.csv", "*df.json"])
 def test_glob_to_df(pattern: str, tmp_path: Path, df_mixed: pd.DataFrame) -> None:
     os.makedirs(f"{tmp_path}", exist_ok=True)
@@ -207,5 +588,62 @@ def test_glob_to_df(pattern: str, tmp_path: Path, df_mixed: pd.DataFrame) -> Non
     assert df_out.shape == df_mixed.shape
     assert list(df_out) == list(df_mixed)
 
+    # readers without __qualname__ work with and without cache_path
+    reader = functools.partial(pd.read_csv if "csv" in pattern else pd.read_json)
+    df_partial = glob_to_df(f"{tmp_path}/{pattern}", reader=reader)
+    pd.testing.assert_frame_equal(df_partial, df_out)
+    cache_path = f"{tmp_path}/cache.pkl"
+    df_partial = glob_to_df(
+        f"{tmp_path}/{pattern}", reader=reader, cache_path=cache_path
+    )
+    pd.testing.assert_frame_equal(df_partial, df_out)
+
     with pytest.raises(FileNotFoundError):
         glob_to_df("foo")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_glob_to_df_workers_cache(
+    tmp_path: Path, df_mixed: pd.DataFrame, workers: int
+) -> None:
+    for idx in range(4):
+        df_mixed.assign(shard=idx).to_csv(f"{tmp_path}/shard-{idx}.csv", index=False)
+    pattern, cache_path = f"{tmp_path}/shard-*.csv", f"{tmp_path}/cache.pkl"
+
+    df_serial = glob_to_df(pattern, pbar=False)
+    assert list(df_serial.shard.unique()) == [0, 1, 2, 3]
+    df_out = glob_to_df(pattern, workers=workers, cache_path=cache_path, pbar=False)
+    pd.testing.assert_frame_equal(df_out, df_serial)
+    assert os.path.isfile(cache_path)
+
+    # only new and modified files are read on subsequent calls
+    df_mixed.assign(shard=4).to_csv(f"{tmp_path}/shard-4.csv", index=False)
+    df_mixed.assign(shard=5).to_csv(f"{tmp_path}/shard-0.csv", index=False)
+    os.utime(f"{tmp_path}/shard-0.csv", (0, 0))
+    read_files: list[str] = []
+
+    def reader(path: str, **kwargs: Any) -> pd.DataFrame:
+        read_files.append(path)
+        return pd.read_csv(path, **kwargs)
+
+    df_out = glob_to_df(pattern, reader=reader, cache_path=cache_path, pbar=False)
+    assert len(read_files) == 5  # cache from pd.read_csv not reused for new reader
+    read_files.clear()
+    glob_to_df(pattern, reader=reader, cache_path=cache_path, pbar=False)
+    assert read_files == []
+    assert list(df_out.shard.unique()) == [5, 1, 2, 3, 4]
+
+    df_mixed.assign(shard=6).to_csv(f"{tmp_path}/shard-1.csv", index=False)
+    os.utime(f"{tmp_path}/shard-1.csv", (1, 1))
+    df_mixed.assign(shard=7).to_csv(f"{tmp_path}/shard-7.csv", index=False)
+    df_out = glob_to_df(pattern, reader=reader, cache_path=cache_path, pbar=False)
+    assert read_files == [f"{tmp_path}/shard-1.csv", f"{tmp_path}/shard-7.csv"]
+    assert list(df_out.shard.unique()) == [5, 6, 2, 3, 4, 7]
+
+    # different reader kwargs invalidate the cache
+    read_files.clear()
+    df_out = glob_to_df(
+        pattern, reader=reader, cache_path=cache_path, pbar=False, nrows=2
+    )
+    assert len(read_files) == 6
+    assert len(df_out) == 12
@@ -1,16 +1,28 @@
+import copy
 from collections.abc import Callable
 from typing import Any
 
+import numpy as np
 import pytest
 from pymatgen.analysis.phase_diagram import PDEntry
-from pymatgen.core import Lattice, Structure
-from pymatgen.entries.computed_entries import ComputedEntry, Entry
+from pymatgen.core import Composition, Lattice, Structure
+from pymatgen.entries.compatibility import MaterialsProject2020Compatibility
+from pymatgen.entries.computed_entries import (
+    ComputedEntry,
+    ComputedStructureEntry,
+    Entry,
+)
+from pymatgen.io.vasp.sets import MPRelaxSet
 
 from matbench_discovery.energy import (
+    composition_matrix,
     get_e_form_per_atom,
+    get_e_form_per_atom_batch,
     get_elemental_ref_entries,
+    get_mp2020_corrections,
     mp_elem_ref_entries,
     mp_elemental_ref_energies,
+    process_entries_mp2020,
 )
 
 dummy_struct = Structure(
@@ -29,6 +41,40 @@ def test_get_e_form_per_atom() -> None:
     assert get_e_form_per_atom(entry, elemental_ref_energies) == -0.25
 
 
+def test_get_e_form_per_atom_batch() -> None:
+    elemental_ref_energies = {"Fe": -1.0, "O": -1.5, "Li": -0.3, "Nb": -2.1}
+    formulas = ["FeO", "Li2O", "Fe2O3", "LiNbO3", "Nb", "FeO"]
+    energies = np.array([-2.5, -4.2, -11.0, -20.5, -2.0, -3.1])
+    expected = [
+        get_e_form_per_atom(
+            dict(energy=energy, composition=formula), elemental_ref_energies
+        )
+        for energy, formula in zip(energies, formulas, strict=True)
+    ]
+
+    for comps in (
+        formulas,
+        [Composition(formula) for formula in formulas],
+        [Composition(formula).as_dict() for formula in formulas],
+        composition_matrix(formulas),
+    ):
+        e_form = get_e_form_per_atom_batch(energies, comps, elemental_ref_energies)
+        assert e_form == pytest.approx(expected, abs=1e-12)
+
+    comp_mat = composition_matrix(formulas)
+    assert comp_mat.shape == (len(formulas), 119)
+    assert comp_mat[2, 26] == 2  # Fe2O3
+    assert comp_mat[2, 8] == 3
+    # parsed matrices for formula strings are cached
+    assert composition_matrix(formulas) is comp_mat
+    assert composition_matrix(formulas, cache=False) is not comp_mat
+
+    with pytest.raises(ValueError, match="Missing elemental reference energies for"):
+        get_e_form_per_atom_batch([1.0], ["UO2"], elemental_ref_energies)
+    with pytest.raises(ValueError, match="len\\(energies\\)=1 != "):
+        get_e_form_per_atom_batch([1.0], formulas, elemental_ref_energies)
+
+
 @pytest.mark.parametrize("constructor", [PDEntry, ComputedEntry, lambda **x: x])
 @pytest.mark.parametrize("verbose", [True, False])
 def test_get_elemental_ref_entries(
@@ -60,3 +106,74 @@ def test_mp_ref_energies() -> None:
         actual = mp_elem_ref_entries[key].energy_per_atom
         assert actual == pytest.approx(val, abs=1e-3), f"{key=}"
         assert actual == pytest.approx(val, abs=1e-3), f"{key=}"
+
+
+def make_mp2020_entries() -> list[ComputedEntry]:
+    """Entries covering all MP2020 correction types incl. peroxides (short O-O bonds
+    in random structures), sulfates, GGA/GGA+U mixing, electronegativity ties (PdH),
+    elements without electronegativity (NeO) and incompatible POTCARs/U values.
+    """
+    rng = np.random.default_rng(seed=0)
+    formulas = (
+        "Fe2O3 Li2O2 KO3 FeF3 MnO2 Li3N LiH PdH NaCl ZnS Li2SO4 CuSe Ca2Si Fe NeO "
+        "XeF2 NH4Cl BaO2 LiFeO2 CoF2 V2O5 NiO SbI3 Te2Se NbOF3 FeSO4F"
+    ).split()
+    potcars, u_settings = MPRelaxSet.CONFIG["POTCAR"], MPRelaxSet.CONFIG["INCAR"]
+    entries = []
+    for idx, formula in enumerate(formulas):
+        comp = Composition(formula)
+        species = [str(el) for el, amt in comp.items() for _ in range(int(amt))]
+        lattice = Lattice.cubic(2.2 * len(species) ** (1 / 3) + 1)
+        struct = Structure(lattice, species, rng.random((len(species), 3)))
+        anion = max(comp.elements, key=lambda el: el.X).symbol
+        hubbards = {
+            el.symbol: u_val
+            for el in comp.elements
+            if (u_val := u_settings["LDAUU"].get(anion, {}).get(el.symbol))
+        }
+        if idx % 5 == 0:  # GGA runs of GGA+U systems are incompatible
+            hubbards = {}
+        potcar_symbols = [f"PAW_PBE {potcars[el.symbol]}" for el in comp.elements]
+        if idx % 7 == 3:
+            potcar_symbols[0] = "PAW_PBE Bad"
+        params = dict(
+            run_type="GGA+U" if hubbards else "GGA",
+            hubbards=hubbards,
+            potcar_symbols=potcar_symbols,
+        )
+        entries += [
+            ComputedStructureEntry(struct, -5.0 * len(struct), parameters=params),
+            ComputedEntry(comp, -5.0 * len(struct), parameters=params.copy()),
+        ]
+    return entries
+
+
+def test_process_entries_mp2020() -> None:
+    entries = make_mp2020_entries()
+    pmg_entries = copy.deepcopy(entries)
+    expected = MaterialsProject2020Compatibility().process_entries(pmg_entries)
+
+    processed = process_entries_mp2020(entries)
+    assert 0 < len(processed) < len(entries)
+    assert [entries.index(entry) for entry in processed] == [
+        pmg_entries.index(entry) for entry in expected
+    ]
+    for entry, pmg_entry in zip(entries, pmg_entries, strict=True):
+        assert entry.energy == pytest.approx(pmg_entry.energy, abs=1e-12)
+        assert [adj.as_dict() for adj in entry.energy_adjustments] == [
+            adj.as_dict() for adj in pmg_entry.energy_adjustments
+        ]
+    assert any("peroxide" in adj.name for e in entries for adj in e.energy_adjustments)
+
+
+def test_get_mp2020_corrections() -> None:
+    formulas = ["Li2O2", "Li2O2", "ZnS", "ZnS", "Fe2O3", "Fe2O3", "Fe", "LiH"]
+    corrections = get_mp2020_corrections(
+        formulas,
+        oxide_types=[None, "oxide"] + [None] * 6,
+        sulfide_types=[None, None, None, "sulfate", None, None, None, None],
+        hubbards=[None] * 5 + [{"Fe": 5.3}, None, None],
+    )
+    expected = [2 * -0.465, 2 * -0.687, -0.503, 0, np.nan, 3 * -0.687 + 2 * -2.256]
+    expected += [0, -0.179]
+    assert corrections == pytest.approx(expected, nan_ok=True)
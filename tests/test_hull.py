@@ -0,0 +1,228 @@
+import gzip
+import json
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pytest
+from pymatgen.analysis.phase_diagram import PatchedPhaseDiagram, PDEntry, PhaseDiagram
+from pymatgen.core import Composition
+
+from matbench_discovery.hull import (
+    HullStore,
+    add_entries_to_ppd,
+    build_ppd,
+    get_e_above_hull_batch,
+    hull_energies_per_atom,
+)
+
+
+@pytest.fixture(scope="module")
+def hull_entries() -> list[PDEntry]:
+    rng = np.random.default_rng(seed=0)
+    elements = ("Li", "Fe", "O", "Nb", "Mn")
+    entries = [PDEntry(Composition({el: 1}), -rng.uniform(1, 5)) for el in elements]
+    for _ in range(60):
+        n_elems = rng.integers(2, 4)
+        chosen = rng.choice(elements, size=n_elems, replace=False)
+        comp = Composition(dict(zip(chosen, rng.integers(1, 5, size=n_elems))))
+        entries += [PDEntry(comp, -rng.uniform(2, 5) * comp.num_atoms)]
+    return entries
+
+
+@pytest.fixture(scope="module")
+def query_entries() -> list[PDEntry]:
+    rng = np.random.default_rng(seed=1)
+    elements = ("Li", "Fe", "O", "Nb", "Mn")
+    entries = []
+    for _ in range(80):
+        n_elems = rng.integers(1, 5)
+        chosen = rng.choice(elements, size=n_elems, replace=False)
+        comp = Composition(dict(zip(chosen, rng.integers(1, 7, size=n_elems))))
+        entries += [PDEntry(comp, -rng.uniform(1, 5) * comp.num_atoms)]
+    return entries
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_get_e_above_hull_batch(
+    hull_entries: list[PDEntry], query_entries: list[PDEntry], workers: int
+) -> None:
+    ppd = PatchedPhaseDiagram(hull_entries)
+    e_above_hull = get_e_above_hull_batch(ppd, query_entries, workers=workers)
+
+    expected = [ppd.get_e_above_hull(e, allow_negative=True) for e in query_entries]
+    assert e_above_hull.shape == (len(query_entries),)
+    assert e_above_hull == pytest.approx(expected, abs=1e-6)
+
+    # entries on the hull have 0 distance
+    stable = list(ppd.stable_entries)
+    assert get_e_above_hull_batch(ppd, stable) == pytest.approx(0, abs=1e-6)
+
+    # plain PhaseDiagram
+    chem_sys = {"Li", "Fe", "O"}
+    pd = PhaseDiagram([e for e in hull_entries if {*map(str, e.elements)} <= chem_sys])
+    queries = [e for e in query_entries if {*map(str, e.elements)} <= chem_sys]
+    expected = [pd.get_e_above_hull(e, allow_negative=True) for e in queries]
+    assert get_e_above_hull_batch(pd, queries, workers=workers) == pytest.approx(
+        expected, abs=1e-6
+    )
+
+    assert len(get_e_above_hull_batch(ppd, [], workers=workers)) == 0
+
+
+def test_hull_energies_per_atom() -> None:
+    # binary A-B hull with vertices at x_B = 0, 0.5, 1 and energies 0, -1, 0
+    pd = PhaseDiagram(
+        [
+            PDEntry("Fe", 0),
+            PDEntry("O", 0),
+            PDEntry("FeO", -2),
+            PDEntry("Fe3O", 0),  # above hull
+        ]
+    )
+    x_frac = np.array([[0], [0.25], [0.5], [0.75], [1]])
+    coords = x_frac if pd.elements[1].symbol == "O" else 1 - x_frac
+    hull_e = hull_energies_per_atom(pd.qhull_data, pd.facets, coords)
+    assert hull_e == pytest.approx([0, -0.5, -1, -0.5, 0])
+
+    # tiny chunks give the same result
+    chunked = hull_energies_per_atom(
+        pd.qhull_data, pd.facets, coords, max_chunk_elements=1
+    )
+    assert chunked == pytest.approx(hull_e)
+
+    # points outside the hull get NaN
+    assert np.isnan(hull_energies_per_atom(pd.qhull_data, pd.facets, [[1.5]])).all()
+
+
+def test_hull_store(
+    hull_entries: list[PDEntry], query_entries: list[PDEntry], tmp_path: Path
+) -> None:
+    ppd = PatchedPhaseDiagram(hull_entries)
+    with gzip.open(pkl_path := f"{tmp_path}/ppd.pkl.gz", "wb") as file:
+        pickle.dump(ppd, file)
+
+    store = HullStore.from_pickle(pkl_path, f"{tmp_path}/hull")
+    assert len(store) == len(ppd.pds)
+    assert len(store.entry_energies) == len(
+        {id(e) for pd in ppd.pds.values() for e in pd.stable_entries}
+    )
+    assert isinstance(store.entry_energies, np.memmap)
+    assert repr(store).startswith(f"HullStore('{tmp_path}/hull', len(self)=")
+    assert "-".join(sorted(map(str, next(iter(ppd.pds))))) in store
+    assert "Fe-Nb-U" not in store
+
+    # matches PatchedPhaseDiagram incl. chemical systems without patch (where PPD
+    # uses approximate SLSQP decomposition)
+    expected = [ppd.get_e_above_hull(e, allow_negative=True) for e in query_entries]
+    e_above_hull = [
+        store.get_e_above_hull(e, allow_negative=True) for e in query_entries
+    ]
+    assert e_above_hull == pytest.approx(expected, abs=1e-5)
+    for workers in (1, 2):
+        batch = get_e_above_hull_batch(store, query_entries, workers=workers)
+        assert batch == pytest.approx(e_above_hull, abs=1e-12)
+
+    # stable entries are on the hull, negative e_above_hull raises by default
+    stable_entry = next(iter(ppd.stable_entries))
+    assert store.get_e_above_hull(stable_entry) == pytest.approx(0, abs=1e-12)
+    below_hull = PDEntry(stable_entry.composition, stable_entry.energy - 1)
+    with pytest.raises(ValueError, match="No valid decomposition found"):
+        store.get_e_above_hull(below_hull)
+
+    # unpickling re-opens the same files, reopening reuses the converted store
+    assert pickle.loads(pickle.dumps(store)).chem_systems == store.chem_systems  # noqa: S301
+    reopened = HullStore.from_data_file(f"{tmp_path}/hull")
+    assert reopened.get_e_above_hull(stable_entry) == pytest.approx(0, abs=1e-12)
+
+    # plain PhaseDiagram
+    pd = PhaseDiagram(
+        [e for e in hull_entries if {*map(str, e.elements)} <= {"Li", "O"}]
+    )
+    pd_store = HullStore.write(f"{tmp_path}/pd-hull", pd)
+    assert pd_store.chem_systems == ["Li-O"]
+    entry = PDEntry("Li2O2", -10)
+    assert pd_store.get_e_above_hull(entry, allow_negative=True) == pytest.approx(
+        pd.get_e_above_hull(entry, allow_negative=True)
+    )
+
+
+def test_hull_store_raises(hull_entries: list[PDEntry], tmp_path: Path) -> None:
+    store = HullStore.write(f"{tmp_path}/hull", PatchedPhaseDiagram(hull_entries))
+    with pytest.raises(ValueError, match="Missing terminal entries"):
+        store.get_hull_energy_per_atom(Composition("FeU"))
+
+    with open(index_path := f"{tmp_path}/hull/index.json") as file:
+        index = json.load(file)
+    with open(index_path, "w") as file:
+        json.dump(index | {"format_version": 0}, file)
+    with pytest.raises(ValueError, match="Unsupported hull store version=0"):
+        HullStore(f"{tmp_path}/hull")
+
+
+def test_add_entries_to_ppd(
+    hull_entries: list[PDEntry], query_entries: list[PDEntry]
+) -> None:
+    old_entries, new_entries = hull_entries[:40], hull_entries[40:]
+    new_entries += [
+        PDEntry("Li", old_entries[0].energy - 0.1),  # new elemental reference
+        PDEntry("Co", -3),  # new element
+        PDEntry("Co2O3", -25),
+        PDEntry("LiCoO2", -30),
+        PDEntry("LiFeNbMnO6", -60),  # new chemical system
+    ]
+    ppd = PatchedPhaseDiagram(old_entries)
+    old_ppd = PatchedPhaseDiagram(old_entries)
+    changed = add_entries_to_ppd(ppd, new_entries)
+    rebuilt_ppd = PatchedPhaseDiagram(old_entries + new_entries)
+
+    assert len(ppd.all_entries) == len(old_entries) + len(new_entries)
+    # every patch of a full rebuild is covered by an incremental patch (the rebuild
+    # also keeps some redundant subspaces)
+    for space in rebuilt_ppd.pds:
+        assert any(space <= other for other in ppd.pds)
+    assert {*ppd.stable_entries} == {*rebuilt_ppd.stable_entries}
+    assert ppd.elements == rebuilt_ppd.elements
+
+    queries = [e for e in query_entries if len(e.elements) < 4] + new_entries
+    expected = get_e_above_hull_batch(rebuilt_ppd, queries)
+    assert get_e_above_hull_batch(ppd, queries) == pytest.approx(expected, abs=1e-6)
+
+    # changed are exactly the old entries whose hull distance changed
+    e_above_hull_old = get_e_above_hull_batch(old_ppd, old_entries)
+    e_above_hull_new = get_e_above_hull_batch(rebuilt_ppd, old_entries)
+    diffs = np.abs(e_above_hull_new - e_above_hull_old)
+    assert {*changed} == {e for e, diff in zip(old_entries, diffs) if diff > 1e-8}
+    assert len(changed) > 0
+    for entry, (old, new) in changed.items():
+        assert old == pytest.approx(old_ppd.get_e_above_hull(entry), abs=1e-6)
+        assert new == pytest.approx(rebuilt_ppd.get_e_above_hull(entry), abs=1e-6)
+
+    with pytest.raises(
+        ValueError, match=r"Missing terminal entries for elements \['U'\]"
+    ):
+        add_entries_to_ppd(ppd, [PDEntry("UO2", -10)])
+
+
+def test_build_ppd(hull_entries: list[PDEntry], query_entries: list[PDEntry]) -> None:
+    serial_ppd = PatchedPhaseDiagram(hull_entries)
+    ppd = build_ppd(hull_entries, workers=2)
+
+    assert isinstance(ppd, PatchedPhaseDiagram)
+    assert list(ppd.pds) == list(serial_ppd.pds)
+    assert {*ppd.stable_entries} == {*serial_ppd.stable_entries}
+    for space, pd in ppd.pds.items():
+        serial_pd = serial_ppd.pds[space]
+        assert pd.elements == serial_pd.elements
+        assert np.array_equal(pd.qhull_data, serial_pd.qhull_data)
+        assert [list(f) for f in pd.facets] == [list(f) for f in serial_pd.facets]
+        # patches reference the original entries, not copies from worker processes
+        assert all(e1 is e2 for e1, e2 in zip(pd.all_entries, serial_pd.all_entries))
+
+    expected = [
+        serial_ppd.get_e_above_hull(e, allow_negative=True) for e in query_entries
+    ]
+    e_above_hull = [ppd.get_e_above_hull(e, allow_negative=True) for e in query_entries]
+    assert e_above_hull == pytest.approx(expected, abs=1e-12)
+
+    assert build_ppd(hull_entries, workers=1).pds.keys() == serial_ppd.pds.keys()
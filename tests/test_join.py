@@ -0,0 +1,203 @@
+import io
+import os
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+from pymatgen.core import Lattice, Structure
+from pymatgen.entries.compatibility import MaterialsProject2020Compatibility
+from pymatgen.entries.computed_entries import ComputedStructureEntry
+
+from matbench_discovery.data import DataFiles, glob_to_df
+from matbench_discovery.energy import get_e_form_per_atom
+from matbench_discovery.enums import Key
+from matbench_discovery.join import (
+    correct_chunk,
+    iter_shard_chunks,
+    join_predictions,
+    read_json_shard,
+)
+
+potcars = {"Li": "PAW_PBE Li_sv 10Sep2004", "O": "PAW_PBE O 08Apr2002"}
+mat_ids = [f"wbm-1-{idx}" for idx in range(1, 8)]
+
+
+def make_cse_dict(mat_id: str, a: float, *, bad_potcar: bool = False) -> dict[str, Any]:
+    struct = Structure(
+        Lattice.cubic(a), ["Li", "Li", "O"], [[0, 0, 0], [0.5] * 3, [0.25] * 3]
+    )
+    potcar_symbols = [*potcars.values()]
+    if bad_potcar:  # makes MP2020 compatibility reject the entry
+        potcar_symbols[0] = "PAW_PBE Li 17Jan2003"
+    params = dict(run_type="GGA", is_hubbard=False, potcar_symbols=potcar_symbols)
+    cse = ComputedStructureEntry(struct, -10, parameters=params, entry_id=mat_id)
+    return cse.as_dict()
+
+
+@pytest.fixture()
+def df_preds() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df_preds = pd.DataFrame(index=pd.Index(mat_ids, name=Key.mat_id))
+    df_preds["model_energy"] = rng.uniform(-16, -12, len(mat_ids))
+    df_preds["model_structure"] = [
+        Structure(
+            Lattice.cubic(4 + 0.1 * idx),
+            ["Li", "Li", "O"],
+            [[0] * 3, [0.5] * 3, [0.25] * 3],
+        ).as_dict()
+        for idx in range(len(mat_ids))
+    ]
+    return df_preds
+
+
+@pytest.fixture()
+def cse_dicts() -> pd.Series:
+    dicts = [
+        make_cse_dict(mat_id, 4.2, bad_potcar=mat_id == "wbm-1-3") for mat_id in mat_ids
+    ]
+    return pd.Series(dicts, index=mat_ids)
+
+
+def expected_e_forms(df_preds: pd.DataFrame, cse_dicts: pd.Series) -> list[float]:
+    e_forms = []
+    for mat_id, row in df_preds.iterrows():
+        cse = ComputedStructureEntry.from_dict(cse_dicts[mat_id])
+        cse._energy = row.model_energy  # noqa: SLF001
+        cse._structure = Structure.from_dict(row.model_structure)  # noqa: SLF001
+        if MaterialsProject2020Compatibility().process_entries([cse], clean=True):
+            e_forms.append(get_e_form_per_atom(cse))
+        else:
+            e_forms.append(float("nan"))
+    return e_forms
+
+
+def test_iter_shard_chunks(df_preds: pd.DataFrame, tmp_path: Path) -> None:
+    paths = []
+    for idx, df_shard in enumerate(np.array_split(df_preds, 3)):
+        df_shard.reset_index().to_json(path := f"{tmp_path}/{idx}.json.gz")
+        paths.append(path)
+
+    for chunk_size in (1, 2, 3, 100):
+        chunks = list(iter_shard_chunks(paths, chunk_size=chunk_size))
+        assert [len(chunk) for chunk in chunks[:-1]] == [chunk_size] * (len(chunks) - 1)
+        pd.testing.assert_frame_equal(
+            pd.concat(chunks), df_preds, check_exact=False, check_index_type=False
+        )
+
+    with pytest.raises(ValueError, match="chunk_size=0 must be positive"):
+        next(iter_shard_chunks(paths, chunk_size=0))
+
+    # trajectories are dropped
+    df_preds.assign(model_trajectory=1).reset_index().to_json(paths[0])
+    assert "model_trajectory" not in read_json_shard(paths[0])
+    df_shard = read_json_shard(paths[0], drop_cols=["model_energy", "missing"])
+    assert "model_trajectory" in df_shard
+    assert "model_energy" not in df_shard
+
+    # package-level reader works in worker processes with kwargs passed through
+    df_globbed = glob_to_df(
+        f"{tmp_path}/*.json.gz",
+        reader=read_json_shard,
+        workers=2,
+        pbar=False,
+        drop_cols=["model_trajectory"],
+    )
+    pd.testing.assert_frame_equal(df_globbed, pd.concat(map(read_json_shard, paths)))
+
+
+def test_correct_chunk(df_preds: pd.DataFrame, cse_dicts: pd.Series) -> None:
+    e_form_col = "e_form_per_atom_model"
+    df_out, lines = correct_chunk(
+        df_preds,
+        cse_dicts,
+        energy_col="model_energy",
+        e_form_col=e_form_col,
+        struct_col="model_structure",
+    )
+    assert list(df_out) == ["model_energy", e_form_col]
+    assert lines == ""
+    expected = expected_e_forms(df_preds, cse_dicts)
+    assert df_out[e_form_col].tolist() == pytest.approx(expected, nan_ok=True)
+    assert df_out[e_form_col].isna().sum() == 1  # wbm-1-3 rejected by MP2020
+
+    _, lines = correct_chunk(
+        df_preds,
+        cse_dicts,
+        energy_col="model_energy",
+        e_form_col=e_form_col,
+        struct_col="model_structure",
+        json_lines=True,
+    )
+    assert len(lines.splitlines()) == len(df_preds)
+    # relaxed structures (used for MP2020 oxide/sulfide corrections) end up in CSEs
+    df_json = pd.read_json(io.StringIO(lines), lines=True)
+    cse = ComputedStructureEntry.from_dict(df_json[Key.cse][1])
+    assert cse.structure.lattice.a == pytest.approx(4.1)
+    assert cse.energy_adjustments  # MP2020 corrections applied
+
+    with pytest.raises(ValueError, match="1 material IDs without CSE"):
+        correct_chunk(
+            df_preds, cse_dicts[1:], energy_col="model_energy", e_form_col=e_form_col
+        )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_join_predictions(
+    df_preds: pd.DataFrame, cse_dicts: pd.Series, tmp_path: Path, workers: int
+) -> None:
+    # fake cached WBM CSE data file
+    cache_dir = f"{tmp_path}/cache"
+    cse_path = f"{cache_dir}/{DataFiles.wbm_computed_structure_entries}"
+    os.makedirs(os.path.dirname(cse_path))
+    df_cse = pd.DataFrame({Key.cse: cse_dicts})
+    df_cse.index.name = Key.mat_id
+    df_cse.reset_index().to_json(cse_path)
+
+    for idx, df_shard in enumerate(np.array_split(df_preds, 3)):
+        df_shard.reset_index().to_json(f"{tmp_path}/shard-{idx}.json.gz")
+
+    e_form_col = "e_form_per_atom_model"
+    out_path, json_path = f"{tmp_path}/out.csv.gz", f"{tmp_path}/out.json.gz"
+    join_kwargs = dict(
+        energy_col="model_energy",
+        e_form_col=e_form_col,
+        struct_col="model_structure",
+        chunk_size=2,
+        workers=workers,
+        pbar=False,
+        cache_dir=cache_dir,
+    )
+    # wbm-1-3 is rejected by MP2020, only kept when explicitly allowed
+    with pytest.raises(ValueError, match=r"MP2020 rejected 1 entries: \['wbm-1-3'\]"):
+        join_predictions(f"{tmp_path}/shard-*.json.gz", out_path, **join_kwargs)
+    assert not os.path.isfile(out_path)
+
+    with pytest.warns(UserWarning, match="MP2020 rejected 1 entries"):
+        df_out = join_predictions(
+            f"{tmp_path}/shard-*.json.gz",
+            out_path,
+            json_path=json_path,
+            allow_rejected=True,
+            **join_kwargs,
+        )
+
+    expected = np.round(expected_e_forms(df_preds, cse_dicts), 4)
+    assert df_out[e_form_col].tolist() == pytest.approx(expected, nan_ok=True)
+    df_csv = pd.read_csv(out_path).set_index(Key.mat_id)
+    pd.testing.assert_frame_equal(df_csv, df_out)
+
+    # same format as df.reset_index().to_json() so existing readers keep working
+    df_json = pd.read_json(json_path).set_index(Key.mat_id)
+    assert list(df_json.index) == mat_ids
+    assert {"model_structure", Key.cse, e_form_col} <= {*df_json}
+    assert not any(name.startswith(".tmp-") for name in os.listdir(tmp_path))
+
+    with pytest.raises(ValueError, match="No shard files to join"):
+        join_predictions(
+            f"{tmp_path}/missing-*.json.gz",
+            out_path,
+            energy_col="model_energy",
+            e_form_col=e_form_col,
+        )
@@ -5,7 +5,13 @@ import pandas as pd
 import pytest
 
 from matbench_discovery.enums import Key
-from matbench_discovery.metrics import classify_stable, stable_metrics
+from matbench_discovery.metrics import (
+    classify_stable,
+    compute_metrics,
+    confusion_codes,
+    confusion_counts,
+    stable_metrics,
+)
 
 
 @pytest.mark.parametrize(
@@ -32,6 +38,45 @@ def test_classify_stable(
     assert n_true_pos + n_false_neg == sum(stability_threshold >= df_float.A)
 
 
+@pytest.mark.parametrize("fillna", [True, False])
+@pytest.mark.parametrize("stability_threshold", [-0.05, 0, 0.1])
+def test_confusion_codes_counts(fillna: bool, stability_threshold: float) -> None:
+    rng = np.random.default_rng(0)
+    each_true, each_pred = rng.normal(size=(2, 200))
+    each_true[::13] = np.nan
+    each_pred[::7] = np.nan
+    kwargs = dict(stability_threshold=stability_threshold, fillna=fillna)
+
+    codes = confusion_codes(each_true, each_pred, **kwargs)
+    assert codes.dtype == np.int8
+    masks = classify_stable(pd.Series(each_true), pd.Series(each_pred), **kwargs)
+    for code, mask in enumerate(masks):
+        assert isinstance(mask, pd.Series)
+        np.testing.assert_array_equal(codes == code, mask)
+    # NaN targets (and NaN preds if not filled) are unclassified
+    unclassified = np.isnan(each_true) | (np.isnan(each_pred) & (not fillna))
+    np.testing.assert_array_equal(codes == -1, unclassified)
+
+    counts = confusion_counts(each_true, each_pred, **kwargs)
+    assert counts == tuple(map(sum, masks))
+    assert sum(counts) == (~unclassified).sum()
+
+    # Series are aligned by index, not position
+    true_series = pd.Series(each_true, index=[f"id-{idx}" for idx in range(200)])
+    shuffled_pred = pd.Series(each_pred, index=true_series.index).sample(
+        frac=1, random_state=0
+    )
+    aligned_codes = confusion_codes(true_series, shuffled_pred, **kwargs)
+    np.testing.assert_array_equal(aligned_codes, codes)
+    assert confusion_counts(true_series, shuffled_pred, **kwargs) == counts
+
+    # broadcasting targets against multiple models' predictions
+    df_preds = np.stack([each_pred, -each_pred], axis=1)
+    codes_2d = confusion_codes(each_true[:, None], df_preds, **kwargs)
+    assert codes_2d.shape == (200, 2)
+    np.testing.assert_array_equal(codes_2d[:, 0], codes)
+
+
 def test_stable_metrics() -> None:
     metrics = stable_metrics(np.arange(-1, 1, 0.1), np.arange(1, -1, -0.1), fillna=True)
     for key, val in dict(
@@ -91,6 +136,13 @@ def test_stable_metrics() -> None:
     assert metrics["RMSE"] == mean_squared_error(y_true, y_pred) ** 0.5
     assert metrics["R2"] == r2_score(y_true, y_pred)
 
+    # Series inputs are aligned by index before computing any metric
+    series_true = pd.Series(y_true, index=[f"id-{idx}" for idx in range(100)])
+    series_pred = pd.Series(y_pred, index=series_true.index)[::-1]
+    assert stable_metrics(series_true, series_pred, fillna=True) == pytest.approx(
+        metrics
+    )
+
     # test stable_metrics docstring is up to date, all returned metrics should be listed
     assert stable_metrics.__doc__  # for mypy
     assert all(key in stable_metrics.__doc__ for key in metrics)
@@ -105,3 +157,48 @@ def test_stable_metrics() -> None:
     )
     precision = n_true_pos / (n_true_pos + n_false_pos)
     assert metrics[Key.daf] == precision / dummy_hit_rate
+
+
+@pytest.mark.parametrize("fillna", [True, False])
+def test_compute_metrics(fillna: bool) -> None:
+    rng = np.random.default_rng(0)
+    n_samples = 500
+    each_true = pd.Series(rng.normal(0.05, 0.2, n_samples))
+    each_true[::50] = np.nan
+    df_each_pred = pd.DataFrame(
+        {f"model {idx}": each_true + rng.normal(0, 0.1, n_samples) for idx in range(3)}
+    )
+    df_each_pred.iloc[::7, 1] = np.nan
+
+    is_subset = rng.random(n_samples) < 0.6
+    # per-model mask: each model's 250 most stable predictions
+    is_top_250 = pd.DataFrame(
+        data=False, index=each_true.index, columns=list(df_each_pred)
+    )
+    for model in df_each_pred:
+        is_top_250.loc[df_each_pred[model].nsmallest(250).index, model] = True
+
+    subsets = {"full": np.ones(n_samples, bool), "sub": is_subset, "top": is_top_250}
+    thresholds = (0, 0.05)
+    df_metrics = compute_metrics(
+        each_true, df_each_pred, subsets=subsets, thresholds=thresholds, fillna=fillna
+    )
+    assert df_metrics.index.names == ["subset", "threshold", "model"]
+    assert len(df_metrics) == len(subsets) * len(thresholds) * df_each_pred.shape[1]
+
+    for (subset, threshold, model), metrics in df_metrics.iterrows():
+        mask = subsets[subset]
+        mask = mask[model].to_numpy() if isinstance(mask, pd.DataFrame) else mask
+        expected = stable_metrics(
+            each_true[mask],
+            df_each_pred[model][mask],
+            stability_threshold=threshold,
+            fillna=fillna,
+        )
+        assert list(metrics.index) == list(expected)
+        for key, val in expected.items():
+            assert metrics[key] == pytest.approx(val, rel=1e-12, nan_ok=True), key
+
+    # defaults to full set at STABILITY_THRESHOLD
+    df_default = compute_metrics(each_true, df_each_pred, fillna=fillna)
+    pd.testing.assert_frame_equal(df_default, df_metrics.iloc[: len(df_default)])
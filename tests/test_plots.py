@@ -1,9 +1,11 @@
 from typing import Literal
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import pytest
+import scipy.stats
 
 from matbench_discovery.enums import Key
 from matbench_discovery.plots import (
@@ -12,6 +14,7 @@ from matbench_discovery.plots import (
     hist_classified_stable_vs_hull_dist,
     plotly_line_styles,
     plotly_markers,
+    rolling_mae_and_sem,
     rolling_mae_vs_hull_dist,
 )
 from matbench_discovery.preds import load_df_wbm_with_preds
@@ -113,6 +116,41 @@ def test_rolling_mae_vs_hull_dist(
         assert ax.layout.xaxis.title.text == "E<sub>above MP hull</sub> (eV/atom)"
 
 
+@pytest.mark.parametrize("window, bin_width", [(0.04, 0.005), (0.002, 0.001)])
+def test_rolling_mae_and_sem(window: float, bin_width: float) -> None:
+    rng = np.random.default_rng(0)
+    e_true = pd.Series(rng.normal(0, 0.2, 2_000))
+    e_true[::50] = np.nan
+    df_preds = pd.DataFrame(
+        {f"model {idx}": e_true + rng.normal(0, 0.1, 2_000) for idx in range(2)}
+    )
+    df_preds.iloc[::7, 1] = np.nan
+    x_lim = (-0.2, 0.2)
+
+    df_mae, df_sem = rolling_mae_and_sem(
+        e_true, df_preds, window=window, bin_width=bin_width, x_lim=x_lim
+    )
+    bins = np.arange(*x_lim, bin_width)
+    assert list(df_mae) == list(df_sem) == list(df_preds)
+    assert list(df_mae.index) == list(df_sem.index) == list(bins)
+
+    # compare to brute-force masking of each bin
+    for model in df_preds:
+        abs_err = (df_preds[model] - e_true).abs().dropna()
+        for bin_center in bins:
+            in_window = e_true.loc[abs_err.index].between(
+                bin_center - window / 2, bin_center + window / 2, inclusive="right"
+            )
+            expected_mae = abs_err[in_window].mean()
+            expected_sem = scipy.stats.sem(abs_err[in_window])
+            assert df_mae.loc[bin_center, model] == pytest.approx(
+                expected_mae, nan_ok=True
+            )
+            assert df_sem.loc[bin_center, model] == pytest.approx(
+                expected_sem, nan_ok=True
+            )
+
+
 @pytest.mark.parametrize("stability_threshold", [0.1, 0.01])
 @pytest.mark.parametrize("x_lim", [(0, 0.6), (-0.2, 0.8)])
 @pytest.mark.parametrize("which_energy", ["true", "pred"])
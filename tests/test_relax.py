@@ -0,0 +1,240 @@
+import signal
+import time
+from collections.abc import Sequence
+
+import numpy as np
+import pytest
+from ase import Atoms
+from ase.build import bulk
+from ase.calculators.lj import LennardJones
+from ase.filters import UnitCellFilter
+from ase.optimize import FIRE
+
+from matbench_discovery.relax import (
+    RelaxTimeoutError,
+    ase_batch_calculator,
+    relax_structures,
+    run_ase_optimizer,
+    time_limit,
+)
+
+
+def lj_calc() -> LennardJones:
+    return LennardJones(sigma=3.4, epsilon=0.0104, rc=8.0, smooth=True)
+
+
+@pytest.fixture()
+def structures() -> dict[str, Atoms]:
+    rng = np.random.default_rng(seed=0)
+    structs = {}
+    for idx in range(6):
+        atoms = bulk("Ar", "fcc", a=5.2 + 0.1 * idx, cubic=True)
+        atoms = atoms.repeat((1, 1, 2) if idx % 2 else 1)
+        atoms.rattle(0.1, seed=idx)
+        strain = 1 + 0.03 * rng.normal(size=(3, 3))
+        atoms.set_cell(atoms.cell * strain, scale_atoms=True)
+        structs[f"struct-{idx}"] = atoms
+    return structs
+
+
+@pytest.mark.parametrize("relax_cell", [True, False])
+def test_relax_structures(structures: dict[str, Atoms], relax_cell: bool) -> None:
+    n_calls = 0
+    batch_calc = ase_batch_calculator(lj_calc())
+
+    def counting_calc(
+        atoms_list: Sequence[Atoms],
+    ) -> tuple[np.ndarray, list[np.ndarray], np.ndarray | None]:
+        nonlocal n_calls
+        n_calls += 1
+        return batch_calc(atoms_list)
+
+    results = dict(
+        relax_structures(
+            structures.items(),
+            counting_calc,
+            batch_size=4,
+            fmax=0.01,
+            max_steps=200,
+            relax_cell=relax_cell,
+        )
+    )
+    assert set(results) == set(structures)
+
+    # each structure takes exactly the same steps as ASE's FIRE + UnitCellFilter
+    for key, init_atoms in structures.items():
+        atoms = init_atoms.copy()
+        atoms.calc = lj_calc()
+        optimizer = FIRE(UnitCellFilter(atoms) if relax_cell else atoms, logfile=None)
+        optimizer.run(fmax=0.01, steps=200)
+
+        result = results[key]
+        assert result["converged"]
+        assert result["n_steps"] == optimizer.nsteps
+        assert result["energy"] == pytest.approx(atoms.get_potential_energy())
+        assert result["atoms"].positions == pytest.approx(atoms.positions, abs=1e-8)
+        assert result["atoms"].cell.array == pytest.approx(atoms.cell.array, abs=1e-8)
+        assert result["forces"].shape == (len(atoms), 3)
+        # input structures are not modified
+        assert init_atoms.calc is None
+
+    # one batched call per step instead of one per structure per step
+    n_total_steps = sum(res["n_steps"] + 1 for res in results.values())
+    assert n_calls < n_total_steps / 2
+
+
+def test_relax_structures_options(structures: dict[str, Atoms]) -> None:
+    calc = ase_batch_calculator(lj_calc())
+    # single points
+    results = dict(relax_structures(structures.items(), calc, max_steps=0))
+    assert {res["n_steps"] for res in results.values()} == {0}
+    for key, atoms in structures.items():
+        assert results[key]["atoms"].positions == pytest.approx(atoms.positions)
+
+    # unconverged structures stop at max_steps, trajectories record every step
+    results = dict(
+        relax_structures(
+            structures.items(),
+            calc,
+            max_steps=3,
+            fmax=1e-6,
+            max_atoms=10,
+            record_traj=True,
+        )
+    )
+    for result in results.values():
+        assert result["n_steps"] == 3
+        assert not result["converged"]
+        traj = result["trajectory"]
+        assert len(traj["positions"]) == len(traj["cells"]) == 4
+        assert traj["energies"][-1] == result["energy"]
+
+    with pytest.raises(ValueError, match="batch_size=0 must be positive"):
+        next(relax_structures(structures.items(), calc, batch_size=0))
+
+
+def test_relax_structures_errors(structures: dict[str, Atoms]) -> None:
+    batch_calc = ase_batch_calculator(lj_calc())
+
+    def flaky_calc(
+        atoms_list: Sequence[Atoms],
+    ) -> tuple[np.ndarray, list[np.ndarray], np.ndarray | None]:
+        if any(len(atoms) == 8 for atoms in atoms_list):
+            raise RuntimeError("bad structure")
+        return batch_calc(atoms_list)
+
+    results = dict(
+        relax_structures(structures.items(), flaky_calc, batch_size=3, fmax=0.01)
+    )
+    assert set(results) == set(structures)
+    for key, atoms in structures.items():
+        if len(atoms) == 8:
+            assert results[key] == {"error": "RuntimeError('bad structure')"}
+        else:
+            assert results[key]["converged"]
+
+
+def test_relax_structures_batch_too_large(structures: dict[str, Atoms]) -> None:
+    batch_calc = ase_batch_calculator(lj_calc())
+    batch_sizes: list[int] = []
+
+    def oom_calc(
+        atoms_list: Sequence[Atoms],
+    ) -> tuple[np.ndarray, list[np.ndarray], np.ndarray | None]:
+        batch_sizes.append(len(atoms_list))
+        if len(atoms_list) > 2:  # like running out of GPU memory
+            raise RuntimeError("CUDA out of memory")
+        return batch_calc(atoms_list)
+
+    results = dict(
+        relax_structures(structures.items(), oom_calc, batch_size=5, fmax=0.01)
+    )
+    expected = dict(relax_structures(structures.items(), batch_calc, fmax=0.01))
+    assert set(results) == set(structures)
+    for key, result in results.items():
+        assert "error" not in result, f"{key=} {result=}"
+        assert result["converged"]
+        # same trajectory as with a calculator that handles any batch size
+        assert result["n_steps"] == expected[key]["n_steps"]
+        assert result["energy"] == pytest.approx(expected[key]["energy"])
+    # after bisecting the first failing step (5 -> 2 + 3 -> 2 + 1 + 2), calls are
+    # split into chunks of 2 rather than failing every step
+    assert batch_sizes[:4] == [5, 2, 3, 1]
+    assert max(batch_sizes[4:]) == 2
+
+
+def test_relax_structures_timeout(
+    structures: dict[str, Atoms], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    batch_calc = ase_batch_calculator(lj_calc())
+    # fake clock so the test doesn't depend on how fast the machine is
+    clock = [0.0]
+    monkeypatch.setattr(time, "perf_counter", lambda: clock[0])
+
+    def slow_calc(
+        atoms_list: Sequence[Atoms],
+    ) -> tuple[np.ndarray, list[np.ndarray], np.ndarray | None]:
+        if any(len(atoms) == 8 for atoms in atoms_list):
+            clock[0] += 1  # each step of a slow structure takes 1 s
+        return batch_calc(atoms_list)
+
+    results = dict(
+        relax_structures(
+            structures.items(), slow_calc, batch_size=1, fmax=0.01, timeout=5.5
+        )
+    )
+    assert set(results) == set(structures)
+    for key, atoms in structures.items():
+        result = results[key]
+        if len(atoms) == 8:  # slow structures time out, fast ones are unaffected
+            assert result["error"].startswith("RelaxTimeoutError('exceeded time limit")
+            assert 0 < result["n_steps"] < 10
+        else:
+            assert result["converged"]
+
+
+def test_time_limit() -> None:
+    prev_handler = signal.getsignal(signal.SIGALRM)
+    with (
+        pytest.raises(RelaxTimeoutError, match="exceeded time limit of 0.05 s"),
+        time_limit(0.05),
+    ):
+        time.sleep(5)
+    assert signal.getsignal(signal.SIGALRM) == prev_handler
+    assert signal.getitimer(signal.ITIMER_REAL) == (0, 0)
+
+    # fast bodies and no limit don't raise, outer timers keep running
+    with time_limit(10):
+        with time_limit(5):
+            pass
+        assert 9 < signal.getitimer(signal.ITIMER_REAL)[0] <= 10
+        with time_limit(None):
+            pass
+    assert signal.getitimer(signal.ITIMER_REAL) == (0, 0)
+
+
+def test_run_ase_optimizer(structures: dict[str, Atoms]) -> None:
+    atoms = structures["struct-0"].copy()
+    atoms.calc = lj_calc()
+    ref_atoms = atoms.copy()
+    ref_atoms.calc = lj_calc()
+    ref_optimizer = FIRE(UnitCellFilter(ref_atoms), logfile=None)
+    ref_optimizer.run(fmax=0.01, steps=200)
+
+    optimizer = FIRE(UnitCellFilter(atoms), logfile=None)
+    assert run_ase_optimizer(optimizer, fmax=0.01, max_steps=200, timeout=60)
+    assert optimizer.nsteps == ref_optimizer.nsteps
+    assert atoms.positions == pytest.approx(ref_atoms.positions)
+
+    # step budget
+    atoms = structures["struct-1"].copy()
+    atoms.calc = lj_calc()
+    optimizer = FIRE(UnitCellFilter(atoms), logfile=None)
+    assert not run_ase_optimizer(optimizer, fmax=1e-6, max_steps=3)
+    assert optimizer.nsteps == 3
+
+    # wall-clock budget, checked between steps
+    optimizer = FIRE(UnitCellFilter(atoms), logfile=None)
+    with pytest.raises(RelaxTimeoutError, match="exceeded time limit of 0 s after"):
+        run_ase_optimizer(optimizer, fmax=1e-6, max_steps=100, timeout=0)
+    assert atoms.calc.results == {}  # cached results dropped
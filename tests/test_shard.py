@@ -0,0 +1,91 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from matbench_discovery.enums import Key
+from matbench_discovery.shard import (
+    balance_shards,
+    estimate_costs,
+    get_shard_manifest,
+    shard_ids,
+)
+
+
+@pytest.fixture()
+def df_sizes() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n_sites = rng.integers(1, 100, size=200)
+    mat_ids = pd.Index([f"wbm-1-{idx}" for idx in range(len(n_sites))], name=Key.mat_id)
+    volumes = n_sites * rng.uniform(8, 30, size=len(n_sites))
+    return pd.DataFrame({Key.n_sites: n_sites, Key.volume: volumes}, index=mat_ids)
+
+
+def test_estimate_costs(df_sizes: pd.DataFrame) -> None:
+    n_sites, volumes = df_sizes[Key.n_sites], df_sizes[Key.volume]
+    costs = estimate_costs(n_sites)
+    assert costs.tolist() == n_sites.tolist()
+    assert list(costs.index) == list(df_sizes.index)
+
+    # denser structures with the same number of sites have more neighbors
+    costs = estimate_costs(n_sites, volumes)
+    assert (costs > n_sites).all()
+    dense = estimate_costs(n_sites, volumes / 2)
+    assert (dense > costs).all()
+
+    # measured timings are used as is, other estimates are rescaled to seconds
+    timings = pd.Series([2 * costs.iloc[0], 3.0], index=[costs.index[0], "unknown"])
+    timed = estimate_costs(n_sites, volumes, timings=timings)
+    assert timed.iloc[0] == timings.iloc[0]
+    assert timed.iloc[1:].tolist() == pytest.approx(2 * costs.iloc[1:])
+
+    with pytest.raises(ValueError, match="1 structures with missing or non-positive"):
+        estimate_costs(n_sites.replace(n_sites.iloc[0], 0).head(1))
+
+
+@pytest.mark.parametrize("n_shards", [1, 7, 50, 300])
+def test_balance_shards(df_sizes: pd.DataFrame, n_shards: int) -> None:
+    costs = estimate_costs(df_sizes[Key.n_sites], df_sizes[Key.volume])
+    shards = balance_shards(costs, n_shards)
+    assert list(shards.index) == list(costs.index)
+    assert set(shards) == set(range(min(n_shards, len(costs))))
+
+    # max shard cost is near the ideal and no worse than for equal row counts
+    shard_costs = costs.groupby(shards).sum()
+    ideal = max(costs.sum() / n_shards, costs.max())
+    assert shard_costs.max() <= 4 / 3 * ideal
+    split_costs = [chunk.sum() for chunk in np.array_split(costs.to_numpy(), n_shards)]
+    assert shard_costs.max() <= max(split_costs) * (1 + 1e-12)
+
+    # deterministic and independent of input order
+    shuffled = costs.sample(frac=1, random_state=0)
+    assert balance_shards(shuffled, n_shards).equals(shards[shuffled.index])
+
+    with pytest.raises(ValueError, match="n_shards=0 must be positive"):
+        balance_shards(costs, 0)
+
+
+def test_get_shard_manifest(df_sizes: pd.DataFrame, tmp_path: Path) -> None:
+    costs = estimate_costs(df_sizes[Key.n_sites], df_sizes[Key.volume])
+    path = f"{tmp_path}/manifests/shards.csv"
+
+    with pytest.raises(ValueError, match="pass costs and n_shards to create it"):
+        get_shard_manifest(path)
+
+    df_manifest = get_shard_manifest(path, costs, 10)
+    assert os.listdir(os.path.dirname(path)) == ["shards.csv"]
+    assert list(df_manifest) == ["shard", "cost"]
+
+    # later calls read the manifest instead of recomputing it
+    df_read = get_shard_manifest(path)
+    pd.testing.assert_frame_equal(df_read, df_manifest, check_names=False)
+    assert get_shard_manifest(path, costs.head(3), 10).equals(df_read)
+
+    ids = [shard_ids(df_read, shard_idx) for shard_idx in range(10)]
+    assert sorted(mat_id for shard in ids for mat_id in shard) == sorted(costs.index)
+    assert shard_ids(df_read, 10) == []
+
+    with pytest.raises(ValueError, match="has 10 shards, expected n_shards=5"):
+        get_shard_manifest(path, costs, 5)
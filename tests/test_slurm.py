@@ -1,9 +1,28 @@
+import atexit
+import json
 import os
+import signal
+from pathlib import Path
 from unittest.mock import patch
 
+import numpy as np
+import pandas as pd
 import pytest
+from pymatgen.core import Lattice, Structure
 
-from matbench_discovery.slurm import _get_calling_file_path, slurm_submit
+from matbench_discovery.enums import Key
+from matbench_discovery.slurm import (
+    ArrayTask,
+    ShardJournal,
+    _get_calling_file_path,
+    array_status,
+    format_array_spec,
+    parse_array_spec,
+    parse_slurm_time,
+    run_local_array,
+    shard_out_path,
+    slurm_submit,
+)
 
 
 @patch.dict(os.environ, {"SLURM_JOB_ID": "1234"}, clear=True)
@@ -59,7 +78,8 @@ def test_slurm_submit(
     assert mock_subprocess_run.call_count == 1
     sbatch_cmd = (
         f"sbatch --job-name {job_name} --output {out_dir}/slurm-%A.log --foo "
-        f"--wrap {pre_cmd + ' ' if pre_cmd else ''}python {py_file_path or __file__}"
+        f"--wrap export SBATCH_OUTPUT={os.path.abspath(out_dir)}; "
+        f"{pre_cmd + ' ' if pre_cmd else ''}python {py_file_path or __file__}"
     ).replace(" --", "\n  --")
     for flag in (f"{time=}", f"{account=}", f"{partition=}"):
         key, val = flag.split("=")
@@ -71,6 +91,140 @@ def test_slurm_submit(
     assert stderr == ""
 
 
+@pytest.mark.parametrize(
+    "array, expected",
+    [
+        ("9", ([9], None)),
+        ("1-4", ([1, 2, 3, 4], None)),
+        ("0,4-6%2", ([0, 4, 5, 6], 2)),
+        ("1-9:3,2", ([1, 2, 4, 7], None)),
+    ],
+)
+def test_parse_array_spec(array: str, expected: tuple[list[int], int | None]) -> None:
+    assert parse_array_spec(array) == expected
+
+
+@pytest.mark.parametrize("array", ["", "1-x", "1-4%0", "4-1"])
+def test_parse_array_spec_raises(array: str) -> None:
+    with pytest.raises(ValueError, match="Invalid slurm array="):
+        parse_array_spec(array)
+
+
+@pytest.mark.parametrize(
+    "task_ids, max_running, expected",
+    [
+        ([9], None, "9"),
+        ([3, 1, 2, 2], None, "1-3"),
+        ([1, 2, 4, 6, 7, 8], 3, "1-2,4,6-8%3"),
+    ],
+)
+def test_format_array_spec(
+    task_ids: list[int], max_running: int | None, expected: str
+) -> None:
+    assert format_array_spec(task_ids, max_running) == expected
+    assert parse_array_spec(expected) == (sorted(set(task_ids)), max_running)
+
+
+@pytest.mark.parametrize(
+    "time, expected",
+    [
+        ("30", 1800),
+        ("1:30", 90),
+        ("2:00:05", 7205),
+        ("1-2", 93_600),
+        ("1-0:30", 88_200),
+        ("1-0:0:1", 86_401),
+        ("UNLIMITED", None),
+    ],
+)
+def test_parse_slurm_time(time: str, expected: float | None) -> None:
+    assert parse_slurm_time(time) == expected
+    with pytest.raises(ValueError, match="Invalid slurm time="):
+        parse_slurm_time(f"{time}:x")
+
+
+def test_run_local_array(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    py_file = tmp_path / "script.py"
+    py_file.write_text(
+        "import os, sys, time\n"
+        "task_id = os.environ['SLURM_ARRAY_TASK_ID']\n"
+        f"marker = '{tmp_path}/running-' + task_id\n"
+        "open(marker, 'w').close()\n"
+        f"print('running', len([f for f in os.listdir('{tmp_path}') if "
+        "f.startswith('running-')]))\n"
+        "for key in ('SLURM_JOB_NAME', 'SLURM_ARRAY_TASK_COUNT', 'ENV_VAR', "
+        "'SBATCH_OUTPUT'):\n"
+        "    print(f'{key}={os.environ[key]}')\n"
+        "time.sleep(0.2)\n"
+        "os.remove(marker)\n"
+        "sys.exit(3 if task_id == '4' else 0)\n"
+    )
+    out_dir = f"{tmp_path}/logs"
+    returncode = run_local_array(
+        "test-job",
+        out_dir,
+        str(py_file),
+        array="1-4%2",
+        pre_cmd="export ENV_VAR=42",
+        workers=4,
+    )
+    assert returncode == 3
+    assert "1 task(s) failed (task ID: exit code): {4: 3}" in capsys.readouterr().out
+
+    job_id = os.getpid()
+    assert sorted(os.listdir(out_dir)) == [
+        f"slurm-{job_id}-{task_id}.log" for task_id in range(1, 5)
+    ]
+    for task_id in range(1, 5):
+        log = Path(f"{out_dir}/slurm-{job_id}-{task_id}.log").read_text()
+        n_running = int(log.splitlines()[0].split()[1])
+        assert 1 <= n_running <= 2  # %2 limits concurrency
+        assert (
+            "SLURM_JOB_NAME=test-job\nSLURM_ARRAY_TASK_COUNT=4\nENV_VAR=42\n"
+            f"SBATCH_OUTPUT={out_dir}\n"
+        ) in log
+
+
+def test_run_local_array_time_limit(tmp_path: Path) -> None:
+    py_file = tmp_path / "script.py"
+    py_file.write_text(
+        "import signal, sys, time\n"
+        "def handler(signum, frame):\n"
+        "    print('got SIGTERM', flush=True)\n"
+        "    sys.exit(143)\n"
+        "signal.signal(signal.SIGTERM, handler)\n"
+        "print('started', flush=True)\n"
+        "time.sleep(30)\n"
+    )
+    # SIGTERM reaches the python process (not only the shell) after the 1 s time limit
+    returncode = run_local_array("test-job", str(tmp_path), str(py_file), time="0:1")
+    assert returncode == 143
+    log = Path(f"{tmp_path}/slurm-{os.getpid()}.log").read_text()
+    assert log == "started\ngot SIGTERM\n"
+
+
+def test_slurm_submit_local(tmp_path: Path) -> None:
+    kwargs = dict(job_name="test_job", out_dir=str(tmp_path), array="1-3", workers=2)
+    with (
+        pytest.raises(SystemExit) as exc_info,
+        patch("sys.argv", ["local-submit"]),
+        patch("matbench_discovery.slurm.run_local_array", return_value=5) as mock_run,
+        patch("matbench_discovery.slurm.subprocess.run") as mock_subprocess_run,
+    ):
+        slurm_submit(py_file_path="path/to/file.py", **kwargs)  # type: ignore[arg-type]
+    assert exc_info.value.code == 5
+    assert mock_subprocess_run.call_count == 0
+    mock_run.assert_called_once_with(
+        **kwargs, py_file_path="path/to/file.py", pre_cmd="", time=None
+    )
+
+    with (
+        pytest.raises(ValueError, match="Unknown executor='foo', must be one of"),
+        patch("sys.argv", ["slurm-submit"]),
+    ):
+        slurm_submit(executor="foo", **kwargs)  # type: ignore[arg-type]
+
+
 def test_get_calling_file_path() -> None:
     assert _get_calling_file_path(frame=1) == __file__
 
@@ -78,3 +232,195 @@ def test_get_calling_file_path() -> None:
         return _get_calling_file_path(frame)
 
     assert wrapper(frame=2) == __file__
+
+
+def test_shard_out_path() -> None:
+    assert shard_out_path("out", 7) == "out/shard-007.json.gz"
+    assert shard_out_path("out", 1234, ext=".csv") == "out/shard-1234.csv"
+
+
+def test_shard_journal(tmp_path: Path) -> None:
+    out_path = f"{tmp_path}/shard.json.gz"
+    struct = Structure(Lattice.cubic(3), ["Fe"], [[0, 0, 0]])
+
+    journal = ShardJournal(out_path, flush_every=2)
+    journal.add("wbm-1-1", {"energy": -1.0, "structure": struct})
+    assert "wbm-1-1" in journal
+    assert not os.path.isfile(journal.journal_path)  # still buffered
+    journal.add("wbm-1-2", {"energy": -2.0, "structure": struct})
+    journal.add("wbm-1-3", {"energy": -3.0, "structure": struct})
+    assert repr(journal) == f"ShardJournal({journal.journal_path!r}, len(self)=3)"
+
+    # simulate crash: unflushed record is lost, partial last line is dropped
+    with open(journal.journal_path, "a") as file:
+        file.write('{"material_id": "wbm-1-4", "ener')
+    resumed = ShardJournal(out_path)
+    assert resumed.done == {"wbm-1-1", "wbm-1-2"}
+    resumed.add("wbm-1-3", {"energy": -3.0, "structure": struct})
+    resumed.add("wbm-1-2", {"energy": -2.5, "structure": struct})  # last one wins
+
+    df_out = resumed.compact()
+    assert not os.path.isfile(resumed.journal_path)
+    assert list(df_out.index) == ["wbm-1-1", "wbm-1-3", "wbm-1-2"]
+    assert list(df_out.energy) == [-1.0, -3.0, -2.5]
+    df_file = pd.read_json(out_path).set_index(Key.mat_id)
+    pd.testing.assert_frame_equal(df_file, df_out)
+    assert Structure.from_dict(df_file.structure.iloc[0]) == struct
+
+    # numpy values (e.g. float32 energies from model trajectories) aren't dropped
+    np_journal = ShardJournal(f"{tmp_path}/numpy.json.gz")
+    np_journal.add(
+        "wbm-1-1",
+        {"energy": np.float32(-3.25), "energies": np.array([-1.0], np.float32)},
+    )
+    df_np = np_journal.compact()
+    assert df_np.energy.iloc[0] == -3.25
+    assert df_np.energies.iloc[0] == [-1.0]
+
+    assert len(ShardJournal(f"{tmp_path}/empty.json").compact()) == 0
+    with pytest.raises(ValueError, match="flush_every=0 must be positive"):
+        ShardJournal(out_path, flush_every=0)
+
+
+def test_shard_journal_sigterm(tmp_path: Path) -> None:
+    prev_handler = signal.getsignal(signal.SIGTERM)
+    journal = ShardJournal(f"{tmp_path}/shard.json", flush_every=100)
+    with journal:
+        journal.add("wbm-1-1", {"energy": -1.0})
+        with pytest.raises(SystemExit) as exc_info:
+            os.kill(os.getpid(), signal.SIGTERM)
+    assert exc_info.value.code == 128 + signal.SIGTERM
+    # buffered record was flushed before exiting, previous handler is restored
+    assert ShardJournal(journal.out_path).done == {"wbm-1-1"}
+    assert signal.getsignal(signal.SIGTERM) == prev_handler
+
+
+@patch.dict(os.environ, {}, clear=True)
+def test_array_status_and_resubmit(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    out_dir = str(tmp_path)
+    kwargs = dict(job_name="test-job", out_dir=out_dir, py_file_path="file.py")
+    with (
+        pytest.raises(SystemExit),
+        patch("sys.argv", ["slurm-submit"]),
+        patch("matbench_discovery.slurm.subprocess.run"),
+    ):
+        slurm_submit(**kwargs, array="1-6%2")  # type: ignore[arg-type]
+
+    def make_task(task_id: int) -> ArrayTask:
+        return ArrayTask(out_dir, f"{out_dir}/{task_id}.json", task_id=task_id).start()
+
+    task = make_task(1)  # done, two materials failed
+    task.fail("wbm-1-1", TimeoutError("too slow"))
+    task.fail("wbm-1-2")
+    Path(task.out_path).touch()
+    task.finish()
+    make_task(2).finish()  # finished without writing output
+    # still running or killed by SIGKILL
+    atexit.unregister(make_task(3)._on_exit)  # noqa: SLF001
+    task = make_task(4)  # done but output file deleted since
+    Path(task.out_path).touch()
+    task.finish()
+    os.remove(task.out_path)
+    task = make_task(6)  # crashed, status written at exit
+    atexit.unregister(task._on_exit)  # noqa: SLF001
+    task._on_exit()  # noqa: SLF001
+
+    df_status = array_status(out_dir)
+    assert list(df_status.index) == [1, 2, 3, 4, 5, 6]
+    assert list(df_status.status) == [
+        "done",
+        "failed",
+        "running",
+        "missing",
+        "missing",
+        "failed",
+    ]
+    assert df_status.failed_ids[1] == ["wbm-1-1", "wbm-1-2"]
+    assert df_status.failure_types[1] == {
+        "TimeoutError": ["wbm-1-1"],
+        "unknown": ["wbm-1-2"],
+    }
+    assert df_status.runtime[1] >= 0
+    assert pd.isna(df_status.runtime[3])
+    assert df_status.error[2] == f"self.out_path='{out_dir}/2.json' not written"
+    assert df_status.error[6] == "exited before finish()"
+
+    # resubmit only tasks that aren't done, keeping the concurrency limit
+    with (
+        pytest.raises(SystemExit),
+        patch("sys.argv", ["slurm-resubmit"]),
+        patch("matbench_discovery.slurm.subprocess.run") as mock_run,
+    ):
+        slurm_submit(**kwargs, array="1-6%2")  # type: ignore[arg-type]
+    sbatch_cmd = mock_run.call_args.args[0]
+    assert sbatch_cmd[sbatch_cmd.index("--array") + 1].strip("'") == "2-6%2"
+    with open(f"{out_dir}/array-manifest.json") as file:
+        manifest = json.load(file)
+    assert manifest["task_ids"] == [1, 2, 3, 4, 5, 6]
+    assert [sub["array"] for sub in manifest["submissions"]] == ["1-6%2", "2-6%2"]
+
+    for task_id in range(2, 7):
+        task = make_task(task_id)
+        Path(task.out_path).touch()
+        task.finish()
+    with (
+        pytest.raises(SystemExit, match="All 6 array tasks done, nothing to do"),
+        patch("sys.argv", ["slurm-resubmit"]),
+    ):
+        slurm_submit(**kwargs, array="1-6%2")  # type: ignore[arg-type]
+    capsys.readouterr()
+
+    with (
+        pytest.raises(ValueError, match="slurm-resubmit only works for job arrays"),
+        patch("sys.argv", ["slurm-resubmit"]),
+    ):
+        slurm_submit(**kwargs)  # type: ignore[arg-type]
+    with pytest.raises(FileNotFoundError, match="No job array manifest"):
+        array_status(f"{out_dir}/missing")
+
+
+@patch.dict(os.environ, {}, clear=True)
+def test_resubmit_from_later_day(tmp_path: Path) -> None:
+    # out_dir contains the submission date so it differs when resubmitting next day
+    kwargs = dict(job_name="test-job", array="1-2")
+    first_dir, other_dir = f"{tmp_path}/2023-01-01-test", f"{tmp_path}/2023-01-01-x"
+    for out_dir, py_file_path in ((first_dir, "file.py"), (other_dir, "other.py")):
+        with (
+            pytest.raises(SystemExit),
+            patch("sys.argv", ["slurm-submit"]),
+            patch("matbench_discovery.slurm.subprocess.run"),
+        ):
+            slurm_submit(**kwargs, out_dir=out_dir, py_file_path=py_file_path)  # type: ignore[arg-type]
+    task = ArrayTask(first_dir, f"{first_dir}/1.json", task_id=1).start()
+    Path(task.out_path).touch()
+    task.finish()
+
+    next_day_dir = f"{tmp_path}/2023-01-02-test"
+    with (
+        pytest.raises(SystemExit),
+        patch("sys.argv", ["slurm-resubmit"]),
+        patch("matbench_discovery.slurm.subprocess.run") as mock_run,
+    ):
+        slurm_submit(**kwargs, out_dir=next_day_dir, py_file_path="file.py")  # type: ignore[arg-type]
+    sbatch_cmd = mock_run.call_args.args[0]
+    assert sbatch_cmd[sbatch_cmd.index("--array") + 1].strip("'") == "2"
+    assert sbatch_cmd[sbatch_cmd.index("--output") + 1].startswith(first_dir)
+    wrap_cmd = sbatch_cmd[sbatch_cmd.index("--wrap") + 1]
+    assert wrap_cmd == f"export SBATCH_OUTPUT={first_dir}; python file.py"
+    assert not os.path.exists(next_day_dir)
+    with open(f"{first_dir}/array-manifest.json") as file:
+        manifest = json.load(file)
+    assert [sub["array"] for sub in manifest["submissions"]] == ["1-2", "2"]
+
+
+@patch.dict(os.environ, {}, clear=True)
+def test_array_task_outside_slurm(tmp_path: Path) -> None:
+    # no SLURM_ARRAY_TASK_ID means no status records, e.g. for interactive runs
+    task = ArrayTask(str(tmp_path), f"{tmp_path}/out.json").start()
+    task.fail("wbm-1-1")
+    task.finish()
+    assert task.task_id is None
+    assert repr(task) == "ArrayTask(task_id=None, n_failed=1)"
+    assert os.listdir(tmp_path) == []
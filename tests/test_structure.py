@@ -1,6 +1,16 @@
-from pymatgen.core import Structure
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
 
-from matbench_discovery.structure import perturb_structure
+import numpy as np
+import pandas as pd
+import pytest
+from pymatgen.core import Lattice, Structure
+from pymatgen.entries.computed_entries import ComputedStructureEntry
+
+from matbench_discovery.enums import Key
+from matbench_discovery.structure import StructureStore, perturb_structure
 
 
 def test_perturb_structure(dummy_struct: Structure) -> None:
@@ -13,3 +23,106 @@ def test_perturb_structure(dummy_struct: Structure) -> None:
 
     # but different on subsequent calls
     assert perturb_structure(dummy_struct) != perturb_structure(dummy_struct)
+
+
+@pytest.fixture()
+def structs() -> list[Structure]:
+    rng = np.random.default_rng(0)
+    return [
+        Structure(
+            Lattice.from_parameters(*rng.uniform(3, 6, 3), *rng.uniform(80, 100, 3)),
+            rng.choice(["Li", "Fe", "O", "U"], size=n_sites),
+            rng.random((n_sites, 3)),
+        )
+        for n_sites in (1, 4, 2, 7)
+    ]
+
+
+def _read_volume(store: StructureStore, key: str) -> float:
+    return store[key].volume
+
+
+def test_structure_store(structs: list[Structure], tmp_path: Path) -> None:
+    mat_ids = [f"wbm-1-{idx}" for idx in range(len(structs))]
+    # mix of Structures, Structure dicts and ComputedStructureEntry dicts
+    inputs = [
+        structs[0],
+        structs[1].as_dict(),
+        ComputedStructureEntry(structs[2], 0).as_dict(),
+        structs[3],
+    ]
+    store = StructureStore.write(f"{tmp_path}/store", inputs, mat_ids)
+    assert len(store) == len(structs)
+    assert list(store) == mat_ids
+    assert "wbm-1-2" in store
+    assert "foo" not in store
+    assert list(store.site_offsets) == [0, 1, 5, 7, 14]
+    assert isinstance(store.frac_coords, np.memmap)
+    assert repr(store).endswith("len(self)=4, n_sites=14)")
+
+    store = StructureStore(f"{tmp_path}/store")  # re-open from disk
+    for idx, (mat_id, struct) in enumerate(zip(mat_ids, structs, strict=True)):
+        lattice, frac_coords, atomic_nums = store.get_arrays(mat_id)
+        assert lattice.shape == (3, 3)
+        assert frac_coords.shape == (len(struct), 3)
+        assert not frac_coords.flags.writeable
+        assert list(atomic_nums) == list(struct.atomic_numbers)
+
+        for key in (mat_id, idx, idx - len(structs)):
+            stored = store[key]
+            assert stored.properties["material_id"] == mat_id
+            assert stored.lattice == struct.lattice
+            assert stored.species == struct.species
+            np.testing.assert_allclose(stored.frac_coords, struct.frac_coords)
+
+        atoms = store.get_atoms(mat_id)
+        assert type(atoms).__name__ == "Atoms"
+        assert atoms.info["material_id"] == mat_id
+        assert atoms.get_volume() == pytest.approx(struct.volume)
+        assert list(atoms.numbers) == list(struct.atomic_numbers)
+
+    # pickling only transfers the path, child processes map the same files
+    assert len(pickle.dumps(store)) < 500
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        volumes = list(executor.map(_read_volume, [store] * len(mat_ids), mat_ids))
+    assert volumes == pytest.approx([struct.volume for struct in structs])
+
+
+def test_structure_store_raises(
+    structs: list[Structure], dummy_struct: Structure, tmp_path: Path
+) -> None:
+    with pytest.raises(ValueError, match="material_ids must be unique"):
+        StructureStore.write(tmp_path, structs[:2], ["a", "a"])
+    with pytest.raises(ValueError, match="len\\(lattices\\)=4 structures but"):
+        StructureStore.write(tmp_path, structs, ["a"])
+    disordered = dummy_struct.copy()
+    disordered.replace_species({"Fe": {"Fe": 0.5, "Co": 0.5}})
+    with pytest.raises(ValueError, match="Disordered"):
+        StructureStore.write(tmp_path, [disordered], ["a"])
+    with pytest.raises(ValueError, match="Disordered sites"):
+        StructureStore.write(tmp_path, [disordered.as_dict()], ["a"])
+
+    store = StructureStore.write(tmp_path, structs, "abcd")
+    with pytest.raises(KeyError, match="key='e' not in"):
+        store["e"]
+    with pytest.raises(IndexError, match="key=4 out of range"):
+        store[4]
+
+
+def test_structure_store_from_data_file(
+    structs: list[Structure], tmp_path: Path
+) -> None:
+    df_dummy = pd.DataFrame(
+        {
+            Key.mat_id: [f"wbm-1-{idx}" for idx in range(len(structs))],
+            Key.init_struct: [struct.as_dict() for struct in structs],
+        }
+    )
+    with patch("matbench_discovery.data.download_file") as mock_download:
+        mock_download.side_effect = lambda _url, path, **_kw: df_dummy.to_json(path)
+        store = StructureStore.from_data_file(
+            "wbm_initial_structures", f"{tmp_path}/store", cache_dir=tmp_path
+        )
+    assert list(store) == list(df_dummy[Key.mat_id])
+    for struct, stored in zip(structs, store.material_ids, strict=True):
+        assert store[stored].matches(struct)